@@ -10,28 +10,24 @@
 # Matplotlib from matplotlib.org
 # Scipy from scipy.org
 # Scikit-image from  https://doi.org/10.7717/peerj.453
+# intanalysis: headless analysis package of this repository
 # Pillow (PIL Fork) 9.3.0 from pypi.org/project/Pillow
-import abel
 import PySimpleGUI as sg
 import os
 import io
-import math
 import numpy as np
-import shutil
-import tempfile
+import threading
+import time
 import matplotlib
 import matplotlib.pyplot as plt
 
 from io import BytesIO
-from mpl_toolkits.axes_grid1 import make_axes_locatable
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib import cm
-from matplotlib.colors import ListedColormap
-from scipy.ndimage import gaussian_filter
-from scipy.signal import peak_widths, find_peaks
 from PIL import Image, ImageDraw, UnidentifiedImageError
-from skimage.restoration import unwrap_phase
-from skimage.registration import phase_cross_correlation
+# Headless analysis (FFT, filter, unwrap, Abel and density) of this software
+from intanalysis import (AnalysisCancelled, AnalysisError, AnalysisSession, MapView, ShotFiles,
+                         StageProfiler, abel_methods, clear_reference_cache, colormap, open_image, read_frame,
+                         unwrap_methods)
 
 # Matplotlib Tk style
 matplotlib.use('TkAgg')
@@ -41,11 +37,6 @@ sg.theme('DarkGrey4')
 
 # Image files types
 file_types = [("SNP (*.snp)", "*.snp"), ("PNG (*.png)", "*.png"), ("All files (*.*)", "*.*")]
-# Temp files
-tmp_file = tempfile.NamedTemporaryFile(suffix=".png").name
-tmp_file2 = tempfile.NamedTemporaryFile(suffix=".png").name
-tmp_file_plot = 'temp_plot_abel.png'
-
 # INITIALPARAMETERS
 # Image paths
 path1 = ''
@@ -78,27 +69,29 @@ width3, height3 = size3 = 428, 342  # Scale image - Result
 minvalue_x, maxvalue_x, minvalue_y, maxvalue_y = 0, 428, 0, 342
 # Frame 1D visible
 visible_f1d = False
+# Maps of the last analysis (a new analysis only computes the stages whose parameters changed)
+session = AnalysisSession()
+# Analysis running on a worker thread and its stop signal
+analysis_thread = None
+cancel_analysis = threading.Event()
+# 1D profile figure updated in place by the slider (None = not shown) and minimum time between two redraws (s)
+profile1d = None
+slider_pending = False
+slider_interval = 0.03
+# Preview of the interferogram with the selected area (resized and rotated image kept in memory), area drawing
+# waiting for the end of the spin events and minimum time between two drawings (s)
+preview = {'key': None, 'image': None}
+roi_pending = False
+roi_drawn = 0.0
+preview_interval = 0.05
+# 2D view kept between plots (maps are swapped in place) and its Tk canvas
+map_view = MapView(figsize=(4.9, 4))
+map_canvas = None
 
 
 #################################################################################
 # FUNCTIONS
 ################################################################################
-# GET BINARY DATA
-def getBinaryData(filename):
-    '''
-    path file name to binary value
-    :param filename: path of file
-    :return: binary value
-    '''
-    binary_values = []
-    with open(filename, 'rb') as f:
-        data = f.read(1)
-        while data != b'':
-            binary_values.append(ord(data))
-            data = f.read(1)
-        return binary_values
-
-
 # DRAW FIGURE FROM FILES
 def draw_figure(canvas, figure):
     '''
@@ -143,7 +136,7 @@ def apply_drawing(values, window):
     '''
     :param values: x and y labels of rectangle
     :param window: main window
-    :return: rectangle drown on temp image file
+    :return: None (the preview with the rectangle is shown in the window)
     '''
     image_file = values["file1"]
     begin_x = get_value("-BEGIN_X-", values)
@@ -153,72 +146,195 @@ def apply_drawing(values, window):
     rotate_degree = get_value("-DEGREE-", values)
 
     if os.path.exists(image_file):
-        shutil.copy(image_file, tmp_file)
-        imagetmp = Image.open(tmp_file)
-        imagetmp = imagetmp.resize(size)
-        imagetmp = imagetmp.rotate(rotate_degree, resample=Image.Resampling.BICUBIC)
+        # The rectangle is drawn on a copy of the preview kept in memory
+        imagetmp = preview_image(image_file, rotate_degree).copy()
         draw = ImageDraw.Draw(imagetmp)
         draw.rectangle((begin_x, begin_y, end_x, end_y), width=2, outline='#FFFFFF')  ##DCDCDC
-        imagetmp.save(tmp_file)
         bio = io.BytesIO()
-        imagetmp.save(bio, format='PNG')
+        imagetmp.save(bio, format='PNG', compress_level=1)
         window["image1"].update(data=bio.getvalue(), size=size)
 
 
-# NEW COLORMAPS
-def func_colormap(n):
+# PREVIEW OF THE INTERFEROGRAM
+def preview_image(image_file, rotate_degree):
+    '''
+    Interferogram resized to the window and rotated. The last preview is kept in memory and is computed again only
+    when the file or the angle change.
+    :param image_file: path of file
+    :param rotate_degree: angle to image rotation
+    :return: PIL image
+    '''
+    info = os.stat(image_file)
+    key = (image_file, info.st_mtime_ns, info.st_size, rotate_degree)
+    if preview['key'] != key:
+        imagetmp = open_image(image_file)
+        imagetmp = imagetmp.resize(size)
+        imagetmp = imagetmp.rotate(rotate_degree, resample=Image.Resampling.BICUBIC)
+        preview['key'], preview['image'] = key, imagetmp
+    return preview['image']
+
+
+# ANALYSIS ON A WORKER THREAD
+def run_analysis(window, ref, shots, params, profiler, cancel):
+    '''
+    Analyse the interferograms without blocking the window. Progress and the end of the analysis are sent to the
+    window as the events '-progress-' (stage, done, total) and '-analysis-' (result, error, warnings); the end is
+    always sent, also after unexpected errors, so the buttons of the window are enabled again.
+    :param window: main window
+    :param ref: reference interferogram array
+    :param shots: plasma interferograms (ShotFiles, read during the analysis)
+    :param params: analysis parameters
+    :param profiler: StageProfiler of the analysis
+    :param cancel: threading.Event that stops the analysis
+    :return: None
+    '''
+    def progress(stage_name, done, total):
+        window.write_event_value('-progress-', (stage_name, done, total))
+
+    # warnings of the shots are collected by the session (warnings.catch_warnings is not thread-safe)
+    result, error, messages = None, None, []
+    try:
+        result = session.analyse(ref, shots, profiler=profiler, progress=progress, cancel=cancel,
+                                 on_warning=messages.append, **params)
+    except (AnalysisError, OSError, ValueError) as e:
+        # analysis errors and files that can not be read
+        error = e
+    except Exception as e:
+        # unexpected errors (memory, images in other formats, worker processes) are also shown to the user
+        error = AnalysisError('%s: %s' % (type(e).__name__, e))
+    finally:
+        window.write_event_value('-analysis-', (result, error, messages))
+
+
+# SUMMARY OF THE WARNINGS OF AN ANALYSIS
+def warnings_summary(messages):
     '''
-    Color distribution at the colormap
-    :param n: n_order for colormap (linear,quadratic, cubic)
-    :return: colormap distribution
+    Text with the number of warnings and each different message
+    :param messages: list of warning messages
+    :return: string (empty without warnings)
     '''
-    return ListedColormap(cm.get_cmap('rainbow_r', 512)(np.power(np.linspace(1, 0, 512), n)))
+    if not messages:
+        return ''
+    lines = ['%d warning(s):' % len(messages)]
+    for message in dict.fromkeys(messages):
+        count = messages.count(message)
+        lines.append(message if count == 1 else '%s (x%d)' % (message, count))
+    return '\n'.join(lines) + '\n'
 
 
-# CREATING MEAN MAPS/ARRAY AND STD ARRAY
-def mean_maps(data):
+# OPTIONS OF THE 1D PROFILE FIGURE
+def profile_1d_key(values):
     '''
-    2D Array mean
-    :param n: group of 2D arrays
-    :return: 2D array
+    Options that define the 1D profile figure (the figure is built again when they change)
+    :param values: values of the window
+    :return: tuple of options
     '''
-    mean_data = data[0] / len(data)
-    for i in range(1, len(data)):
-        mean_data = mean_data + data[i] / len(data)
-    return mean_data
+    return tuple(values[key] for key in ('fftradio', 'filterradio', 'phaseradio', 'abelradio', 'densradio',
+                                         '-checkstd-', '-comboaxisymm-', '-checkpos1-', '-pos1-', '-checkpos2-',
+                                         '-pos2-', '-checkpos3-', '-pos3-'))
 
 
-def std_maps(data, mean_data):
+# 1D PROFILE AT A NEW SLIDER POSITION
+def update_profile_1d(view, slider):
     '''
-    standard deviation of 2D Array maps
-    :param n: group of 2D arrays and mean 2D array
-    :return: std of 2D array
+    Move the profile lines of the 1D figure to a new height (set_data) and redraw only them (blitting)
+    :param view: dict of the 1D figure (artists, maps and background)
+    :param slider: slider value (pixel from the origin)
+    :return: height (um), profile and its std
     '''
-    desv = (data[0] - mean_data) * (data[0] - mean_data)
-    for i in range(1, len(data)):
-        desv = desv + (data[i] - mean_data) * (data[i] - mean_data)
+    matrix_plot, matrix_plot_std = view['matrix'], view['std']
+    ax1, canvas = view['ax'], view['canvas']
+    if view['axisymm'] == 'vertical':
+        pos = view['pos_0'] - slider
+        array_plot = matrix_plot[pos]
+        array_std = matrix_plot_std[pos]
+    else:
+        pos = slider
+        array_plot = matrix_plot[:, pos]
+        array_std = matrix_plot_std[:, pos]
+    h_prof = slider * view['factor'] * 1e6
+    raxis_um = view['raxis']
+
+    view['line'].set_data(raxis_um, array_plot)
+    view['line'].set_label(view['label'] % h_prof)
+    artists = [view['line']]
+    if view['errorbar'] is not None:
+        data_line, _, (barlines,) = view['errorbar']
+        data_line.set_data(raxis_um, array_plot)
+        barlines.set_segments([[(x, y - e), (x, y + e)] for x, y, e in zip(raxis_um, array_plot, array_std)])
+        artists += [data_line, barlines]
+    if view['std_line'] is not None:
+        view['std_line'].set_data(raxis_um, array_std)
+        view['std_line'].set_label('$\||\Delta\phi\||_{%d \hspace{.5}\mu m}$' % h_prof)
+        view['fill'].remove()
+        view['fill'] = ax1.fill_between(raxis_um, array_plot, array_std, color="orange", alpha=0.5,
+                                        label='$(\sigma_{Abel})_{%d}$' % h_prof)
+        artists += [view['std_line'], view['fill']]
+    # Legend with the new height
+    view['legend'].remove()
+    view['legend'] = ax1.legend()
+    artists.append(view['legend'])
+
+    if view['background'] is None:
+        canvas.draw()
+    else:
+        canvas.restore_region(view['background'])
+        for artist in artists:
+            ax1.draw_artist(artist)
+        canvas.blit(view['fig'].bbox)
+    view['drawn'] = time.perf_counter()
+    return h_prof, array_plot, array_std
+
+
+# MAP OF THE 2D VIEW
+def map_2d(values):
+    '''
+    Map selected by the user and its plot options
+    :param values: values of the window
+    :return: map, colormap, colorbar label, extent (um) and filter line (see MapView.show)
+    '''
+    if values['fftradio'] == True:  # Plot FFT map result
+        return fftmap, 'gray', None, None, (values['-combofringe-'], centerfilter)
+    elif values['filterradio'] == True:  # Plot gaussian filter map
+        return gfilter, 'gray', None, None, None
+    elif values['phaseradio'] == True:  # Plot phase map result
+        if values['-checkstd-'] == False:
+            matrix_plot, label = plasma_phasemap_mean, '$\Delta\phi\hspace{.5} (rad)$'
+        else:
+            matrix_plot, label = std_phasemap_mean, '$\sigma_{\Delta\phi}\hspace{.5} (rad)$'
+    elif values['densradio'] == True:  # Plot gas density profile
+        if values['-checkstd-'] == False:
+            matrix_plot, label = plasma_dens_mean, '$N_{e}\hspace{.5} (cm^{-3})$'
+        else:
+            matrix_plot, label = std_dens_mean, '$\sigma_{N_e}\hspace{.5} (cm^{-3})$'
+    else:  # Plot gas density profile from IAT
+        if values['-checkstd-'] == False:
+            matrix_plot, label = plasma_abelmap_mean, '$\Delta\phi_{r}\hspace{.5} (rad/ \mu m)$'
+        else:
+            matrix_plot, label = std_abelmap_mean, '$\sigma_{\Delta\phi_{r}}\hspace{.5} (rad/ \mu m)$'
+    # colormap distribution definition
+    colormap_order = {'Linear': 1, 'Quadratic': 2, 'Cubic': 3}[values['-cmapcombo-']]
+    extentplot = np.shape(matrix_plot)
+    x_max = extentplot[1] * factor * 1e6
+    y_max = extentplot[0] * factor * 1e6
+    return matrix_plot, colormap(colormap_order), label, (x_max, y_max), None
 
-    return np.sqrt(desv / len(data))
 
-# CREATING FRINGES WIDTHS
-def fringes_width(data1):
+# DRAW THE 2D VIEW
+def draw_map(canvas, view, view_canvas):
     '''
-    Calculate 2D array shifts and widths fringes distribution
-    :param n: 2D array, 2D array of ref. image.
-    :return: mean fringe width
+    Show the figure of the 2D view on the window (the Tk canvas of the figure is created only once)
+    :param canvas: image canvas
+    :param view: MapView
+    :param view_canvas: FigureCanvasTkAgg of the view (None = not created yet)
+    :return: FigureCanvasTkAgg of the view
     '''
-    #array with fringes width
-    f_width = np.zeros(np.shape(data1))
-    nl, nr = np.shape(data1)
-    for l in range(0, nl):
-        line1 = (data1[l, :])
-        ypeaks1, _ = find_peaks(line1)
-        y = np.diff(ypeaks1)
-        x = np.linspace(0, nr, len(y))
-        x_interp = np.linspace(0, nr, nr)
-        f_width[l, :] = np.interp(x_interp, x, y)
-
-    return f_width
+    if view_canvas is None:
+        return draw_figure(canvas, view.fig)
+    view_canvas.draw()
+    view_canvas.get_tk_widget().pack(side='top', fill='both', expand=1)
+    return view_canvas
+
 
 '''
 ########################################################################################
@@ -289,14 +405,19 @@ layout_analysis_parameters = [
      sg.Combo(['vertical', 'horizontal'], default_value='horizontal', key='-comboaxisymm-')],
     [sg.Text('Sigma - Gaussian Blur (pixel):    '),
      sg.Input(sigma_gblur, size=(5, 1), key='-sigma_gblur-', enable_events=True)],
+    [sg.Text('Abel Method:              '),
+     sg.Combo(list(abel_methods), default_value='onion_peeling', key='-comboabel-', readonly=True)],
+    [sg.Text('Unwrap:'),
+     sg.Combo(list(unwrap_methods), default_value='reliability', size=(11, 1), key='-combounwrap-', readonly=True),
+     sg.Checkbox('Abel region', default=False, key='-checkunwrap-')],
 ]
 # LAYOUT FRAME OF ALL INPUT OPTIONS
 layout_frame_Options = [
-    [sg.Frame('Select Area', layout_area_selection, size=(198, 210), title_location=sg.TITLE_LOCATION_TOP,
+    [sg.Frame('Select Area', layout_area_selection, size=(198, 262), title_location=sg.TITLE_LOCATION_TOP,
               vertical_alignment="top", font='Arial 10 bold'),
-     sg.Frame('Input Parameters', layout_input_parameters, size=(178, 210), title_location=sg.TITLE_LOCATION_TOP,
+     sg.Frame('Input Parameters', layout_input_parameters, size=(178, 262), title_location=sg.TITLE_LOCATION_TOP,
               vertical_alignment="top", font='Arial 10 bold'),
-     sg.Frame('Analysis Parameters', layout_analysis_parameters, size=(268, 210), title_location=sg.TITLE_LOCATION_TOP,
+     sg.Frame('Analysis Parameters', layout_analysis_parameters, size=(268, 262), title_location=sg.TITLE_LOCATION_TOP,
               vertical_alignment="top", font='Arial 10 bold')],
 ]
 # LAYOUT FRAME LEFT - INPUTS
@@ -308,8 +429,16 @@ layout_frame_ImagesL = [
 layout_frame_ImagesR = [
     [sg.Frame("Interferogram (Ref.)", layout_frame_ImgReference, size=(258, 258), title_location=sg.TITLE_LOCATION_TOP,
               vertical_alignment="top", font='Arial 12 bold')],
-    [sg.Button('Analyse Data', size=(30, 6), font='Arial 12 bold', disabled=True, button_color='black')],
-    [sg.Button('Clear', size=(30, 2), button_color='gray', font='Arial 10 bold')]
+    [sg.Button('Analyse Data', size=(30, 2), font='Arial 12 bold', disabled=True, button_color='black')],
+    # Progress of the running analysis
+    [sg.ProgressBar(100, orientation='h', size=(17, 12), key='-progressbar-'),
+     sg.Button('Cancel', size=(8, 1), font='Arial 10 bold', disabled=True)],
+    [sg.Text('', size=(36, 1), key='-progresstext-', font='Arial 8')],
+    [sg.Button('Clear', size=(30, 2), button_color='gray', font='Arial 10 bold')],
+    # Warnings and time of the stages of the last analysis
+    [sg.Multiline('', size=(40, 5), key='-profile-', font='Courier 7', disabled=True)],
+    # Peak memory of each stage (tracemalloc slows down the analysis)
+    [sg.Checkbox('Profile memory (slower)', default=False, key='-checkmemory-', font='Arial 8')]
 ]
 # lAYOUT GLOBAL INPUTS
 layout_frame_Images = [
@@ -371,18 +500,35 @@ window = sg.Window("Interferogram Analysis - LIP (Version 1.0)", layout, margins
 ####################################################################################################
 '''
 while True:
-    event, values = window.read()
-    # Removing temp files when the main window is closed
+    # Pending redraws are done when no event arrives in their interval
+    if slider_pending:
+        event, values = window.read(timeout=int(1000 * slider_interval))
+    elif roi_pending:
+        event, values = window.read(timeout=int(1000 * preview_interval))
+    else:
+        event, values = window.read()
     if event == sg.WINDOW_CLOSED:
-        if '_temp.png' in path1:
-            os.remove(path1)
-            os.remove(path2)
+        cancel_analysis.set()
         break
 
+    #########################################################################
+    # COORD. OF THE ANALYSIS AREA
+    # Spin events are coalesced: the rectangle is drawn at most once each preview_interval, and the last coordinates
+    # are drawn before any other event.
+    roi_move = event in ('-BEGIN_X-', '-END_X-', '-BEGIN_Y-', '-END_Y-')
+    if roi_move:
+        roi_pending = True
+        centerfilter = 0
+        window['-centerfilter-'].update('0')
+        window['-sigma_gfilter-'].update('0')
+    if roi_pending and (not roi_move or time.perf_counter() - roi_drawn >= preview_interval):
+        roi_pending = False
+        apply_drawing(values, window)
+        roi_drawn = time.perf_counter()
+    if roi_move:
+        continue
+
     if event == 'Clear':
-        if '_temp.png' in path1:
-            os.remove(path1)
-            os.remove(path2)
         window['Rotate (°)'].update(disabled=True)
         window['-DEGREE-'].update(visible=True)
         window['Analyse Data'].update(disabled=True)
@@ -408,6 +554,11 @@ while True:
         window['file2'].update(path1)
         window['-centerfilter-'].update('0')
         window['-sigma_gfilter-'].update('0')
+        profile1d = None
+        preview['key'], preview['image'] = None, None
+        # Releasing reference interferogram values and maps kept between analyses
+        clear_reference_cache()
+        session.clear()
         # Cleaning plots
         try:
             fig_canvas_agg.get_tk_widget().forget()
@@ -426,48 +577,26 @@ while True:
         # No file open
         if path1 == '':
             continue
-        # create PNG files from files SNP
-        # Note: files with SNP extension must be converted to PNG for algorithm analysis
-        if '.snp' in path1:
-            path_files_snp = path_files
-            path_files = []
-            for ipath in path_files_snp:
-                databinary = getBinaryData(ipath)
-                data0 = np.flip(databinary[60:60 + 720 * 576])
-                originalgassnp = Image.new(mode='L', size=(720, 576))
-                originalgassnp.putdata(data0)
-
-                ipath = ipath.replace('.snp', '_temp.png')
-
-                originalgaspng = originalgassnp.save(ipath)
-                if len(path_files) == 0:
-                    path1 = ipath
-                    window['file1'].update(path1)
-
-                path_files.append(ipath)
-
         try:
             # Open Files
-            originalgas = []
-            for i in range(0, len(path_files)):
-                originalgas.append(Image.open(path_files[i]))
+            # Note: the files are read only when the analysis uses them (one at a time, closed at once); the first
+            # one is read now to be shown. Files with SNP extension are decoded in memory (no PNG file is created)
+            originalgas = ShotFiles(path_files)
+            with open_image(path_files[0]) as im:
+                gas_size = im.size
+                im1 = im.resize(size)
             apply_drawing(values, window)
 
-        except UnidentifiedImageError:
+        except (UnidentifiedImageError, ValueError):
             continue
 
         # scale 1: scale for interferogram image
-        w, h = originalgas[0].size
+        w, h = gas_size
         scale = (width / w), (height / h)
-
-        if scale != 1:
-            im1 = originalgas[0].resize(size)
-        else:
-            im1 = originalgas[0]
         data1 = image_to_data(im1)
 
         window['image1'].update(data=data1, size=size)
-        window['-scale1-'].update(originalgas[0].size)
+        window['-scale1-'].update(gas_size)
 
         # Enable buttons
         if path1 != '' and path2 != '':
@@ -487,32 +616,16 @@ while True:
         # No file
         if path2 == '':
             continue
-        # Create PNG files from files SNP
-        if '.snp' in path2:
-            databinary2 = getBinaryData(path2)
-            data02 = np.flip(databinary2[60:60 + 720 * 576])
-            originalrefsnp = Image.new(mode='L', size=(720, 576))
-            originalrefsnp.putdata(data02)
-
-            path2 = path2.replace('.snp', '_temp.png')
-
-            originalrefpng = originalrefsnp.save(path2)
-
-            window['file2'].update(path2)
-
-        # Open files
+        # Open files (SNP files are decoded in memory)
+        # (the file is read again by the analysis: no image is kept open)
         try:
-            originalref = Image.open(path2)
+            with open_image(path2) as originalref:
+                w2, h2 = originalref.size
+                im2 = originalref.resize(size2)
 
-        except UnidentifiedImageError:
+        except (UnidentifiedImageError, ValueError):
             continue
-        w2, h2 = originalref.size
         scale2 = (width2 / w2), (height2 / h2)
-
-        if scale2 != 1:
-            im2 = originalref.resize(size2)
-        else:
-            im2 = originalref
         data2 = image_to_data(im2)
         window['image2'].update(data=data2, size=size2)
         # Enable buttons
@@ -528,27 +641,6 @@ while True:
         centerfilter = 0
         window['-centerfilter-'].update('0')
         window['-sigma_gfilter-'].update('0')
-    # BUTTON COORD AREA
-    elif event == '-BEGIN_X-':
-        apply_drawing(values, window)
-        centerfilter = 0
-        window['-centerfilter-'].update('0')
-        window['-sigma_gfilter-'].update('0')
-    elif event == '-END_X-':
-        apply_drawing(values, window)
-        centerfilter = 0
-        window['-centerfilter-'].update('0')
-        window['-sigma_gfilter-'].update('0')
-    elif event == '-BEGIN_Y-':
-        apply_drawing(values, window)
-        centerfilter = 0
-        window['-centerfilter-'].update('0')
-        window['-sigma_gfilter-'].update('0')
-    elif event == '-END_Y-':
-        apply_drawing(values, window)
-        centerfilter = 0
-        window['-centerfilter-'].update('0')
-        window['-sigma_gfilter-'].update('0')
     #########################################################################
     # BUTTON ROTATE
     elif event == 'Rotate (°)':
@@ -565,6 +657,10 @@ while True:
     #######################################################################
     '''
     if event == 'Analyse Data':
+        # Only one analysis at a time
+        if analysis_thread is not None and analysis_thread.is_alive():
+            continue
+        profile1d = None
         # Cleaning plots
         try:
             fig_canvas_agg.get_tk_widget().forget()
@@ -578,8 +674,6 @@ while True:
             begin_y = int(get_value("-BEGIN_Y-", values) / scale[1])
             end_x = int(get_value("-END_X-", values) / scale[0])
             end_y = int(get_value("-END_Y-", values) / scale[1])
-            # get angle to image rotation
-            rotate_degree = float(get_value('-DEGREE-', values))
             # get value of the rotate degree
             rotate_degree = float(get_value('-DEGREE-', values))
             # get conversion factor in meters/pixel
@@ -595,444 +689,125 @@ while True:
         except:
             sg.popup_error(f"WARNING: Data fields must have numerical values! ")
             continue
-        # Colormap distribution
-        if values['-cmapcombo-'] == 'Linear':
-            colormap_order = 1
-        elif values['-cmapcombo-'] == 'Quadratic':
-            colormap_order = 2
-        elif values['-cmapcombo-'] == 'Cubic':
-            colormap_order = 3
-        newcmp = func_colormap(colormap_order)
-
-        # Rotate Image
-        if rotate_degree != 0:
-            originalref = originalref.rotate(rotate_degree, resample=Image.Resampling.BICUBIC)
-
-        # Input ref. array from ref. image
-        array_ref = np.asarray(originalref)
-
-        # Input original files
-        phasemaps = []
-        plasma_dens, plasma_abelphasemap, plasma_phasemap = [], [], []
-        std_phasemap, std_abelmap, std_plasma_dens = [], [], []
-
-        for j in range(0, len(path_files)):
-            if rotate_degree != 0:
-                originalgas[j] = originalgas[j].rotate(rotate_degree, resample=Image.Resampling.BICUBIC)
-            array_gas = np.asarray(originalgas[j])
-            if np.ndim(array_gas) == 3:
-                # Slice image with 3 channels:only one channel is used to interferogram treatment
-                intref0 = array_ref[:, :, 0]
-                intgas0 = array_gas[:, :, 0]
-            else:
-                intref0 = array_ref[:, :]
-                intgas0 = array_gas[:, :]
-
-            # Use whole image or select area of image
-            if values['-checkcut-'] == True:
-                intref = intref0[begin_y:end_y, begin_x:end_x]
-                intgas = intgas0[begin_y:end_y, begin_x:end_x]
-            else:
-                intref = intref0
-                intgas = intgas0
-
-            # Apply Fast Fourier Transform on interferogram data arrays
-            fftref = np.fft.fft2(intref)  # ref. interferogram
-            fftgas = np.fft.fft2(intgas)  # gas interferogram
-            # Defining line or row to apply gaussian filter
-            fftmap = np.log(np.abs(fftgas))
-            nlmap, nrmap = np.shape(fftmap)
-
-            '''
-            # Authomatic definition of the gaussian filter position: 
-            this position are defined like the line or column (Vertical or horizontal fringes) with more intensity pixel
-            values. This way, this positions are defined using the maximum value of horizontal/vertical pixels sum, 
-            depending on fringes orientation.
-            Note: Case this filter position is not found, the process is interrupted and the user must select another
-            file or another area of interferogram.
-            '''
-            if centerfilter == 0:
-                summap = []
-                # Fringe Orientation: HORIZONTAL or VERTICAL
-                # sum of array rows (vertical)
-                if values['-combofringe-'] == 'vertical':
-                    for i in range(0, nrmap):
-                        summap.append(np.sum(fftmap[:, i]))
-                elif values['-combofringe-'] == 'horizontal':
-                    # sum of array lines (horizontal)
-                    for i in range(0, nlmap):
-                        summap.append(np.sum(fftmap[i,]))
-
-                # Defining point of gaussian filter application using max value of horizontal/vertical pixels sum
-                filterpoints, _ = find_peaks(summap, height=0.9 * np.max(summap))
-                # Range of gaussian filter
-                filterspoints_widths = (peak_widths(summap, filterpoints, rel_height=0.5)[0])
-
-                if len(filterpoints) == 0:
-                    sg.popup(f"WARNING: Unable to apply the Fast Fourier Transform to the selected image!")
-                    continue
-                if values['-combofringe-'] == 'horizontal':
-                    # filter range is equal to FWHM of signal of summaps
-                    if filterpoints[0] <= 5:
-                        centerfilter = filterpoints[1]
-                        centerfilter2 = filterpoints[2]
-                        f_range = int(filterspoints_widths[1])
-                    else:
-                        centerfilter = filterpoints[0]
-                        centerfilter2 = filterpoints[1]
-                        f_range = int(filterspoints_widths[0])
-
-                elif values['-combofringe-'] == 'vertical':
-
-                    if filterpoints[len(filterpoints) - 1] >= nrmap - 5:
-                        centerfilter = filterpoints[len(filterpoints) - 2]
-                        centerfilter2 = filterpoints[len(filterpoints) - 3]
-                        f_range = int(filterspoints_widths[len(filterpoints) - 2])
-                    else:
-                        centerfilter = filterpoints[len(filterpoints) - 1]
-                        centerfilter2 = filterpoints[len(filterpoints) - 2]
-                        f_range = int(filterspoints_widths[len(filterpoints) - 1])
-
-            window['-centerfilter-'].update(str(centerfilter), str(centerfilter2))
-
-            # Creating filter array from null array
-            gfilter = np.zeros(np.shape(fftgas))
-
-            # Creating Filter for Horizontal/vertical fringes orientation
-            if values['-combofringe-'] == 'horizontal':
-                if sigma_gfilter == 0:
-                    # sigma filter is a func of image dimensions and f_rqnge
-                    sigma_gfilter = int(0.005 * nlmap * f_range)
-                    window['-sigma_gfilter-'].update(str(sigma_gfilter))
-                gfilter[centerfilter - f_range:centerfilter + f_range] = np.ones(np.shape(
-                    fftgas[centerfilter - f_range:centerfilter + f_range]))
-                # Applying gaussian filter at selected filter position
-                gfilter = gaussian_filter(gfilter, sigma=sigma_gfilter)
-            elif values['-combofringe-'] == 'vertical':
-                if sigma_gfilter == 0:
-                    # sigma filter is a func of image dimensions and f_rqnge
-                    sigma_gfilter = int(0.005 * nrmap * f_range)
-                    window['-sigma_gfilter-'].update(str(sigma_gfilter))
-                gfilter[:, centerfilter - f_range:centerfilter + f_range] = np.ones(np.shape(
-                    fftgas[:, centerfilter - f_range:centerfilter + f_range]))
-                # Applying gaussian filter at selected filter position
-                gfilter = gaussian_filter(gfilter, sigma=sigma_gfilter)
-
-            # Applying Inverse FFT in resultant array obtained after use of the gaussian filter on FFT arrays
-            ifftref = np.fft.ifft2(gfilter * fftref)
-            ifftgas = np.fft.ifft2(gfilter * fftgas)
-
-            # Creating Phase Maps arrays by subtracting the arguments of IFFT arrays
-            phasemaps = (np.angle(ifftgas) - np.angle(ifftref))
-            # Unwrap phase:
-            uwphasemap = unwrap_phase(phasemaps)
-            '''
-            DEFINING STANDARD DEVIATION:
-            The standard deviation is calculated from fringes intensity distribution, fringes widths and 
-            fringes displacement.
-            '''
-            # Estimating displacement (vertical and horizontal) between interferograms
-            disp_xy, _, _ = phase_cross_correlation(intgas, intref, upsample_factor=100)
-
-            if values['-combofringe-'] == 'vertical':
-                disp = np.absolute(disp_xy[1])
-                # Creating 2D array for fringes width distribution
-                dist_fw = fringes_width(intref)
-
-            if values['-combofringe-'] == 'horizontal':
-                disp = np.absolute(disp_xy[0])
-                # Creating 2D array for fringes width distribution
-                dist_fw = np.transpose(fringes_width(np.transpose(intref)))
-
-            '''
-            NOTE: During our algorithm tests we verify some computational artefacts. 
-            These artifacts are detected only in the multiplication of the intensity distributions. 
-            To correct this error we add a baseline line over data. The baseline has a value equal 
-            to 0.1% of the lesser intensity.  
-            '''
-            # Intensity distribution
-            basedist = 0.001 * np.min(intref) * np.ones(np.shape(intref))
-            if np.min(basedist) == 0.0:
-                basedist = 0.001 * np.min(intgas) * np.ones(np.shape(intref))
-
-            distI1 = intref + basedist
-            distI2 = intgas + basedist
-            try:
-                std_phasemap_i = ((np.pi * disp) / (2 * dist_fw)) * \
-                                 np.sqrt((np.mean(distI1) * (distI1 + distI2)) / (2 * distI1 * distI2))
-            except:
-                std_phasemap_i = np.zeros(np.shape(intref))
-
-            '''
-            ################################################################################
-            Applying Inverse Abel Transform (IAT):
-            The IAT is applied using Dash Onion Peeling algorithm from PyAbel. To apply its library correctly is necessary
-            to define a axis symmetric in image (Horizontal or Vertical) and it is defined from more intensity pixel range. 
-            So, the image is cut according axissymetric.
-            NOTE: the Abel transform is always performed around the vertical axis, so when the image have horizontal
-            axissymmetry the matrix must be transposed.
-        
-            '''
-            # Apply gaussian filter to define the region with more intensity pixel value
-            phasemap_corr = (gaussian_filter(uwphasemap, sigma=sigma))
-            std_phasemap_i = (gaussian_filter(std_phasemap_i, sigma=sigma))
-
-            # Transpose Matrix for Horizontal Axissmetry
-            if values['-comboaxisymm-'] == 'horizontal':
-                phasemap_corr = np.transpose(phasemap_corr)
-                std_phasemap_i = np.transpose(std_phasemap_i)
-
-            # Remove rising background of PIL
-            nlines, nrows = np.shape(phasemap_corr)
-
-            for l in range(0, nlines):
-                bl_map = np.min(phasemap_corr[l]) * np.ones(nrows)
-                phasemap_corr[l] = (phasemap_corr[l] - bl_map) * (-1)
-
-            # Define region with more intensity pixel - position x and y
-            cline, crow = np.where(phasemap_corr <= np.min(phasemap_corr) * 0.98)
-            cy, cx = int(np.median(cline)), int(np.median(crow))
-
-            # If the region not found, set symmetric point like half image
-            if math.isnan(cx) == True:
-                cx = int(nrows / 2)
-            # If right-side of image is more width
-            if cx >= int(nrows / 2):
-                phasemap_corr = np.flip(phasemap_corr, 0)
-                std_phasemap_i = np.flip(std_phasemap_i, 0)
-                fliped_array = True
-                if j == 0:
-                    vert_lim = int(2 * (nrows - cx) + 1)
-            # If left-side of image is more width
+        # Use whole image or select area of image
+        if values['-checkcut-'] == True:
+            roi = (begin_x, begin_y, end_x, end_y)
+        else:
+            roi = None
+        # The filter range of the last analysis is kept while the filter position is defined by user
+        if centerfilter == 0:
+            f_range = 0
+        # Only the analysis area of the files is read when the image is not rotated (the rotation uses the whole
+        # image); the analysis then uses the whole area read
+        if roi is not None and rotate_degree == 0:
+            read_roi, analysis_roi = roi, None
+        else:
+            read_roi, analysis_roi = None, roi
+
+        # Headless analysis of all files (see intanalysis.session) on a worker thread, with the time of each stage
+        profiler = StageProfiler(memory=values['-checkmemory-'])
+        cancel_analysis = threading.Event()
+        analysis_params = dict(roi=analysis_roi, rotate_degree=rotate_degree, lambda0=lambda0, unc_lambda0=unc_lambda0,
+                               factor=factor, centerfilter=centerfilter, f_range=f_range, sigma_gfilter=sigma_gfilter,
+                               sigma_gblur=sigma, fringes=values['-combofringe-'], axisymm=values['-comboaxisymm-'],
+                               abel_method=values['-comboabel-'], unwrap_method=values['-combounwrap-'],
+                               unwrap_region=values['-checkunwrap-'])
+        analysis_thread = threading.Thread(target=run_analysis, daemon=True,
+                                           args=(window, read_frame(path2, read_roi),
+                                                 ShotFiles(originalgas.filenames, read_roi), analysis_params,
+                                                 profiler, cancel_analysis))
+        # the session is changed by the analysis: its last result can not be saved until the end
+        save_data_disabled = window['Save Data'].Disabled
+        window['Analyse Data'].update(disabled=True)
+        window['Clear'].update(disabled=True)
+        window['Save Data'].update(disabled=True)
+        window['Cancel'].update(disabled=False)
+        window['-progressbar-'].update(current_count=0)
+        window['-progresstext-'].update('Analysing...')
+        progress_stage = None
+        analysis_thread.start()
+    #########################################################################
+    # PROGRESS OF THE ANALYSIS (remaining time of the running stage)
+    if event == '-progress-':
+        stage_name, done, total = values['-progress-']
+        if stage_name != progress_stage:
+            progress_stage = stage_name
+            progress_start = time.perf_counter()
+            progress_done = done - 1
+        elapsed = time.perf_counter() - progress_start
+        eta = elapsed / max(done - progress_done, 1) * (total - done)
+        window['-progressbar-'].update(current_count=done, max=total)
+        window['-progresstext-'].update('%s: %d/%d  (ETA %.1f s)' % (stage_name, done, total, eta))
+    #########################################################################
+    # BUTTON CANCEL
+    if event == 'Cancel':
+        cancel_analysis.set()
+        window['Cancel'].update(disabled=True)
+        window['-progresstext-'].update('Cancelling...')
+    #########################################################################
+    # END OF THE ANALYSIS
+    if event == '-analysis-':
+        result, analysis_error, analysis_warnings = values['-analysis-']
+        window['Analyse Data'].update(disabled=False)
+        window['Clear'].update(disabled=False)
+        window['Cancel'].update(disabled=True)
+        window['-progressbar-'].update(current_count=0)
+        window['-profile-'].update(warnings_summary(analysis_warnings))
+        if result is None:
+            # plots of the last analysis are still shown (Save Data saves the displayed map)
+            window['Save Data'].update(disabled=save_data_disabled)
+            if isinstance(analysis_error, AnalysisCancelled):
+                window['-progresstext-'].update('Analysis cancelled')
             else:
-                fliped_array = False
-                if j == 0:
-                    vert_lim = int(2 * cx + 1)
-
-            phasemap_symm = phasemap_corr[:, 0:vert_lim]
-            std_phasemap_symm = std_phasemap_i[:, 0:vert_lim]
-
-            try:
-                # Applying inverse Abel Transform
-                phase_abel0 = abel.Transform((phasemap_symm), symmetry_axis=0, direction='inverse',
-                                             method='onion_peeling').transform
-                std_phase0 = abel.Transform((std_phasemap_symm), symmetry_axis=0, direction='inverse',
-                                            method='onion_peeling').transform
-            except:
-                phase_abel0 = np.zeros(np.shape(phasemap_symm))
-                std_abel0 = np.zeros(np.shape(phasemap_symm))
-                sg.popup_error(f"WARNING: Unable to apply the Abel transform to the selected image! ")
-
-            if fliped_array == True:
-                phase_abel0 = np.flip(phase_abel0, 0)
-                phasemap_corr = np.flip(phasemap_corr, 0)
-                phasemap_symm = np.flip(phasemap_symm, 0)
-                std_phasemap_symm = np.flip(std_phasemap_symm, 0)
-                std_phase0 = np.flip(std_phase0, 0)
-            '''
-            ############################################################################################
-            Calculating std from Abel Transform:
-            The std is calculated using deviation of mormalized phasemap and normalized IAT phasemap  
-            '''
-            rangeh0, rangev0 = np.shape(phase_abel0)
-            phase_abel = phase_abel0[:, int(0.05 * vert_lim): int(0.95 * vert_lim)]
-            norm_phasemap = np.zeros(np.shape(phase_abel))
-            for k in range(0, rangeh0):
-                try:
-                    norm_phasemap[k] = phasemap_symm[k, int(0.05 * vert_lim): int(0.95 * vert_lim)] \
-                                       * np.max(abs(phase_abel[k, :])) \
-                                       / np.max(abs(phasemap_symm[k, int(0.05 * vert_lim): int(0.95 * vert_lim)]))
-                except:
-                    norm_phasemap[k] = np.zeros(np.shape(phase_abel[k, :]))
-
-            std_abelmap_2 = np.sqrt(np.square(phase_abel - norm_phasemap))
-
-            '''
-            ########################################################################################
-            Calculating refraction index and plasma electronic density from IAT phasemap.        
-            '''
-            # Calculating index refraction from IAT of phasemap
-            n_index0 = (1 + (phase_abel0 * lambda0) / (2 * np.pi * factor))
-            # Cutting border of images due the computational artefacts generated by IAT and problems with no symmetric images
-            n_index = n_index0[:, int(0.05 * vert_lim): int(0.95 * vert_lim)]
-            # Calculating plasma density. Const 1.11485e15 1/m
-            try:
-                const_plasma = 1.11485e15
-                plasma_dens_i = (const_plasma * ((np.ones(np.shape(n_index))) - np.square(n_index))) \
-                                / (lambda0 * lambda0) * 1e-6  # cm-3
-
-                plasma_dens_i = plasma_dens_i - np.min(plasma_dens_i) * np.ones(np.shape(plasma_dens_i))
-            except:
-                plasma_dens_i = np.zeros(np.shape(n_index))
-            # new matrix size for plot
-            rangeh, rangev = np.shape(plasma_dens_i)
-
-            '''
-            CALCULATION TOTAL STANDARD DEVIATION FROM:
-            1. Measurement of interferogram
-            2. Inverse Abel Transform
-            3. FWHM Laser wavelength
-            '''
-            dN_n = (-const_plasma * 2 * n_index) / (np.square(lambda0))
-
-            # Contribution 1: measurement interferogram
-            # Contribution 1: measurement interferogram
-            std_phase1 = abs(std_phase0[:, int(0.05 * vert_lim): int(0.95 * vert_lim)] / factor)  # rad/um
-            # Contribution 2: Abel inversion Accuracy
-            std_phase2 = abs(std_abelmap_2 / factor)  # rad/m
-
-            std_phase = np.sqrt(np.square(std_phase1) + np.square(std_phase2))  # rad/m
-            dn_phase = (lambda0) / (2 * np.pi)  #
-
-            # Contribution 3: laser wavelength
-            dn_lambda = phase_abel / (2 * np.pi * factor)  # rad/m
-
-            std_plasma_dens_i = abs(dN_n) * np.sqrt(np.square(dn_phase * std_phase) +
-                                                    np.square(dn_lambda * unc_lambda0)) * 1e-6
-
-            if values['-comboaxisymm-'] == 'horizontal':
-                phasemap_corr = np.transpose(phasemap_corr)
-                phase_abel = np.transpose(phase_abel)
-                std_abelmap_2 = np.transpose(std_abelmap_2)
-                std_phase = np.transpose(std_phase)
-                std_phase1 = np.transpose(std_phase1)
-                std_plasma_dens_i = np.transpose(std_plasma_dens_i)
-                plasma_dens_i = np.transpose(plasma_dens_i)
-                std_phasemap_i = np.transpose(std_phasemap_i)
-                norm_phasemap = np.transpose(norm_phasemap)
-
-            plasma_phasemap.append(phasemap_corr)
-            std_phasemap.append(std_phasemap_i)
-
-            plasma_abelphasemap.append(phase_abel)
-            std_abelmap.append(std_abelmap_2)
-
-            plasma_dens.append(plasma_dens_i)
-            std_plasma_dens.append(std_plasma_dens_i)
-
-        # BUILDING 2D ARRAYS RESULTS FOR:
-        if len(plasma_phasemap) > 1:  # Many files
-            # PHASEMAP
-            plasma_phasemap_mean = mean_maps(plasma_phasemap)
-            std_phasemap_mean = np.sqrt(np.square(mean_maps(std_phasemap)) + \
-                                        np.square(std_maps(plasma_phasemap, plasma_phasemap_mean)))
-            # INV. ABEL TRANSF. MAP
-            plasma_abelmap_mean = mean_maps(plasma_abelphasemap)
-            std_abelmap_mean = np.sqrt(np.square(mean_maps(std_abelmap)) + \
-                                       np.square(std_maps(plasma_abelphasemap, plasma_abelmap_mean)))
-            # PLASMA DENSITY
-            plasma_dens_mean = mean_maps(plasma_dens)
-            std_dens_mean = np.sqrt(np.square(mean_maps(std_plasma_dens)) + \
-                                    np.square(std_maps(plasma_dens, plasma_dens_mean)))
+                window['-progresstext-'].update('')
+                sg.popup(f"WARNING: {analysis_error}")
+            continue
+        window['-progresstext-'].update('%d shot(s) analysed' % result['n_frames'])
+        # Analysis area of the result (saved with the binary export)
+        result_roi = roi
+
+        # Filter parameters defined by the analysis
+        centerfilter = result['centerfilter']
+        f_range = result['f_range']
+        sigma_gfilter = result['sigma_gfilter']
+        window['-centerfilter-'].update(str(centerfilter))
+        window['-sigma_gfilter-'].update(str(sigma_gfilter))
+        # Maps of the last frame
+        fftmap = result['fftmap']
+        gfilter = result['gfilter']
+        norm_phasemap = result['norm_phasemap']
+        # PHASEMAP
+        plasma_phasemap_mean = result['phasemap']
+        std_phasemap_mean = result['std_phasemap']
+        # INV. ABEL TRANSF. MAP
+        plasma_abelmap_mean = result['abelmap']
+        std_abelmap_mean = result['std_abelmap']
+        # PLASMA DENSITY
+        plasma_dens_mean = result['density']
+        std_dens_mean = result['std_density']
+        # matrix size for plot (before transposition of horizontal axisymmetry)
+        if values['-comboaxisymm-'] == 'horizontal':
+            rangev, rangeh = np.shape(plasma_dens_mean)
         else:
-            # PHASEMAP
-            plasma_phasemap_mean = (plasma_phasemap[0])
-            std_phasemap_mean = (std_phasemap[0])
-            # INV. ABEL TRANSF. MAP
-            plasma_abelmap_mean = (plasma_abelphasemap[0])
-            std_abelmap_mean = (std_abelmap[0])
-            # PLASMA DENSITY
-            plasma_dens_mean = (plasma_dens[0])
-            std_dens_mean = (std_plasma_dens[0])
+            rangeh, rangev = np.shape(plasma_dens_mean)
         '''
         BUILDING 2D AND 1D PLOTS
         '''
+        plot_start = time.perf_counter()
         # Ajust slider for horizontal/vertical
         if values['-comboaxisymm-'] == 'vertical':
             window['sliderh'].update(range=(0, rangev - 1))
         elif values['-comboaxisymm-'] == 'horizontal':
             window['sliderh'].update(range=(0, rangeh - 1))
 
-        # Plots are building from user select
-        if values['fftradio'] == True:  # Plot FFT map result
-            matrix_plot = fftmap
-        elif values['filterradio'] == True:  # Plot gaussian filter map
-            matrix_plot = gfilter
-        elif values['phaseradio'] == True:  # Plot phase map result
-            if values['-checkstd-'] == False:
-                matrix_plot = plasma_phasemap_mean
-            else:
-                matrix_plot = std_phasemap_mean
-        elif values['abelradio'] == True:  # Plot gas density profile from IAT
-            if values['-checkstd-'] == False:
-                matrix_plot = plasma_abelmap_mean
-            else:
-                matrix_plot = std_abelmap_mean
-        elif values['densradio'] == True:  # Plot gas density profile
-            if values['-checkstd-'] == False:
-                matrix_plot = plasma_dens_mean
-            else:
-                matrix_plot = std_dens_mean
-
-        # colormap distribution definition
-        if values['-cmapcombo-'] == 'Linear':
-            colormap_order = 1
-        elif values['-cmapcombo-'] == 'Quadratic':
-            colormap_order = 2
-        elif values['-cmapcombo-'] == 'Cubic':
-            colormap_order = 3
-
-        # Creating plot figure parameters
-        fig, ax1 = plt.subplots(figsize=(4.9, 4))
-
-        if values['filterradio'] == True:
-            abel_plot = ax1.imshow(matrix_plot, cmap='gray')
-
-        elif values['fftradio'] == True:
-            if values['-combofringe-'] == 'horizontal':
-                ax1.axhline(y=centerfilter, lw=1, alpha=0.5, color='red')
-            else:
-                ax1.axvline(x=centerfilter, lw=1, alpha=0.5, color='red')
-            ax1.imshow(matrix_plot, cmap='gray')
-
-        elif values['phaseradio'] == True:
-            divider = make_axes_locatable(ax1)
-            extentplot = np.shape(matrix_plot)
-            x_max = extentplot[1] * factor * 1e6
-            y_max = extentplot[0] * factor * 1e6
-            cax = divider.append_axes("right", size="5%", pad=0.05)
-            abel_plot = ax1.imshow(matrix_plot, extent=[0, x_max, 0, y_max], cmap=newcmp)
-            cb1 = fig.colorbar(abel_plot, cax=cax)
-            ax1.set_xlabel('$x\hspace{.5}(\mu m)$', fontsize=12)
-            ax1.set_ylabel('$y\hspace{.5}(\mu m)$', fontsize=12)
-            if values['-checkstd-'] == False:
-                cb1.set_label(label='$\Delta\phi\hspace{.5} (rad)$', size=12, weight='bold')
-            else:
-                cb1.set_label(label='$\sigma_{\Delta\phi}\hspace{.5} (rad)$', size=12, weight='bold')
-
-        elif values['densradio'] == True:
-            divider = make_axes_locatable(ax1)
-            extentplot = np.shape(matrix_plot)
-            x_max = extentplot[1] * factor * 1e6
-            y_max = extentplot[0] * factor * 1e6
-            cax = divider.append_axes("right", size="5%", pad=0.05)
-            abel_plot = ax1.imshow(matrix_plot, extent=[0, x_max, 0, y_max], cmap=newcmp)
-            cb1 = fig.colorbar(abel_plot, cax=cax)
-            ax1.set_xlabel('$x\hspace{.5}(\mu m)$', fontsize=12)
-            ax1.set_ylabel('$y\hspace{.5}(\mu m)$', fontsize=12)
-            if values['-checkstd-'] == False:
-                cb1.set_label(label='$N_{e}\hspace{.5} (cm^{-3})$', size=12, weight='bold')
-            else:
-                cb1.set_label(label='$\sigma_{N_e}\hspace{.5} (cm^{-3})$', size=12, weight='bold')
-
-        else:
-            divider = make_axes_locatable(ax1)
-            extentplot = np.shape(matrix_plot)
-            x_max = extentplot[1] * factor * 1e6
-            y_max = extentplot[0] * factor * 1e6
-            cax = divider.append_axes("right", size="5%", pad=0.05)
-
-            abel_plot = ax1.imshow(matrix_plot, extent=[0, x_max, 0, y_max], cmap=newcmp)
-            cb1 = fig.colorbar(abel_plot, cax=cax)
-            ax1.set_xlabel('$x\hspace{.5}(\mu m)$', fontsize=12)
-            ax1.set_ylabel('$y\hspace{.5}(\mu m)$', fontsize=12)
-            if values['-checkstd-'] == False:
-                cb1.set_label(label='$\Delta\phi_{r}\hspace{.5} (rad/ \mu m)$', size=12, weight='bold')
-            else:
-                cb1.set_label(label='$\sigma_{\Delta\phi_{r}}\hspace{.5} (rad/ \mu m)$', size=12, weight='bold')
-
-        fig.tight_layout(pad=2)
-        fig_canvas_agg = draw_figure(window['canvasabel'].TKCanvas, fig)
+        # Map selected by the user on the 2D view
+        matrix_plot, cmap_2d, label_2d, extent_2d, marker_2d = map_2d(values)
+        map_view.show(matrix_plot, cmap_2d, label_2d, extent_2d, marker_2d)
+        fig = map_view.fig
+        fig_canvas_agg = map_canvas = draw_map(window['canvasabel'].TKCanvas, map_view, map_canvas)
+        # Summary of the stages of the analysis (and plotting)
+        profiler.record('plotting', time.perf_counter() - plot_start)
+        window['-profile-'].update(warnings_summary(analysis_warnings) + profiler.format_summary())
 
         visible_f1d = False
         # Enable/Disable specific buttons and frames for 2D analysis
@@ -1044,6 +819,7 @@ while True:
     #########################################################################
     # BUTTON DENS.PROFILE 2
     if event == '2D Profile':
+        profile1d = None
         # Cleaning plots
         try:
             fig_canvas_agg.get_tk_widget().forget()
@@ -1051,102 +827,16 @@ while True:
             plt.close('all')
         # set height position
         h_prof = -1.0
-        # Plots are building from user select
-        if values['fftradio'] == True:  # Plot FFT map result
-            matrix_plot = fftmap
-        elif values['filterradio'] == True:  # Plot gaussian filter map
-            matrix_plot = gfilter
-        elif values['phaseradio'] == True:  # Plot phase map result
-            if values['-checkstd-'] == False:
-                matrix_plot = plasma_phasemap_mean
-            else:
-                matrix_plot = std_phasemap_mean
-        elif values['abelradio'] == True:  # Plot gas density profile from IAT
-            if values['-checkstd-'] == False:
-                matrix_plot = plasma_abelmap_mean
-            else:
-                matrix_plot = std_abelmap_mean
-        elif values['densradio'] == True:  # Plot gas density profile
-            if values['-checkstd-'] == False:
-                matrix_plot = plasma_dens_mean
-            else:
-                matrix_plot = std_dens_mean
-
-        # colormap distribution definition
-        if values['-cmapcombo-'] == 'Linear':
-            colormap_order = 1
-        elif values['-cmapcombo-'] == 'Quadratic':
-            colormap_order = 2
-        elif values['-cmapcombo-'] == 'Cubic':
-            colormap_order = 3
-        newcmp = func_colormap(colormap_order)
-
         try:
             # clearing figures and plots
             fig_canvas_agg.get_tk_widget().forget()
             plt.close('all')
 
-            # Instead of plt.show
-            fig, ax1 = plt.subplots(figsize=(4.9, 4))
-
-            if values['filterradio'] == True:
-                abel_plot = ax1.imshow(matrix_plot, cmap='gray')
-
-            elif values['fftradio'] == True:
-                if values['-combofringe-'] == 'horizontal':
-                    ax1.axhline(y=centerfilter, lw=1, alpha=0.5, color='red')
-                else:
-                    ax1.axvline(x=centerfilter, lw=1, alpha=0.5, color='red')
-                ax1.imshow(matrix_plot, cmap='gray')
-
-            elif values['phaseradio'] == True:
-                divider = make_axes_locatable(ax1)
-                extentplot = np.shape(matrix_plot)
-                x_max = extentplot[1] * factor * 1e6
-                y_max = extentplot[0] * factor * 1e6
-                cax = divider.append_axes("right", size="5%", pad=0.05)
-                abel_plot = ax1.imshow(matrix_plot, extent=[0, x_max, 0, y_max], cmap=newcmp)
-                cb1 = fig.colorbar(abel_plot, cax=cax)
-                ax1.set_xlabel('$x\hspace{.5}(\mu m)$', fontsize=12)
-                ax1.set_ylabel('$y\hspace{.5}(\mu m)$', fontsize=12)
-                if values['-checkstd-'] == False:
-                    cb1.set_label(label='$\Delta\phi\hspace{.5} (rad)$', size=12, weight='bold')
-                else:
-                    cb1.set_label(label='$\sigma_{\Delta\phi}\hspace{.5} (rad)$', size=12, weight='bold')
-
-            elif values['densradio'] == True:
-                divider = make_axes_locatable(ax1)
-                extentplot = np.shape(matrix_plot)
-                x_max = extentplot[1] * factor * 1e6
-                y_max = extentplot[0] * factor * 1e6
-                cax = divider.append_axes("right", size="5%", pad=0.05)
-                abel_plot = ax1.imshow(matrix_plot, extent=[0, x_max, 0, y_max], cmap=newcmp)
-                cb1 = fig.colorbar(abel_plot, cax=cax)
-                ax1.set_xlabel('$x\hspace{.5}(\mu m)$', fontsize=12)
-                ax1.set_ylabel('$y\hspace{.5}(\mu m)$', fontsize=12)
-                if values['-checkstd-'] == False:
-                    cb1.set_label(label='$N_{e}\hspace{.5} (cm^{-3})$', size=12, weight='bold')
-                else:
-                    cb1.set_label(label='$\sigma_{N_e}\hspace{.5} (cm^{-3})$', size=12, weight='bold')
-
-            else:
-                divider = make_axes_locatable(ax1)
-                extentplot = np.shape(matrix_plot)
-                x_max = extentplot[1] * factor * 1e6
-                y_max = extentplot[0] * factor * 1e6
-                cax = divider.append_axes("right", size="5%", pad=0.05)
-
-                abel_plot = ax1.imshow(matrix_plot, extent=[0, x_max, 0, y_max], cmap=newcmp)
-                cb1 = fig.colorbar(abel_plot, cax=cax)
-                ax1.set_xlabel('$x\hspace{.5}(\mu m)$', fontsize=12)
-                ax1.set_ylabel('$y\hspace{.5}(\mu m)$', fontsize=12)
-                if values['-checkstd-'] == False:
-                    cb1.set_label(label='$\Delta\phi_{r}\hspace{.5} (rad/ \mu m)$', size=12, weight='bold')
-                else:
-                    cb1.set_label(label='$\sigma_{\Delta\phi_{r}}\hspace{.5} (rad/ \mu m)$', size=12, weight='bold')
-
-            fig.tight_layout(pad=2)
-            fig_canvas_agg = draw_figure(window['canvasabel'].TKCanvas, fig)
+            # Map selected by the user on the 2D view
+            matrix_plot, cmap_2d, label_2d, extent_2d, marker_2d = map_2d(values)
+            map_view.show(matrix_plot, cmap_2d, label_2d, extent_2d, marker_2d)
+            fig = map_view.fig
+            fig_canvas_agg = map_canvas = draw_map(window['canvasabel'].TKCanvas, map_view, map_canvas)
 
             visible_f1d = False
             window['frame1d'].update(visible=False)
@@ -1154,8 +844,28 @@ while True:
         except:
             continue
     #########################################################################
+    # SLIDER POSITION ON THE 1D FIGURE
+    # While the options do not change, the 1D figure is kept and only the profile lines are moved. Slider events are
+    # coalesced: at most one redraw each slider_interval, and the last position is drawn when the slider stops.
+    slider_move = event == 'sliderh' and profile1d is not None and profile1d['key'] == profile_1d_key(values)
+    if slider_move:
+        slider_pending = True
+        if time.perf_counter() - profile1d['drawn'] < slider_interval:
+            continue
+    if slider_pending:
+        # The last slider position is drawn before any other event
+        slider_pending = False
+        if profile1d is not None:
+            try:
+                h_prof, array_plot, array_std = update_profile_1d(profile1d, int(values['sliderh']))
+            except:
+                profile1d = None
+        if slider_move or event == sg.TIMEOUT_EVENT:
+            continue
+    #########################################################################
     # BUTTON DENS.PROFILE 1D AND SLIDER POSITION
     if (event == '1D Profile') or (event == 'sliderh'):
+        profile1d = None
         # Cleaning plots
         try:
             fig_canvas_agg.get_tk_widget().forget()
@@ -1221,35 +931,41 @@ while True:
             fig, ax1 = plt.subplots(figsize=(4.9, 4))
 
             ax1.set_xlabel('$r\hspace{.5}(\mu m)$', fontsize=12)
+            # Artists moved by the slider
+            line_1d, errorbar_1d, std_line_1d, fill_1d = None, None, None, None
+            # Vertical limits of all heights (the axes do not change with the slider)
+            ylim_maps = [matrix_plot]
 
             if values['densradio'] == True:
                 labelplot = '$%d \hspace{.5}\mu m$'
-                ax1.plot(raxis_um, array_plot, label=labelplot % h_prof, lw=2, color="blue")
+                line_1d, = ax1.plot(raxis_um, array_plot, label=labelplot % h_prof, lw=2, color="blue")
                 ax1.set_ylabel('$N\hspace{.5} (cm^{-3})$', fontsize=12)
                 if values['-checkstd-'] == True:
-                    ax1.set_ylim(0., (np.max(array_std + array_plot)) * 1.05)
-                    ax1.errorbar(raxis_um, array_plot, yerr=array_std, label='$\sigma_{N}$', alpha=0.2,
-                                 color="blue")
+                    ylim_maps = [np.zeros(1), (matrix_plot + matrix_plot_std) * 1.05]
+                    errorbar_1d = ax1.errorbar(raxis_um, array_plot, yerr=array_std, label='$\sigma_{N}$', alpha=0.2,
+                                               color="blue")
 
             if values['abelradio'] == True:
                 labelplot = '$(\Delta\phi_r)_{%d \hspace{.5}\mu m}$'
-                ax1.plot(raxis_um, array_plot, label=labelplot % h_prof, lw=2, color="blue")
+                line_1d, = ax1.plot(raxis_um, array_plot, label=labelplot % h_prof, lw=2, color="blue")
                 ax1.set_ylabel('$\Delta\phi_{r}\hspace{.5} (rad/ \mu m)$', fontsize=12)
                 if values['-checkstd-'] == True:
-                    ax1.plot(raxis_um, array_std, '--', label='$\||\Delta\phi\||_{%d \hspace{.5}\mu m}$' % h_prof,
-                             lw=2, color="red")
-                    ax1.fill_between(raxis_um, array_plot, array_std, color="orange", alpha=0.5,
-                                     label='$(\sigma_{Abel})_{%d}$' % h_prof)
+                    ylim_maps = [matrix_plot, matrix_plot_std]
+                    std_line_1d, = ax1.plot(raxis_um, array_std, '--',
+                                            label='$\||\Delta\phi\||_{%d \hspace{.5}\mu m}$' % h_prof,
+                                            lw=2, color="red")
+                    fill_1d = ax1.fill_between(raxis_um, array_plot, array_std, color="orange", alpha=0.5,
+                                               label='$(\sigma_{Abel})_{%d}$' % h_prof)
                     # ax1.errorbar(raxis_um, array_plot, yerr=array_std, label='$N$', alpha=0.2, color="blue")
 
             if values['phaseradio'] == True:
                 labelplot = '$%d \hspace{.5}\mu m$'
-                ax1.plot(raxis_um, array_plot, label=labelplot % h_prof, lw=2, color="blue")
+                line_1d, = ax1.plot(raxis_um, array_plot, label=labelplot % h_prof, lw=2, color="blue")
                 ax1.set_ylabel('$\Delta\phi\hspace{.5} (rad)$', fontsize=12)
                 if values['-checkstd-'] == True:
-                    ax1.set_ylim(top = 0.)
-                    ax1.errorbar(raxis_um, array_plot, yerr=array_std, label='$\sigma_{\Delta\phi}$', alpha=0.2,
-                                 color="blue")
+                    ylim_maps = [matrix_plot - matrix_plot_std, np.zeros(1)]
+                    errorbar_1d = ax1.errorbar(raxis_um, array_plot, yerr=array_std, label='$\sigma_{\Delta\phi}$',
+                                               alpha=0.2, color="blue")
 
             # Including new 1D density profile for another height from origin height position
             if values['-checkpos1-'] == True and values['-checkstd-'] == False:
@@ -1280,8 +996,14 @@ while True:
                     ax1.plot(raxis_um, matrix_plot[:, pos3], label=labelplot % h_prof3, lw=1,
                              color="yellow")
 
-            ax1.legend()
+            legend_1d = ax1.legend()
             ax1.grid(True)
+            if line_1d is not None:
+                ylim_min = min(np.nanmin(m) for m in ylim_maps)
+                ylim_max = max(np.nanmax(m) for m in ylim_maps)
+                if np.isfinite(ylim_min) and np.isfinite(ylim_max) and ylim_max > ylim_min:
+                    margin = 0.05 * (ylim_max - ylim_min)
+                    ax1.set_ylim(ylim_min - margin if ylim_min != 0 else 0., ylim_max + margin if ylim_max != 0 else 0.)
             fig.tight_layout(pad=2)
             fig_canvas_agg = draw_figure(window['canvasabel'].TKCanvas, fig)
 
@@ -1289,6 +1011,27 @@ while True:
             window['frame1d'].update(visible=visible_f1d)
         except:
             continue
+        if line_1d is not None:
+            # Figure kept for the next slider positions: background without the moving artists (blitting)
+            moving = [line_1d, legend_1d] + [a for a in (std_line_1d, fill_1d) if a is not None]
+            if errorbar_1d is not None:
+                moving += [errorbar_1d[0]] + list(errorbar_1d[2])
+            try:
+                for artist in moving:
+                    artist.set_visible(False)
+                fig_canvas_agg.draw()
+                background_1d = fig_canvas_agg.copy_from_bbox(fig.bbox)
+            except:
+                background_1d = None
+            for artist in moving:
+                artist.set_visible(True)
+            fig_canvas_agg.draw()
+            profile1d = {'key': profile_1d_key(values), 'fig': fig, 'ax': ax1, 'canvas': fig_canvas_agg,
+                         'background': background_1d, 'matrix': matrix_plot, 'std': matrix_plot_std,
+                         'axisymm': values['-comboaxisymm-'], 'pos_0': np.shape(matrix_plot)[0] - 1,
+                         'factor': factor, 'raxis': raxis_um, 'label': labelplot, 'line': line_1d,
+                         'errorbar': errorbar_1d, 'std_line': std_line_1d, 'fill': fill_1d, 'legend': legend_1d,
+                         'drawn': time.perf_counter()}
     #########################################################################
     # Saving results
     #########################################################################
@@ -1299,17 +1042,28 @@ while True:
                                                save_as=True, no_window=True)
         if save_filename_plot:
             # save the plot
-            plt.savefig(save_filename_plot)
+            fig.savefig(save_filename_plot)
             sg.popup(f"Saved: {save_filename_plot}")
 
     ########################################################################
     #  BUTTON SAVE DATA
     elif event == 'Save Data':
         save_filename_data = sg.popup_get_file('File',
-                                               file_types=[("DAT (*.dat)", "*.dat"), ("TXT (*.txt)", "*.txt")],
+                                               file_types=[("DAT (*.dat)", "*.dat"), ("TXT (*.txt)", "*.txt"),
+                                                           ("NPZ - all stages (*.npz)", "*.npz"),
+                                                           ("HDF5 - all stages (*.h5)", "*.h5")],
                                                save_as=True, no_window=True)
 
-        if save_filename_data:
+        if save_filename_data and save_filename_data.lower().endswith(('.npz', '.h5', '.hdf5')):
+            # Binary file with all stages of the last analysis (mean, std and each frame), axes and parameters
+            try:
+                session.save(save_filename_data, files=originalgas.filenames, roi=result_roi)
+            except (AnalysisError, ImportError, OSError) as e:
+                sg.popup_error(f"WARNING: {e}")
+                continue
+            sg.popup(f"Saved: {save_filename_data}")
+
+        elif save_filename_data:
             file_data = open(save_filename_data, 'a')
             file_data.seek(0)  # sets  point at the beginning of the file
             file_data.truncate()
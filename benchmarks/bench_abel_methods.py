@@ -0,0 +1,140 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# Benchmark of the inverse Abel transform methods (speed and accuracy):
+# 1. Synthetic plasma: gaussian radial profiles with known Abel projection (analytic), with and without noise.
+#    The error is the RMS difference to the exact profile (relative to its maximum), without the borders cut by
+#    the analysis (5% of each side).
+#    Times: PyAbel transform of the maps (as version 1.0), Abel matrix (computed once for each width, see
+#    intanalysis.abelengine) and transform of the maps with the matrix.
+# 2. Example/ interferograms: whole analysis with each method; the error is the RMS difference of the density
+#    to the onion_peeling density (method of version 1.0).
+# The fastest method with error below the tolerance is suggested.
+#   python benchmarks/bench_abel_methods.py [--tolerance 0.02] [--width 201] [--lines 400]
+import argparse
+import os
+import sys
+import timeit
+import warnings
+import abel
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from intanalysis import analyse_shots, read_image
+from intanalysis.abelengine import AbelEngine, abel_methods, abel_options
+
+example_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Example')
+
+
+def synthetic_plasma(lines, width, noise=0.0, seed=0):
+    '''
+    Gaussian radial profiles f(r) = exp(-r^2 / 2 s^2) (s changes line by line) and their Abel projections
+    F(y) = sqrt(2 pi) s exp(-y^2 / 2 s^2), symmetric around the central column
+    :param lines: number of lines
+    :param width: number of columns (odd)
+    :param noise: standard deviation of the gaussian noise added to the projections (relative to their maximum)
+    :param seed: seed of the noise
+    :return: projections and exact profiles (2D arrays)
+    '''
+    r = np.abs(np.arange(width) - width // 2)[None, :]
+    s = np.linspace(0.08, 0.2, lines)[:, None] * width
+    profile = np.exp(-r ** 2 / (2 * s ** 2))
+    projection = np.sqrt(2 * np.pi) * s * profile
+    if noise > 0:
+        rng = np.random.default_rng(seed)
+        projection = projection + noise * np.max(projection) * rng.normal(size=np.shape(projection))
+    return projection, profile
+
+
+def rms_error(result, exact):
+    '''
+    RMS difference without the borders (5% of each side), relative to the maximum of the exact map
+    :param result: 2D array
+    :param exact: 2D array
+    :return: relative error
+    '''
+    width = np.shape(exact)[1]
+    cut = slice(int(0.05 * width), int(0.95 * width))
+    return np.sqrt(np.mean(np.square(result[:, cut] - exact[:, cut]))) / np.max(np.abs(exact[:, cut]))
+
+
+def bench_synthetic(lines, width, noise):
+    '''
+    Time and error of all methods on synthetic plasma
+    :return: dict method -> (PyAbel time (s), matrix time (s), transform time (s), error)
+    '''
+    projection, profile = synthetic_plasma(lines, width, noise)
+    results = {}
+    for method in abel_methods:
+        t_pyabel = min(timeit.repeat(lambda: abel.Transform(projection, symmetry_axis=0, direction='inverse',
+                                                            method=method,
+                                                            transform_options=abel_options.get(method, {})),
+                                     number=1, repeat=3))
+        engine = AbelEngine(method)
+        t_matrix = timeit.timeit(lambda: engine.operator(width), number=1)
+        t_apply = min(timeit.repeat(lambda: engine.inverse(projection), number=1, repeat=5))
+        results[method] = t_pyabel, t_matrix, t_apply, rms_error(engine.inverse(projection), profile)
+    return results
+
+
+def bench_example(roi):
+    '''
+    Time and error (density compared to onion_peeling) of all methods on the Example/ interferograms
+    :param roi: analysis area
+    :return: dict method -> (analysis time (s), error)
+    '''
+    ref = read_image(os.path.join(example_dir, 'interferogram (reference).png'))
+    gas = read_image(os.path.join(example_dir, 'interferogram (plasma).png'))
+    results = {}
+    density0 = None
+    for method in abel_methods:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            analyse_shots(ref, [gas], roi=roi, abel_method=method)  # Abel matrix and reference in memory
+            t = min(timeit.repeat(lambda: analyse_shots(ref, [gas], roi=roi, abel_method=method), number=1,
+                                  repeat=3))
+            density = analyse_shots(ref, [gas], roi=roi, abel_method=method)['density']
+        if density0 is None:
+            density0 = density
+        results[method] = t, rms_error(density, density0)
+    return results
+
+
+def fastest(results, tolerance, time_index, error_index):
+    '''
+    Fastest method with error below the tolerance
+    :return: method name or None
+    '''
+    valid = [m for m in results if results[m][error_index] <= tolerance]
+    return min(valid, key=lambda m: results[m][time_index]) if valid else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Speed and accuracy of the inverse Abel transform methods')
+    parser.add_argument('--tolerance', type=float, default=0.02, help='maximum relative RMS error (default: 0.02)')
+    parser.add_argument('--width', type=int, default=201, help='width of the synthetic maps (pixel)')
+    parser.add_argument('--lines', type=int, default=400, help='lines of the synthetic maps')
+    parser.add_argument('--roi', nargs=4, type=int, default=(382, 143, 604, 221),
+                        help='analysis area of the Example/ interferograms')
+    args = parser.parse_args()
+
+    for noise in (0.0, 0.001):
+        print('Synthetic gaussian plasma: %d lines x %d pixels, noise %g' % (args.lines, args.width, noise))
+        print('%-15s %12s %12s %14s %12s' % ('method', 'PyAbel (ms)', 'matrix (ms)', 'transform (ms)', 'error'))
+        results = bench_synthetic(args.lines, args.width, noise)
+        for method, (t_pyabel, t_matrix, t_apply, error) in results.items():
+            print('%-15s %12.1f %12.1f %14.2f %12.2e'
+                  % (method, 1e3 * t_pyabel, 1e3 * t_matrix, 1e3 * t_apply, error))
+        print('fastest PyAbel transform with error <= %g: %s\n'
+              % (args.tolerance, fastest(results, args.tolerance, 0, 3)))
+
+    print('Example/ interferograms, area %s (error: density compared to onion_peeling)' % (tuple(args.roi),))
+    print('%-15s %12s %12s' % ('method', 'total (ms)', 'error'))
+    results = bench_example(tuple(args.roi))
+    for method, (t, error) in results.items():
+        print('%-15s %12.1f %12.2e' % (method, 1e3 * t, error))
+    print('fastest with error <= %g: %s' % (args.tolerance, fastest(results, args.tolerance, 0, 1)))
+
+
+if __name__ == '__main__':
+    main()
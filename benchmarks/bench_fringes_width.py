@@ -0,0 +1,74 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# Benchmark of the fringes widths calculation: vectorized method vs. find_peaks loop (version 1.0).
+# Both methods are applied to areas of the Example/ interferograms (vertical and horizontal fringes) and the
+# maximum difference between the results is printed with the time of each method. Both methods must also refuse an
+# interferogram with a line without fringes (ValueError), instead of a width of 0.
+#   python benchmarks/bench_fringes_width.py
+import os
+import sys
+import timeit
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from intanalysis.fringes import fringes_width
+from intanalysis.readers import read_image
+
+example_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Example')
+# Analysis areas (begin_x, begin_y, end_x, end_y); None = whole image
+rois = [(382, 143, 604, 221), (300, 100, 700, 300), (100, 50, 1000, 700), None]
+
+
+def bench(data1, repeat=3):
+    '''
+    Time both methods on one 2D array
+    :param data1: 2D array
+    :param repeat: number of repetitions (best time is used)
+    :return: max difference, find_peaks time (s), vectorized time (s)
+    '''
+    ref = fringes_width(data1, 'find_peaks')
+    new = fringes_width(data1, 'vectorized')
+    t_loop = min(timeit.repeat(lambda: fringes_width(data1, 'find_peaks'), number=1, repeat=repeat))
+    t_vect = min(timeit.repeat(lambda: fringes_width(data1, 'vectorized'), number=1, repeat=repeat))
+    return np.max(np.abs(ref - new)), t_loop, t_vect
+
+
+def check_fringe_free_line():
+    '''
+    Both methods raise ValueError on an interferogram whose line 3 has no fringes
+    :return: None
+    '''
+    data1 = np.tile(1 + np.cos(2 * np.pi * np.arange(64) / 8.0), (8, 1))
+    data1[3] = 1.0
+    for method in ('find_peaks', 'vectorized'):
+        try:
+            fringes_width(data1, method)
+        except ValueError:
+            continue
+        raise AssertionError('%s: line without fringes not refused' % method)
+    print('line without fringes: refused by both methods')
+
+
+def main():
+    check_fringe_free_line()
+    print('%-34s %-12s %-12s %10s %10s %8s' % ('file', 'shape', 'fringes', 'loop (ms)', 'vect (ms)', 'max diff'))
+    for name in sorted(os.listdir(example_dir)):
+        image = read_image(os.path.join(example_dir, name))
+        if np.ndim(image) == 3:
+            image = image[:, :, 0]
+        for roi in rois:
+            data1 = image if roi is None else image[roi[1]:roi[3], roi[0]:roi[2]]
+            for fringes, data in (('vertical', data1), ('horizontal', np.transpose(data1))):
+                try:
+                    diff, t_loop, t_vect = bench(data)
+                except ValueError:
+                    # lines without fringes: version 1.0 loop can not interpolate them
+                    continue
+                print('%-34s %-12s %-12s %10.2f %10.2f %8.1e  x%.1f'
+                      % (name[:34], '%dx%d' % np.shape(data1), fringes, 1e3 * t_loop, 1e3 * t_vect, diff,
+                         t_loop / t_vect))
+
+
+if __name__ == '__main__':
+    main()
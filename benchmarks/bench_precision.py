@@ -0,0 +1,117 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# Benchmark of the single precision mode (precision='single': float32 maps and complex64 spectra) against the
+# double precision analysis (version 1.0) on the Example/ interferograms.
+# For each analysis area, a run of the same plasma frame repeated --frames times is analysed in both precisions.
+# The error of each map is the RMS difference to the double precision map (relative to its maximum, without
+# non-finite pixels) and the maximum difference (relative to the maximum). Times are the best of --repeat runs and
+# the peak memory is measured by tracemalloc (numpy arrays included). Results are saved in
+# benchmarks/results/<label>.json (default: precision.json), with the environment of bench_stages.py.
+#   python benchmarks/bench_precision.py [--frames 20] [--repeat 3] [--label precision]
+import argparse
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+import warnings
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from intanalysis import analyse_shots, clear_reference_cache, read_image
+from bench_stages import environment, results_dir
+
+example_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Example')
+# Analysis areas (begin_x, begin_y, end_x, end_y); None = whole image
+rois = [(382, 143, 604, 221), (300, 100, 700, 300), None]
+# Maps compared
+compared_maps = ('phasemap', 'abelmap', 'density', 'std_phasemap', 'std_abelmap', 'std_density')
+
+
+def map_errors(result, exact):
+    '''
+    Differences of a map to the double precision map, relative to the maximum of the double precision map
+    :param result: 2D array (single precision)
+    :param exact: 2D array (double precision)
+    :return: relative RMS difference and relative maximum difference
+    '''
+    valid = np.isfinite(exact) & np.isfinite(result)
+    scale = np.max(np.abs(exact[valid])) if np.any(valid) else 0.0
+    if scale == 0:
+        return 0.0, 0.0
+    diff = np.abs(np.asarray(result[valid], dtype=float) - exact[valid])
+    return np.sqrt(np.mean(np.square(diff))) / scale, np.max(diff) / scale
+
+
+def run(ref, shots, roi, precision):
+    '''
+    Analysis of a run in one precision
+    :return: result
+    '''
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return analyse_shots(ref, shots, roi=roi, precision=precision)
+
+
+def peak_memory(ref, shots, roi, precision):
+    '''
+    Peak memory of the analysis of a run (reference context computed again)
+    :return: peak memory (bytes)
+    '''
+    clear_reference_cache()
+    tracemalloc.start()
+    run(ref, shots, roi, precision)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Speed, memory and accuracy of the single precision analysis')
+    parser.add_argument('--frames', type=int, default=20, help='frames of each run (default: 20)')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions of the time measurements (default: 3)')
+    parser.add_argument('--label', default='precision', help='name of the result file (default: precision)')
+    args = parser.parse_args()
+
+    ref = read_image(os.path.join(example_dir, 'interferogram (reference).png'))
+    gas = read_image(os.path.join(example_dir, 'interferogram (plasma).png'))
+    shots = [gas] * args.frames
+    env = environment()
+    saved = {}
+    for roi in rois:
+        area = 'whole image' if roi is None else '%d,%d,%d,%d' % tuple(roi)
+        print('Example/ interferograms, area %s, %d frames' % (area, args.frames))
+        results, times, memory = {}, {}, {}
+        for precision in ('double', 'single'):
+            results[precision] = run(ref, shots, roi, precision)  # Abel matrix and reference in memory
+            times[precision] = min(timeit.repeat(lambda: run(ref, shots, roi, precision), number=1,
+                                                 repeat=args.repeat))
+            memory[precision] = peak_memory(ref, shots, roi, precision)
+        saved[area] = {precision: {'time': times[precision], 'peak_memory': memory[precision]}
+                       for precision in ('double', 'single')}
+        print('%-8s %12s %12s' % ('', 'time (ms)', 'peak (MB)'))
+        for precision in ('double', 'single'):
+            print('%-8s %12.1f %12.1f' % (precision, 1e3 * times[precision], memory[precision] / 2 ** 20))
+        print('%-14s %12s %12s' % ('map', 'RMS error', 'max error'))
+        for key in compared_maps:
+            if np.shape(results['single'][key]) != np.shape(results['double'][key]):
+                # another symmetric region found by the single precision analysis
+                print('%-14s %25s' % (key, 'different shapes'))
+                saved[area][key] = {'error': 'different shapes'}
+                continue
+            rms, max_diff = map_errors(results['single'][key], results['double'][key])
+            saved[area][key] = {'rms': float(rms), 'max': float(max_diff)}
+            print('%-14s %12.2e %12.2e' % (key, rms, max_diff))
+        print('')
+
+    os.makedirs(results_dir, exist_ok=True)
+    filename = os.path.join(results_dir, args.label + '.json')
+    with open(filename, 'w') as f:
+        json.dump({'label': args.label, 'frames': args.frames, 'environment': env, 'results': saved}, f, indent=1,
+                  sort_keys=True)
+    print('Results saved in %s' % filename)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# Benchmark of each stage of the analysis (SNP decode, rotation/cut, FFT, carrier detection, filter, IFFT/phase,
+# unwrap, displacement, fringes widths, Abel, density, mean/std maps, plot and Save Data) and of whole runs of
+# 1, 10 and 100 shots, for analysis areas from 50x50 to 720x576 pixels of the Example/ interferograms and of
+# synthetic interferograms. Results are saved in benchmarks/results/<label>.json; two result files are compared
+# to find regressions between versions:
+#   python benchmarks/bench_stages.py [--quick] [--label NAME]
+#   python benchmarks/bench_stages.py --compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import timeit
+import warnings
+import matplotlib
+import numpy as np
+
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from scipy.ndimage import gaussian_filter
+from skimage.registration import phase_cross_correlation
+from skimage.restoration import unwrap_phase
+
+from intanalysis import (ReferenceContext, RunningMaps, analyse_shots, analysis_parameters, get_abel_engine,
+                         get_backend, mean_maps, prepare_frame, read_image, read_snp, std_maps)
+from intanalysis.abelengine import AbelEngine
+from intanalysis.fringes import fringes_width
+from intanalysis.pipeline import (_frame_abel, _frame_density, _frame_phase, find_filter_position,
+                                  gaussian_filter_map, spectrum_profile, unwrap_region)
+from intanalysis.unwrap import unwrap
+from intanalysis.readers import snp_offset, snp_size
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+example_dir = os.path.join(bench_dir, '..', 'Example')
+results_dir = os.path.join(bench_dir, 'results')
+# Analysis areas (width, height) and number of shots of the runs
+roi_sizes = [(50, 50), (100, 100), (200, 200), (400, 300), (720, 576)]
+run_sizes = [1, 10, 100]
+# Center of the plasma in the Example/ interferograms (pixel)
+example_center = 493, 182
+# A stage is a regression when its time grows more than this factor
+regression_factor = 1.2
+
+
+#################################################################################
+# INPUT DATA
+################################################################################
+def synthetic_interferograms(width, height, period=8.0, amplitude=6.0, seed=0):
+    '''
+    Synthetic reference and plasma interferograms (uint8, as SNP frames): vertical fringes and a plasma
+    channel along the horizontal axis (gaussian phase profile growing along the channel)
+    :param width: number of columns
+    :param height: number of lines
+    :param period: fringes period (pixel)
+    :param amplitude: maximum phase of the plasma (rad)
+    :param seed: seed of the noise
+    :return: reference and plasma 2D arrays
+    '''
+    y, x = np.mgrid[0:height, 0:width]
+    sigma = 0.12 * height
+    phase = amplitude * (x / width) * np.exp(-(y - height / 2) ** 2 / (2 * sigma ** 2))
+    rng = np.random.default_rng(seed)
+    ref = 128 + 90 * np.cos(2 * np.pi * x / period) + rng.normal(0, 2, (height, width))
+    gas = 128 + 90 * np.cos(2 * np.pi * x / period + phase) + rng.normal(0, 2, (height, width))
+    return np.clip(ref, 0, 255).astype(np.uint8), np.clip(gas, 0, 255).astype(np.uint8)
+
+
+def example_interferograms(width, height):
+    '''
+    Area of the Example/ interferograms around the plasma
+    :param width: number of columns
+    :param height: number of lines
+    :return: reference and plasma 2D arrays and ROI (begin_x, begin_y, end_x, end_y)
+    '''
+    ref = read_image(os.path.join(example_dir, 'interferogram (reference).png'))
+    gas = read_image(os.path.join(example_dir, 'interferogram (plasma).png'))
+    nl, nr = np.shape(ref)
+    begin_x = min(max(example_center[0] - width // 2, 0), nr - width)
+    begin_y = min(max(example_center[1] - height // 2, 0), nl - height)
+    return ref, gas, (begin_x, begin_y, begin_x + width, begin_y + height)
+
+
+def write_snp(filename, frame):
+    '''
+    Save a frame as SNP file (header of zeros, pixels from the last to the first one)
+    :param filename: path of SNP file
+    :param frame: 2D array (uint8) with shape (576, 720)
+    :return: None
+    '''
+    with open(filename, 'wb') as f:
+        f.write(bytes(snp_offset))
+        f.write(np.ascontiguousarray(frame, dtype=np.uint8).ravel()[::-1].tobytes())
+
+
+#################################################################################
+# TIME MEASUREMENT
+################################################################################
+def measure(func, repeat=5, min_time=0.05):
+    '''
+    Time of one call of a function: number of calls of each repetition is increased until min_time
+    :param func: function without arguments
+    :param repeat: number of repetitions
+    :param min_time: minimum time of each repetition (s)
+    :return: dict with min, median (s) and number of calls
+    '''
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        t = timer.timeit(number)
+        if t >= min_time or number >= 1000:
+            break
+        number *= 10
+    times = [t / number] + [timer.timeit(number) / number for _ in range(1, repeat)]
+    return {'min': min(times), 'median': float(np.median(times)), 'number': number, 'repeat': repeat}
+
+
+def stage_functions(ref, gas, roi, params):
+    '''
+    Functions of each stage of the analysis of one frame (inputs are computed once)
+    :param ref: reference interferogram (whole image)
+    :param gas: plasma interferogram (whole image)
+    :param roi: analysis area
+    :param params: analysis parameters
+    :return: dict stage name -> function without arguments
+    '''
+    fft = get_backend(params['fft_backend'], params['fft_workers'])
+    intref = prepare_frame(ref, roi)
+    intgas = prepare_frame(gas, roi)
+    refctx = ReferenceContext(intref, fft)
+    frame = _frame_phase(refctx, intgas, params)
+    fftgas = fft.fft2(intgas)
+    fftmap = np.log(np.abs(fftgas))
+    gfilter, sigma_gfilter, phaseref = refctx.filtered_phase(params['fringes'], frame['centerfilter'],
+                                                             frame['f_range'], params['sigma_gfilter'])
+    phasemaps = np.angle(fft.ifft2(gfilter * fftgas)) - phaseref
+    engine = get_abel_engine(params['abel_method'])
+    abel_maps = np.concatenate((frame['phasemap_symm'], frame['std_phasemap_symm']))
+    _frame_abel([frame], params)
+    result = _frame_density(frame, params)
+    density = result['density']
+    shots = [density + 0.01 * k * np.max(density) for k in range(0, 10)]
+
+    def plot():
+        fig, ax1 = plt.subplots(figsize=(4.9, 4))
+        plot2d = ax1.imshow(density, cmap='jet')
+        fig.colorbar(plot2d)
+        fig.savefig(io.BytesIO(), format='png')
+        plt.close(fig)
+
+    def running_maps():
+        maps = RunningMaps()
+        for shot in shots:
+            maps.add(shot, shot)
+        return maps.result()
+
+    return {
+        'rotate_cut': lambda: prepare_frame(gas, roi, 1.0),
+        'fft': lambda: fft.fft2(intgas),
+        'spectrum_profile': lambda: spectrum_profile(fftmap, params['fringes']),
+        'carrier_detection': lambda: find_filter_position(fftmap, params['fringes'],
+                                                          spectrum_profile(fftmap, params['fringes'])),
+        'filter': lambda: gaussian_filter_map(np.shape(fftgas), params['fringes'], frame['centerfilter'],
+                                              frame['f_range'], 0),
+        'ifft_phase': lambda: np.angle(fft.ifft2(gfilter * fftgas)) - phaseref,
+        'unwrap_phase': lambda: unwrap_phase(phasemaps),
+        'unwrap_rows': lambda: unwrap(phasemaps, 'rows'),
+        'unwrap_least_squares': lambda: unwrap(phasemaps, 'least_squares'),
+        'unwrap_region': lambda: unwrap_region(phasemaps, params, frame['vert_lim']),
+        'phase_cross_correlation': lambda: phase_cross_correlation(intgas, intref, upsample_factor=100),
+        'registration_fourier': lambda: phase_cross_correlation(fftgas, refctx.fftref, upsample_factor=100,
+                                                                space='fourier'),
+        'fringes_width': lambda: fringes_width(intref, params['fringes_method']),
+        'gaussian_blur': lambda: gaussian_filter(phasemaps, sigma=params['sigma_gblur']),
+        'abel_matrix': lambda: AbelEngine(params['abel_method']).operator(np.shape(abel_maps)[1]),
+        'abel': lambda: engine.inverse(abel_maps),
+        'density': lambda: _frame_density(frame, params),
+        'mean_std_maps': lambda: std_maps(shots, mean_maps(shots)),
+        'running_maps': running_maps,
+        'plot': plot,
+        'save_data': lambda: np.savetxt(io.StringIO(), density, fmt='%.3e'),
+        'frame': lambda: analyse_shots(ref, [gas], roi=roi),
+    }
+
+
+#################################################################################
+# BENCHMARKS
+################################################################################
+def run_benchmarks(sizes, runs, repeat):
+    '''
+    Time all stages and runs
+    :param sizes: analysis areas (width, height)
+    :param runs: numbers of shots of the runs
+    :param repeat: repetitions of each measurement
+    :return: dict benchmark name -> result (times in s or error message)
+    '''
+    results = {}
+    params = analysis_parameters()
+
+    # SNP decode (frames always have the size of the SNP files)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, 'shot.snp')
+        write_snp(filename, synthetic_interferograms(*snp_size)[1])
+        results['snp_decode'] = measure(lambda: np.array(read_snp(filename)), repeat)
+        print('%-50s %10.3f ms' % ('snp_decode', 1e3 * results['snp_decode']['min']))
+
+    for width, height in sizes:
+        synthetic = synthetic_interferograms(width, height)
+        sources = {'synthetic': (synthetic[0], synthetic[1], (0, 0, width, height)),
+                   'example': example_interferograms(width, height)}
+        for source, (ref, gas, roi) in sources.items():
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                try:
+                    stages = stage_functions(ref, gas, roi, dict(params))
+                except Exception as e:
+                    stages = {}
+                    results['%s/%dx%d' % (source, width, height)] = {'error': str(e)}
+                    print('%-50s error: %s' % ('%s/%dx%d' % (source, width, height), e))
+                for stage, func in stages.items():
+                    name = '%s/%s/%dx%d' % (stage, source, width, height)
+                    try:
+                        results[name] = measure(func, repeat)
+                        print('%-50s %10.3f ms' % (name, 1e3 * results[name]['min']))
+                    except Exception as e:
+                        results[name] = {'error': str(e)}
+                        print('%-50s error: %s' % (name, e))
+
+                # Whole runs (one measurement: the reference and Abel matrix are already in memory)
+                for n_shots in runs:
+                    name = 'run_%d/%s/%dx%d' % (n_shots, source, width, height)
+                    try:
+                        results[name] = measure(lambda: analyse_shots(ref, [gas] * n_shots, roi=roi), 1, 0)
+                        print('%-50s %10.3f ms' % (name, 1e3 * results[name]['min']))
+                    except Exception as e:
+                        results[name] = {'error': str(e)}
+                        print('%-50s error: %s' % (name, e))
+    return results
+
+
+def environment():
+    '''
+    Version of the software and of the computer used in the benchmark
+    :return: dict
+    '''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=bench_dir, capture_output=True,
+                                text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    import scipy
+    import skimage
+    import abel
+    return {
+        'commit': commit,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'scikit-image': skimage.__version__,
+        'pyabel': abel.__version__,
+    }
+
+
+def compare(old_file, new_file, factor=regression_factor):
+    '''
+    Print the time ratio (new / old) of the benchmarks of two result files
+    :param old_file: result file of the old version
+    :param new_file: result file of the new version
+    :param factor: ratios bigger than factor are regressions
+    :return: number of regressions
+    '''
+    with open(old_file) as f:
+        old = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+    print('%s (%s) -> %s (%s)' % (old['label'], old['environment']['commit'], new['label'],
+                                  new['environment']['commit']))
+    print('%-50s %12s %12s %8s' % ('benchmark', 'old (ms)', 'new (ms)', 'ratio'))
+    regressions = 0
+    for name in sorted(set(old['results']) & set(new['results'])):
+        t_old, t_new = old['results'][name].get('min'), new['results'][name].get('min')
+        if t_old is None or t_new is None:
+            continue
+        ratio = t_new / t_old
+        flag = ''
+        if ratio > factor:
+            flag = 'REGRESSION'
+            regressions += 1
+        elif ratio < 1 / factor:
+            flag = 'faster'
+        print('%-50s %12.3f %12.3f %8.2f %s' % (name, 1e3 * t_old, 1e3 * t_new, ratio, flag))
+    print('%d regression(s) (time ratio > %g)' % (regressions, factor))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the analysis stages')
+    parser.add_argument('--quick', action='store_true', help='areas up to 200x200 and runs of 1 and 10 shots')
+    parser.add_argument('--label', default=None, help='name of the result file (default: git commit)')
+    parser.add_argument('--repeat', type=int, default=5, help='repetitions of each measurement')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    parser.add_argument('--factor', type=float, default=regression_factor,
+                        help='time ratio of a regression (default: %g)' % regression_factor)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(args.compare[0], args.compare[1], args.factor) else 0)
+
+    sizes = [s for s in roi_sizes if s[0] * s[1] <= 200 * 200] if args.quick else roi_sizes
+    runs = run_sizes[:2] if args.quick else run_sizes
+    env = environment()
+    results = run_benchmarks(sizes, runs, args.repeat)
+
+    label = args.label or env['commit'] or 'results'
+    os.makedirs(results_dir, exist_ok=True)
+    filename = os.path.join(results_dir, label + '.json')
+    with open(filename, 'w') as f:
+        json.dump({'label': label, 'environment': env, 'results': results}, f, indent=1, sort_keys=True)
+    print('Results saved in %s' % filename)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+'''
+Headless (GUI-free) analysis of laser-induced plasma interferograms.
+'''
+from .pipeline import (DEFAULT_PARAMETERS, AnalysisCancelled, AnalysisError, AnalysisWarning, ReferenceContext,
+                       analysis_parameters, analyse_batch, analyse_frame, analyse_shots, clear_reference_cache,
+                       fringes_width, iter_frames, prepare_frame, reference_context)
+from .abelengine import AbelEngine, abel_methods, get_abel_engine
+from .export import ResultWriter, load_result, read_frames, save_result
+from .fftengine import FFTBackend, get_backend
+from .plotting import MapView, ProfileView, colormap, radial_profile
+from .profiling import StageProfiler
+from .resultcache import ResultCache, clear_result_cache
+from .session import AnalysisSession
+from .stats import RunningMaps, mean_maps, std_maps
+from .unwrap import unwrap, unwrap_methods
+from .readers import ShotFiles, list_shots, open_image, read_frame, read_image, read_snp, read_snp_dir, read_snp_stack
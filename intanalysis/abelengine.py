@@ -0,0 +1,107 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# Inverse Abel transform of the analysis. The inversions of PyAbel (symmetry axis 0) are linear and work line by
+# line, so for one method and width they are a matrix: the transform of the identity. The matrix is computed once for each
+# width, kept in memory (and optionally on disk) and applied to all lines of many maps with one matrix product.
+import os
+import abel
+import numpy as np
+
+from collections import OrderedDict
+
+# Inverse Abel transform methods of PyAbel (onion_peeling is the method of version 1.0)
+abel_methods = ('onion_peeling', 'three_point', 'two_point', 'onion_bordas', 'basex', 'daun', 'hansenlaw', 'direct')
+# Options of the PyAbel methods (basis sets of basex and daun are kept in memory, without messages)
+abel_options = {
+    'basex': {'basis_dir': None, 'verbose': False},
+    'daun': {'verbose': False},
+}
+# Number of Abel matrices (widths) kept in memory by each engine
+abel_cache_size = 8
+
+
+class AbelEngine:
+    '''
+    Inverse Abel transform of one PyAbel method as a matrix product
+    '''
+
+    def __init__(self, method='onion_peeling', cache_dir=None):
+        '''
+        :param method: PyAbel inverse method (see abel_methods)
+        :param cache_dir: directory where the matrices are saved and read again (None = only in memory)
+        '''
+        if method not in abel_methods:
+            raise ValueError('Abel method must be one of: %s' % ', '.join(abel_methods))
+        self.method = method
+        self.cache_dir = cache_dir
+        # Abel matrices by width (LRU)
+        self._operators = OrderedDict()
+
+    def _cache_file(self, width):
+        '''
+        File of the Abel matrix of one width in the cache directory
+        :param width: number of samples of the lines
+        :return: path of .npy file
+        '''
+        return os.path.join(self.cache_dir, 'abel_%s_%s_%d.npy' % (self.method, abel.__version__, width))
+
+    def operator(self, width):
+        '''
+        Matrix of the inverse Abel transform of lines with one width: transform(lines) = lines @ matrix
+        :param width: number of samples of the lines
+        :return: 2D array (width, width)
+        '''
+        if width in self._operators:
+            self._operators.move_to_end(width)
+            return self._operators[width]
+
+        matrix = None
+        if self.cache_dir is not None and os.path.isfile(self._cache_file(width)):
+            try:
+                matrix = np.load(self._cache_file(width))
+            except (OSError, ValueError):
+                matrix = None
+        if matrix is None or np.shape(matrix) != (width, width):
+            # Each line of the identity gives one line of the matrix (PyAbel needs at least 3 lines)
+            matrix = abel.Transform(np.eye(max(width, 3), width), symmetry_axis=0, direction='inverse',
+                                    method=self.method,
+                                    transform_options=abel_options.get(self.method, {})).transform[:width]
+            if self.cache_dir is not None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_file = self._cache_file(width) + '.%d.tmp' % os.getpid()
+                with open(tmp_file, 'wb') as f:
+                    np.save(f, matrix)
+                os.replace(tmp_file, self._cache_file(width))
+
+        self._operators[width] = matrix
+        if len(self._operators) > abel_cache_size:
+            self._operators.popitem(last=False)
+        return matrix
+
+    def inverse(self, maps, dtype=np.float64):
+        '''
+        Inverse Abel transform of all lines of one map or of a stack of maps
+        :param maps: array (..., lines, width)
+        :param dtype: type of the product (np.float32: single precision matrix product)
+        :return: array with the same shape
+        '''
+        maps = np.asarray(maps, dtype=dtype)
+        return maps @ self.operator(np.shape(maps)[-1]).astype(dtype, copy=False)
+
+
+# Engines already created (keep matrices between analyses)
+_engines = {}
+
+
+def get_abel_engine(method='onion_peeling', cache_dir=None):
+    '''
+    Inverse Abel transform engine of the analysis
+    :param method: PyAbel inverse method (see abel_methods)
+    :param cache_dir: directory of the matrices saved on disk (None = only in memory)
+    :return: AbelEngine
+    '''
+    key = method, cache_dir
+    if key not in _engines:
+        _engines[key] = AbelEngine(method, cache_dir)
+    return _engines[key]
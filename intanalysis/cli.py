@@ -0,0 +1,162 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# Command line analysis of a directory of shots:
+#   python -m intanalysis REFERENCE SHOTS [-o result.npz] [options]
+# Input parameters use the same units as the GUI (nm, um/pixel, pixel).
+import argparse
+import sys
+import warnings
+
+from .abelengine import abel_methods
+from .export import ResultWriter
+from .fftengine import fft_backends
+from .fringes import fringes_methods
+from .pipeline import AnalysisError, analyse_shots
+from .profiling import StageProfiler
+from .readers import ShotFiles, list_shots, read_image
+from .resultcache import clear_result_cache
+from .unwrap import unwrap_methods
+
+
+def build_parser():
+    '''
+    Command line arguments
+    :return: argument parser
+    '''
+    parser = argparse.ArgumentParser(prog='intanalysis',
+                                     description='Interferometry Analysis - LIP: plasma density from interferograms '
+                                                 'without GUI.')
+    parser.add_argument('reference', help='reference interferogram file (.snp, .png, ...)')
+    parser.add_argument('shots', help='plasma interferogram file or directory of .snp/.png shots')
+    parser.add_argument('-o', '--output', default='result.npz',
+                        help='output file (.npz, or .h5 with the h5py package), default: result.npz')
+    parser.add_argument('--mean-only', action='store_true',
+                        help='save only the mean and std maps (default: the maps of each frame are also saved)')
+    parser.add_argument('--roi', nargs=4, type=int, metavar=('BEGIN_X', 'BEGIN_Y', 'END_X', 'END_Y'),
+                        help='analysis area in pixels of the original image (default: whole image)')
+    parser.add_argument('--rotate', type=float, default=0.0, help='image rotation in degrees')
+    parser.add_argument('--lambda0', type=float, default=395.0, help='laser wavelength (nm)')
+    parser.add_argument('--bandwidth', type=float, default=0.0, help='laser bandwidth FWHM (nm)')
+    parser.add_argument('--factor', type=float, default=1.0, help='scaling factor (um/pixel)')
+    parser.add_argument('--center-filter', type=int, default=0, help='gaussian filter position (pixel), 0 = automatic')
+    parser.add_argument('--filter-range', type=int, default=0, help='gaussian filter range (pixel), 0 = automatic')
+    parser.add_argument('--sigma-gfilter', type=int, default=0, help='sigma of gaussian filter (pixel), 0 = automatic')
+    parser.add_argument('--abel-method', choices=abel_methods, default='onion_peeling',
+                        help='inverse Abel transform method of PyAbel (default: onion_peeling)')
+    parser.add_argument('--unwrap-method', choices=unwrap_methods, default='reliability',
+                        help='phase unwrapping method (default: reliability, as version 1.0)')
+    parser.add_argument('--unwrap-region', action='store_true',
+                        help='unwrap only the symmetric region used in the Abel inversion (found on the first frame); '
+                             'the phase maps are cut on this region')
+    parser.add_argument('--carrier-tolerance', type=float, default=None,
+                        help='automatic filter detected again on frames whose carrier moves more than this (pixel); '
+                             'default: detected on the first frame only')
+    parser.add_argument('--sigma-gblur', type=int, default=2, help='sigma of gaussian blur (pixel)')
+    parser.add_argument('--fringes', choices=['vertical', 'horizontal'], default='vertical',
+                        help='fringes orientation')
+    parser.add_argument('--axisymm', choices=['vertical', 'horizontal'], default='horizontal',
+                        help='axisymmetric orientation')
+    parser.add_argument('--registration-upsample', type=int, default=100,
+                        help='displacement between the interferograms found with 1/N pixel precision (default: 100)')
+    parser.add_argument('--registration-decimation', type=int, default=1,
+                        help='displacement found on maps decimated by this factor (spectra cut in Fourier space), '
+                             'reduced to keep the carrier band of the filter; default: 1 = whole maps')
+    parser.add_argument('--precision', choices=['double', 'single'], default='double',
+                        help='floating point of the maps (default: double; single = float32, half of the memory)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='number of processes used to analyse the shots, 0 = number of cores (default)')
+    parser.add_argument('--fft-backend', choices=fft_backends, default='scipy', help='FFT library (default: scipy)')
+    parser.add_argument('--fft-workers', type=int, default=None,
+                        help='threads of the FFT library (default: number of cores, 1 per process in parallel runs)')
+    parser.add_argument('--abel-cache-dir', default=None,
+                        help='directory where the inverse Abel matrices are saved for the next analyses')
+    parser.add_argument('--fringes-method', choices=fringes_methods, default='vectorized',
+                        help='fringes widths calculation (default: vectorized; find_peaks = version 1.0 loop)')
+    parser.add_argument('--result-cache-dir', default=None,
+                        help='directory where the analysed frames are saved; shots analysed again with the same '
+                             'reference and parameters are read from it')
+    parser.add_argument('--result-cache-size', type=float, default=1024.0,
+                        help='maximum size of the result cache (MB), least recently used frames are removed first')
+    parser.add_argument('--clear-result-cache', action='store_true',
+                        help='remove all frames of the result cache before the analysis')
+    parser.add_argument('--profile', nargs='?', const='', default=None, metavar='FILE.jsonl',
+                        help='print the time of each stage of the analysis; with FILE, the measurements of each '
+                             'stage and frame are appended as JSON lines')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='include the peak memory of each stage in the profile (slower)')
+    return parser
+
+
+def parameters_from_args(args):
+    '''
+    Convert command line values (GUI units) to analysis parameters (SI units)
+    :param args: parsed arguments
+    :return: dict of analysis parameters
+    '''
+    return {
+        'roi': tuple(args.roi) if args.roi else None,
+        'rotate_degree': args.rotate,
+        'lambda0': args.lambda0 * 1e-9,  # in meters
+        'unc_lambda0': args.bandwidth * 0.424661 * 1e-9,  # 1/e in meters
+        'factor': args.factor * 1e-6,  # in meters/pixel
+        'centerfilter': args.center_filter,
+        'f_range': args.filter_range,
+        'sigma_gfilter': args.sigma_gfilter,
+        'sigma_gblur': args.sigma_gblur,
+        'abel_method': args.abel_method,
+        'unwrap_method': args.unwrap_method,
+        'unwrap_region': args.unwrap_region,
+        'carrier_tolerance': args.carrier_tolerance,
+        'fringes': args.fringes,
+        'axisymm': args.axisymm,
+        'registration_upsample': args.registration_upsample,
+        'registration_decimation': args.registration_decimation,
+        'precision': args.precision,
+        'fft_backend': args.fft_backend,
+        'fft_workers': args.fft_workers,
+        'fringes_method': args.fringes_method,
+        'abel_cache_dir': args.abel_cache_dir,
+        'result_cache_dir': args.result_cache_dir,
+        'result_cache_size': int(args.result_cache_size * 2 ** 20),  # in bytes
+    }
+
+
+def main(argv=None):
+    '''
+    Run the analysis from the command line
+    :param argv: list of arguments (default: sys.argv)
+    :return: None
+    '''
+    args = build_parser().parse_args(argv)
+    params = parameters_from_args(args)
+    path_files = list_shots(args.shots)
+    if not path_files:
+        sys.exit('No .snp/.png shots found in %s' % args.shots)
+
+    if args.clear_result_cache and args.result_cache_dir is not None:
+        clear_result_cache(args.result_cache_dir)
+
+    profiler = None
+    if args.profile is not None or args.profile_memory:
+        profiler = StageProfiler(memory=args.profile_memory, jsonl=args.profile or None)
+
+    ref = read_image(args.reference)
+    # Shots are read one at a time during the analysis
+    shots = ShotFiles(path_files)
+    # The maps of each frame are saved when analysed (not kept in memory) and the result at the end
+    with warnings.catch_warnings(), ResultWriter(args.output) as writer:
+        warnings.simplefilter('ignore', RuntimeWarning)
+        try:
+            result = analyse_shots(ref, shots, workers=args.workers, profiler=profiler,
+                                   on_frame=None if args.mean_only else writer.add_frame, **params)
+        except AnalysisError as e:
+            sys.exit('ERROR: %s' % e)
+
+        params.update(centerfilter=result['centerfilter'], f_range=result['f_range'],
+                      sigma_gfilter=result['sigma_gfilter'])
+        writer.close(result, params, path_files)
+    print('%d shot(s) analysed, filter position %d, range %d -> %s'
+          % (result['n_frames'], result['centerfilter'], result['f_range'], args.output))
+    if profiler is not None:
+        print(profiler.format_summary())
@@ -0,0 +1,224 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# Binary export of an analysis: mean and std maps of all stages, maps of each frame, axes in um and all parameters
+# in one compressed file (.npz, or .h5/.hdf5 with the optional h5py package). load_result reads the file back as
+# the dict of analyse_shots, without analysing the shots again.
+import numpy as np
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+# Maps of the result (mean and std of the run; FFT, filter and normalized phase of the last frame)
+result_maps = ('fftmap', 'gfilter', 'norm_phasemap', 'phasemap', 'std_phasemap', 'abelmap', 'std_abelmap', 'density',
+               'std_density')
+# Numbers of the result
+result_values = ('n_frames', 'centerfilter', 'f_range', 'sigma_gfilter', 'vert_lim')
+# Maps saved for each frame (arrays 'frames_<map>' with the frames on the first axis)
+frame_maps = ('fftmap', 'phasemap', 'std_phasemap', 'abelmap', 'std_abelmap', 'norm_phasemap', 'density', 'std_density')
+# Files saved as HDF5 (other names are saved as .npz)
+hdf5_extensions = ('.h5', '.hdf5')
+
+
+#################################################################################
+# FUNCTIONS
+################################################################################
+# SAVE RESULT
+def save_result(filename, result, params=None, frames=None, files=None):
+    '''
+    Save an analysis in one compressed file
+    :param filename: .npz file, or .h5/.hdf5 file (HDF5 requires h5py)
+    :param result: dict of analyse_shots
+    :param params: analysis parameters (saved as 'param_<name>', with the axes of the maps in um); None = not saved
+    :param frames: iterable of analyse_frame dicts (e.g. AnalysisSession.frames()) saved as 'frames_<map>', with
+                   the index of each shot in 'frames_shot'; None = only the result
+    :param files: list of the shot files (saved as 'files')
+    :return: None
+    '''
+    with ResultWriter(filename) as writer:
+        for frame in frames if frames is not None else ():
+            writer.add_frame(frame)
+        writer.close(result, params, files)
+
+
+def map_axes(result, factor):
+    '''
+    Axes of the maps in um (origin at the first pixel, as the 2D plots of the GUI)
+    :param result: dict of analyse_shots
+    :param factor: scale factor (m/pixel)
+    :return: dict with x and y axes of the phase maps ('phasemap_x_um', 'phasemap_y_um') and of the Abel and density
+             maps ('density_x_um', 'density_y_um')
+    '''
+    axes = {}
+    for key in ('phasemap', 'density'):
+        if result.get(key) is not None:
+            rows, cols = np.shape(result[key])
+            axes[key + '_x_um'] = np.arange(cols) * factor * 1e6
+            axes[key + '_y_um'] = np.arange(rows) * factor * 1e6
+    return axes
+
+
+class ResultWriter:
+    '''
+    Analysis saved frame by frame: the maps of each frame are given when analysed (e.g. analyse_shots(on_frame=
+    writer.add_frame)) and the result at the end (close). HDF5 files receive each frame at once (one chunk per
+    frame); .npz files can not be appended, so their frames are stacked in memory until close.
+    '''
+
+    def __init__(self, filename):
+        '''
+        :param filename: .npz file, or .h5/.hdf5 file (HDF5 requires h5py)
+        '''
+        self.filename = filename
+        self.shots = []  # index of the shot of each frame
+        self._stacks = {key: [] for key in frame_maps}  # maps of the frames (.npz)
+        self._h5 = None
+        if filename.lower().endswith(hdf5_extensions):
+            if h5py is None:
+                raise ImportError('HDF5 files require the h5py package')
+            self._h5 = h5py.File(filename, 'w')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # file of an analysis stopped by an error is closed without the result
+        if self._h5 is not None:
+            self._h5.close()
+
+    def add_frame(self, frame):
+        '''
+        Save the maps of one frame
+        :param frame: dict of analyse_frame (with the index of its shot 'shot', default: number of frames saved);
+                      maps set to None are not saved (e.g. spectra of the frames of AnalysisSession)
+        :return: None
+        '''
+        n = len(self.shots)
+        for key in frame_maps:
+            if frame.get(key) is None:
+                continue
+            if self._h5 is None:
+                self._stacks[key].append(frame[key])
+                continue
+            value = np.asarray(frame[key])
+            if n == 0:
+                self._h5.create_dataset('frames_' + key, shape=(0,) + value.shape, maxshape=(None,) + value.shape,
+                                        dtype=value.dtype, chunks=(1,) + tuple(max(s, 1) for s in value.shape),
+                                        compression='gzip', shuffle=True)
+            dataset = self._h5['frames_' + key]
+            dataset.resize(n + 1, axis=0)
+            dataset[n] = value
+        self.shots.append(frame.get('shot', n))
+
+    def close(self, result, params=None, files=None):
+        '''
+        Save the result and close the file (see save_result)
+        :param result: dict of analyse_shots
+        :param params: analysis parameters; None = not saved
+        :param files: list of the shot files
+        :return: None
+        '''
+        data = {key: np.asarray(result[key]) for key in result_maps + result_values if result.get(key) is not None}
+        if params is not None:
+            data.update(map_axes(result, params['factor']))
+            data.update({'param_' + k: np.asarray(v if v is not None else []) for k, v in params.items()})
+        if files is not None:
+            data['files'] = np.array(files)
+        if self.shots:
+            data['frames_shot'] = np.array(self.shots)
+        if self._h5 is None:
+            if self.shots:
+                data.update({'frames_' + key: np.stack(maps) for key, maps in self._stacks.items() if maps})
+            np.savez_compressed(self.filename, **data)
+        else:
+            _write_hdf5(self._h5, data)
+            self._h5.close()
+        self._stacks = {key: [] for key in frame_maps}
+
+
+def _write_hdf5(f, data):
+    '''
+    Write arrays in an open HDF5 file (maps compressed by chunks)
+    '''
+    for key, value in data.items():
+        if value.dtype.kind == 'U':
+            f.create_dataset(key, data=value.astype(object), dtype=h5py.string_dtype())
+        elif value.ndim >= 2 and value.size > 0:
+            f.create_dataset(key, data=value, chunks=True, compression='gzip', shuffle=True)
+        else:
+            f.create_dataset(key, data=value)
+
+
+# LOAD RESULT
+def load_result(filename, frames=True):
+    '''
+    Read an analysis saved by save_result
+    :param filename: .npz or .h5/.hdf5 file
+    :param frames: False = the maps of the frames are not read (see read_frames)
+    :return: dict of analyse_shots with the saved axes, 'params' (dict of analysis parameters), 'files' (list) and
+             'frames' (dict map name -> array with the frames on the first axis, with 'shot') when saved and read
+    '''
+    if filename.lower().endswith(hdf5_extensions):
+        if h5py is None:
+            raise ImportError('HDF5 files require the h5py package')
+        with h5py.File(filename, 'r') as f:
+            data = {key: np.asarray(f[key].asstr()[()] if h5py.check_string_dtype(f[key].dtype) else f[key][()])
+                    for key in f if frames or not key.startswith('frames_')}
+    else:
+        with np.load(filename) as npz:
+            data = {key: npz[key] for key in npz.files if frames or not key.startswith('frames_')}
+
+    result = {'params': {}}
+    frames = {}
+    for key, value in data.items():
+        if key.startswith('param_'):
+            # None was saved as an empty array, tuples (roi) as arrays
+            result['params'][key[6:]] = None if value.size == 0 else value.item() if value.ndim == 0 else value.tolist()
+        elif key.startswith('frames_'):
+            frames[key[7:]] = value
+        elif key in result_values:
+            result[key] = value.item()
+        elif key == 'files':
+            result[key] = [str(f) for f in value]
+        else:
+            result[key] = value
+    if frames:
+        result['frames'] = frames
+    return result
+
+
+# READ FRAMES
+def read_frames(filename, keys=None):
+    '''
+    Maps of each frame of an analysis saved by save_result. HDF5 files are read one frame at a time; the maps of
+    .npz files can only be read whole, so each map read has all its frames in memory.
+    :param filename: .npz or .h5/.hdf5 file
+    :param keys: names of the maps read (None = all maps saved)
+    :return: generator of dicts map name -> 2D array, with the index of the shot ('shot')
+    '''
+    def names(files):
+        return [key[7:] for key in files if key.startswith('frames_') and key != 'frames_shot'
+                and (keys is None or key[7:] in keys)]
+
+    if filename.lower().endswith(hdf5_extensions):
+        if h5py is None:
+            raise ImportError('HDF5 files require the h5py package')
+        with h5py.File(filename, 'r') as f:
+            if 'frames_shot' not in f:
+                return
+            maps = {name: f['frames_' + name] for name in names(f)}
+            for k, shot in enumerate(f['frames_shot'][()]):
+                frame = {name: dataset[k] for name, dataset in maps.items()}
+                frame['shot'] = int(shot)
+                yield frame
+    else:
+        with np.load(filename) as npz:
+            if 'frames_shot' not in npz.files:
+                return
+            maps = {name: npz['frames_' + name] for name in names(npz.files)}
+            for k, shot in enumerate(npz['frames_shot']):
+                frame = {name: stack[k] for name, stack in maps.items()}
+                frame['shot'] = int(shot)
+                yield frame
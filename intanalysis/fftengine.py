@@ -0,0 +1,123 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# FFT backends of the analysis. All functions work on single frames or on stacks of frames (transform over the last
+# two axes), so a batch of interferograms is transformed by one call using the threads of the library. The transforms
+# are complex FFTs: the gaussian filter selects one side band of the carrier (not a Hermitian-symmetric filter) and
+# the spectrum display, carrier detection and registration use the full spectrum, so a real-input FFT (rfft2) would
+# have to be completed to the full spectrum, which is slower than the complex FFT and does not save memory.
+# Single precision arrays (float32) give complex64 spectra with all backends.
+import os
+import numpy as np
+import scipy.fft
+
+# pyFFTW is optional
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
+
+# FFT backends names
+fft_backends = ('numpy', 'scipy', 'pyfftw')
+# Number of frames transformed together by the forward FFT
+fft_batch_size = 8
+
+
+#################################################################################
+# FUNCTIONS
+################################################################################
+def _real_type(a):
+    '''
+    Real type of the transforms of an array: single precision arrays (float32, complex64) stay in single precision,
+    other arrays are transformed in double precision
+    :param a: input array
+    :return: np.float32 or np.float64
+    '''
+    if np.asarray(a).dtype in (np.float32, np.complex64):
+        return np.float32
+    return np.float64
+
+
+def _complex_type(a):
+    '''
+    Complex type of the transforms of an array (see _real_type)
+    :param a: input array
+    :return: np.complex64 or np.complex128
+    '''
+    return np.complex64 if _real_type(a) == np.float32 else np.complex128
+
+
+class FFTBackend:
+    '''
+    FFT functions of one library (numpy, scipy.fft or pyFFTW) over the last two axes
+    '''
+
+    def __init__(self, name='scipy', workers=None):
+        '''
+        :param name: 'numpy', 'scipy' or 'pyfftw'
+        :param workers: number of threads (scipy and pyfftw); None = number of cores
+        '''
+        if name not in fft_backends:
+            raise ValueError('FFT backend must be one of: %s' % ', '.join(fft_backends))
+        if name == 'pyfftw' and pyfftw is None:
+            raise ImportError('The pyfftw backend requires the pyFFTW package')
+        self.name = name
+        self.workers = workers or os.cpu_count() or 1
+        # pyFFTW plans by (transform, shape, dtype)
+        self._plans = {}
+
+    def _plan(self, kind, a):
+        '''
+        pyFFTW plan of a transform, created once for each array shape and type
+        :param kind: 'fft2' or 'ifft2'
+        :param a: input array
+        :return: FFTW object
+        '''
+        key = kind, np.shape(a), a.dtype
+        if key not in self._plans:
+            builder = getattr(pyfftw.builders, kind)
+            self._plans[key] = builder(pyfftw.empty_aligned(np.shape(a), dtype=a.dtype), axes=(-2, -1),
+                                       threads=self.workers, planner_effort='FFTW_ESTIMATE')
+        return self._plans[key]
+
+    def fft2(self, a):
+        '''
+        2D FFT
+        :param a: real or complex array (..., m, n)
+        :return: complex array (..., m, n)
+        '''
+        if self.name == 'scipy':
+            return scipy.fft.fft2(a, axes=(-2, -1), workers=self.workers)
+        if self.name == 'pyfftw':
+            a = np.asarray(a, dtype=_complex_type(a))
+            return self._plan('fft2', a)(a).copy()
+        return np.fft.fft2(a, axes=(-2, -1)).astype(_complex_type(a), copy=False)
+
+    def ifft2(self, a):
+        '''
+        Inverse 2D FFT
+        :param a: complex array (..., m, n)
+        :return: complex array (..., m, n)
+        '''
+        if self.name == 'scipy':
+            return scipy.fft.ifft2(a, axes=(-2, -1), workers=self.workers)
+        if self.name == 'pyfftw':
+            return self._plan('ifft2', a)(a).copy()
+        return np.fft.ifft2(a, axes=(-2, -1)).astype(_complex_type(a), copy=False)
+
+
+# Backends already created (keep pyFFTW plans between analyses)
+_backends = {}
+
+
+def get_backend(name='scipy', workers=None):
+    '''
+    FFT backend of the analysis
+    :param name: 'numpy', 'scipy' or 'pyfftw'
+    :param workers: number of threads (scipy and pyfftw); None = number of cores
+    :return: FFTBackend
+    '''
+    key = name, workers
+    if key not in _backends:
+        _backends[key] = FFTBackend(name, workers)
+    return _backends[key]
@@ -0,0 +1,109 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# Fringes width distribution of an interferogram (used in the standard deviation of the phase).
+import numpy as np
+
+from scipy.signal import find_peaks
+
+# Methods to calculate the fringes widths
+fringes_methods = ('vectorized', 'find_peaks')
+
+
+#################################################################################
+# FUNCTIONS
+################################################################################
+# LOCAL MAXIMA OF ALL LINES
+def local_maxima(data1):
+    '''
+    Local maxima of each line of a 2D array, as scipy.signal.find_peaks: a sample bigger than its neighbours or
+    the middle of a flat top (plateau) bigger than its neighbours. First and last samples are never peaks.
+    :param data1: 2D array
+    :return: boolean 2D array (True on peaks)
+    '''
+    nl, nr = np.shape(data1)
+    peaks = np.zeros((nl, nr), dtype=bool)
+    # sign of the difference between neighbours (slope[:, t] is the slope between samples t and t + 1)
+    slope = (data1[:, 1:] > data1[:, :-1]).astype(np.int8) - (data1[:, 1:] < data1[:, :-1])
+    # Single sample peaks: rising slope followed by a falling slope
+    peaks[:, 1:-1] = (slope[:, :-1] > 0) & (slope[:, 1:] < 0)
+    # Plateaus: rising slope at p followed by flat samples p+1...t and a falling slope at t
+    # (the peak is the middle sample (p + 1 + t) // 2)
+    line, p = np.nonzero((slope[:, :-1] > 0) & (slope[:, 1:] == 0))
+    if len(line) > 0:
+        # index of the next non-zero slope of each position (nr - 1 when there is none)
+        index = np.where(slope != 0, np.arange(nr - 1, dtype=np.int32), nr - 1)
+        next_slope = np.minimum.accumulate(index[:, ::-1], axis=1)[:, ::-1]
+        t = next_slope[line, p + 1]
+        found = t < nr - 1
+        line, p, t = line[found], p[found], t[found]
+        falling = slope[line, t] < 0
+        peaks[line[falling], (p[falling] + 1 + t[falling]) // 2] = True
+    return peaks
+
+
+# CREATING FRINGES WIDTHS
+def fringes_width_find_peaks(data1):
+    '''
+    Calculate 2D array shifts and widths fringes distribution (line by line with scipy.signal.find_peaks)
+    :param n: 2D array, 2D array of ref. image.
+    :return: mean fringe width
+    '''
+    #array with fringes width
+    f_width = np.zeros(np.shape(data1))
+    nl, nr = np.shape(data1)
+    for l in range(0, nl):
+        line1 = (data1[l, :])
+        ypeaks1, _ = find_peaks(line1)
+        y = np.diff(ypeaks1)
+        x = np.linspace(0, nr, len(y))
+        x_interp = np.linspace(0, nr, nr)
+        f_width[l, :] = np.interp(x_interp, x, y)
+
+    return f_width
+
+
+def fringes_width_vectorized(data1):
+    '''
+    Calculate 2D array shifts and widths fringes distribution for all lines at once: distances between the
+    peaks of each line are spread (linear interpolation) over the line length.
+    Lines with less than two peaks have no width: ValueError, as the find_peaks loop.
+    :param data1: 2D array of ref. image
+    :return: 2D array of fringes width
+    '''
+    nl, nr = np.shape(data1)
+    line, col = np.nonzero(local_maxima(data1))
+    # distances between neighbour peaks of the same line (in line order)
+    same_line = line[1:] == line[:-1]
+    y = np.diff(col)[same_line]
+    n_widths = np.bincount(line[1:][same_line], minlength=nl)
+    if np.any(n_widths == 0):
+        raise ValueError('less than two fringes in line %d' % np.argmin(n_widths))
+    start = np.concatenate(([0], np.cumsum(n_widths)[:-1]))
+
+    f_width = np.zeros((nl, nr))
+    x_interp = np.linspace(0, nr, nr)
+    # np.interp(linspace(0, nr, nr), linspace(0, nr, n), y) is the same for all lines with n widths
+    for n in np.unique(n_widths[n_widths > 0]):
+        lines = np.nonzero(n_widths == n)[0]
+        widths = y[start[lines][:, None] + np.arange(n)]
+        q = x_interp * (n - 1) / nr
+        k0 = np.minimum(q.astype(int), n - 1)
+        k1 = np.minimum(k0 + 1, n - 1)
+        frac = q - k0
+        f_width[lines] = widths[:, k0] * (1 - frac) + widths[:, k1] * frac
+    return f_width
+
+
+def fringes_width(data1, method='vectorized'):
+    '''
+    Calculate 2D array shifts and widths fringes distribution
+    :param data1: 2D array of ref. image
+    :param method: 'vectorized' (all lines at once) or 'find_peaks' (line by line, as version 1.0)
+    :return: 2D array of fringes width (ValueError when a line has less than two fringes)
+    '''
+    if method == 'find_peaks':
+        return fringes_width_find_peaks(data1)
+    if method == 'vectorized':
+        return fringes_width_vectorized(data1)
+    raise ValueError('fringes width method must be one of: %s' % ', '.join(fringes_methods))
@@ -0,0 +1,1208 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# Headless analysis of the interferograms: FFT -> Gaussian filter -> unwrap -> Abel -> plasma density.
+# This module has no GUI dependency and is used by the "Analyse Data" event and by the command line.
+import hashlib
+import math
+import os
+import warnings
+import numpy as np
+
+from collections import OrderedDict, deque
+from itertools import chain, islice
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from scipy.ndimage import gaussian_filter
+from scipy.signal import peak_widths, find_peaks
+from skimage.registration import phase_cross_correlation
+
+from .abelengine import abel_methods, get_abel_engine
+from .fftengine import fft_backends, fft_batch_size, get_backend
+from .fringes import fringes_methods, fringes_width
+from .profiling import StageProfiler, active_profiler, set_frame, stage
+from .resultcache import get_result_cache
+from .stats import RunningMaps
+from .unwrap import unwrap, unwrap_methods
+
+# INITIAL PARAMETERS
+# Default analysis parameters (SI units)
+DEFAULT_PARAMETERS = {
+    'roi': None,  # (begin_x, begin_y, end_x, end_y) in pixels; None uses whole image
+    'rotate_degree': 0.0,  # angle to image rotation
+    'lambda0': 395e-9,  # laser wavelength (m)
+    'unc_lambda0': 0.0,  # laser wavelength uncertainty, 1/e (m)
+    'factor': 1e-6,  # scaling factor (m/pixel)
+    'centerfilter': 0,  # position of the gaussian filter (pixel); 0 = automatic
+    'f_range': 0,  # range of the gaussian filter (pixel); 0 = automatic
+    'sigma_gfilter': 0,  # sigma of gaussian filter (pixel); 0 = automatic
+    'sigma_gblur': 2,  # sigma of gaussian blur (pixel)
+    'fringes': 'vertical',  # fringes orientation: 'vertical' or 'horizontal'
+    'axisymm': 'horizontal',  # axisymmetric orientation: 'vertical' or 'horizontal'
+    'abel_method': 'onion_peeling',  # inverse Abel transform method of PyAbel (see abelengine.abel_methods)
+    'unwrap_method': 'reliability',  # phase unwrapping: 'reliability' (version 1.0), 'rows' or 'least_squares'
+    'unwrap_region': False,  # True = only the symmetric region used in Abel inversion (found on the first frame) is
+                             # unwrapped and the phase maps are cut on it (see unwrap_region)
+    'carrier_tolerance': None,  # automatic filter: new detection when the carrier of a frame moves more than this
+                                # (pixel); None = detection once for each reference and analysis area
+    'registration_upsample': 100,  # displacement between the interferograms found with 1/upsample pixel precision
+    'registration_decimation': 1,  # displacement found on the spectra cut to 1/decimation of the frequencies of
+                                   # each axis (decimated maps, faster), limited so that the carrier band of the
+                                   # filter is kept (see carrier_decimation); 1 = whole spectra
+    'precision': 'double',  # floating point of the maps: 'double' (float64/complex128) or 'single' (float32/complex64,
+                            # half of the memory, see benchmarks/bench_precision.py)
+    # Computation options (same results)
+    'fft_backend': 'scipy',  # FFT library: 'numpy', 'scipy' or 'pyfftw'
+    'fft_workers': None,  # threads of the FFT library (scipy, pyfftw); None = number of cores
+    'fringes_method': 'vectorized',  # fringes widths: 'vectorized' or 'find_peaks' (loop of version 1.0)
+    'abel_cache_dir': None,  # directory where the inverse Abel matrices are saved; None = kept only in memory
+    'result_cache_dir': None,  # directory where the analysed frames are saved; None = no result cache
+    'result_cache_size': 2 ** 30,  # maximum size of the result cache (bytes)
+}
+# Plasma constant (1/m)
+const_plasma = 1.11485e15
+# Number of reference contexts (and of filters per reference) kept in memory
+reference_cache_size = 4
+# Shots sent to each worker process before waiting for the first result
+worker_read_ahead = 2
+# Real type of the maps of each precision (complex maps use the complex type of the same size)
+precision_types = {'double': np.float64, 'single': np.float32}
+
+
+class AnalysisError(Exception):
+    '''
+    Error that makes impossible to analyse an interferogram
+    '''
+
+
+class AnalysisCancelled(AnalysisError):
+    '''
+    Analysis stopped by the user before the end
+    '''
+
+
+class AnalysisWarning(UserWarning):
+    '''
+    Problem found during the analysis of an interferogram (the analysis goes on)
+    '''
+
+
+#################################################################################
+# FUNCTIONS
+################################################################################
+# ANALYSIS PARAMETERS
+def analysis_parameters(**kwargs):
+    '''
+    Complete analysis parameters with the default values
+    :param kwargs: analysis parameters (see DEFAULT_PARAMETERS)
+    :return: dict of analysis parameters
+    '''
+    unknown = set(kwargs) - set(DEFAULT_PARAMETERS)
+    if unknown:
+        raise TypeError('Unknown analysis parameters: %s' % ', '.join(sorted(unknown)))
+    params = dict(DEFAULT_PARAMETERS)
+    params.update(kwargs)
+    for key in ('fringes', 'axisymm'):
+        if params[key] not in ('vertical', 'horizontal'):
+            raise ValueError("%s must be 'vertical' or 'horizontal'" % key)
+    if params['fft_backend'] not in fft_backends:
+        raise ValueError('fft_backend must be one of: %s' % ', '.join(fft_backends))
+    if params['abel_method'] not in abel_methods:
+        raise ValueError('abel_method must be one of: %s' % ', '.join(abel_methods))
+    if params['unwrap_method'] not in unwrap_methods:
+        raise ValueError('unwrap_method must be one of: %s' % ', '.join(unwrap_methods))
+    if params['fringes_method'] not in fringes_methods:
+        raise ValueError('fringes_method must be one of: %s' % ', '.join(fringes_methods))
+    for key in ('registration_upsample', 'registration_decimation'):
+        if int(params[key]) != params[key] or params[key] < 1:
+            raise ValueError('%s must be an integer >= 1' % key)
+    if params['precision'] not in precision_types:
+        raise ValueError('precision must be one of: %s' % ', '.join(precision_types))
+    return params
+
+
+def frame_dtype(params):
+    '''
+    Type of the interferograms converted by prepare_frame
+    :param params: analysis parameters
+    :return: np.float32 for single precision; None = interferograms are not converted (double precision: the
+             FFT gives complex128 maps)
+    '''
+    if params['precision'] == 'single':
+        return precision_types['single']
+    return None
+
+
+# INTERFEROGRAM ARRAY TO ANALYSIS AREA
+def prepare_frame(array, roi=None, rotate_degree=0.0, dtype=None):
+    '''
+    Select one channel, rotate and cut the interferogram
+    :param array: interferogram array (2D or with channels)
+    :param roi: (begin_x, begin_y, end_x, end_y) in pixels or None
+    :param rotate_degree: rotation angle (counterclockwise)
+    :param dtype: type of the returned array (see frame_dtype); None = type of the interferogram
+    :return: 2D array of the analysis area
+    '''
+    # Slice image with 3 channels:only one channel is used to interferogram treatment
+    if np.ndim(array) == 3:
+        array = array[:, :, 0]
+    # Rotate Image
+    if rotate_degree != 0:
+        array = np.asarray(Image.fromarray(array).rotate(rotate_degree, resample=Image.Resampling.BICUBIC))
+    # Use whole image or select area of image
+    if roi is not None:
+        begin_x, begin_y, end_x, end_y = roi
+        array = array[begin_y:end_y, begin_x:end_x]
+    if dtype is not None:
+        array = np.asarray(array, dtype=dtype)
+    return array
+
+
+# SPECTRUM PROFILE
+def spectrum_profile(fftmap, fringes):
+    '''
+    Sum of the FFT amplitude (log) over the lines or columns (vertical or horizontal fringes)
+    :param fftmap: log of the FFT amplitude of the interferogram
+    :param fringes: fringes orientation ('vertical' or 'horizontal')
+    :return: 1D array with the sum of each column (vertical) or line (horizontal)
+    '''
+    if fringes == 'vertical':
+        # sum of array rows (vertical)
+        return np.sum(fftmap, axis=0)
+    # sum of array lines (horizontal)
+    return np.sum(fftmap, axis=1)
+
+
+# CARRIER FREQUENCY
+def carrier_position(summap, position, search=0):
+    '''
+    Sub-pixel position of the carrier peak of the spectrum profile: a parabola is fitted to the maximum
+    and its two neighbours
+    :param summap: spectrum profile (see spectrum_profile)
+    :param position: peak position (pixel)
+    :param search: the maximum is searched in position +- search (pixel)
+    :return: carrier position (pixel, float)
+    '''
+    n = len(summap)
+    begin, end = max(position - search, 1), min(position + search + 1, n - 1)
+    if begin < end:
+        position = begin + int(np.argmax(summap[begin:end]))
+    if position < 1 or position > n - 2:
+        return float(position)
+    left, center, right = summap[position - 1], summap[position], summap[position + 1]
+    curvature = left - 2 * center + right
+    if curvature >= 0 or not np.isfinite(curvature):
+        return float(position)
+    return position + 0.5 * (left - right) / curvature
+
+
+# GAUSSIAN FILTER POSITION
+def find_filter_position(fftmap, fringes, summap=None):
+    '''
+    Authomatic definition of the gaussian filter position:
+    this position are defined like the line or column (Vertical or horizontal fringes) with more intensity pixel
+    values. This way, this positions are defined using the maximum value of horizontal/vertical pixels sum,
+    depending on fringes orientation.
+    :param fftmap: log of the FFT amplitude of the interferogram
+    :param fringes: fringes orientation ('vertical' or 'horizontal')
+    :param summap: spectrum profile of fftmap when already computed (see spectrum_profile)
+    :return: filter position and filter range (pixel)
+    '''
+    nrmap = np.shape(fftmap)[1]
+    if summap is None:
+        summap = spectrum_profile(fftmap, fringes)
+
+    # Defining point of gaussian filter application using max value of horizontal/vertical pixels sum
+    filterpoints, _ = find_peaks(summap, height=0.9 * np.max(summap))
+    # Range of gaussian filter
+    filterspoints_widths = (peak_widths(summap, filterpoints, rel_height=0.5)[0])
+
+    if len(filterpoints) == 0:
+        raise AnalysisError('Unable to apply the Fast Fourier Transform to the selected image!')
+    try:
+        centerfilter, f_range = _select_filter_peak(filterpoints, filterspoints_widths, nrmap, fringes)
+    except IndexError:
+        raise AnalysisError('Unable to apply the Fast Fourier Transform to the selected image!')
+    return int(centerfilter), f_range
+
+
+def _select_filter_peak(filterpoints, filterspoints_widths, nrmap, fringes):
+    '''
+    Select the peak of the frequency sum used as filter position
+    :param filterpoints: peaks positions
+    :param filterspoints_widths: peaks widths (FWHM)
+    :param nrmap: number of rows of the FFT array
+    :param fringes: fringes orientation ('vertical' or 'horizontal')
+    :return: filter position and filter range (pixel)
+    '''
+    if fringes == 'horizontal':
+        # filter range is equal to FWHM of signal of summaps
+        if filterpoints[0] <= 5:
+            centerfilter = filterpoints[1]
+            f_range = int(filterspoints_widths[1])
+        else:
+            centerfilter = filterpoints[0]
+            f_range = int(filterspoints_widths[0])
+
+    elif fringes == 'vertical':
+
+        if filterpoints[len(filterpoints) - 1] >= nrmap - 5:
+            centerfilter = filterpoints[len(filterpoints) - 2]
+            f_range = int(filterspoints_widths[len(filterpoints) - 2])
+        else:
+            centerfilter = filterpoints[len(filterpoints) - 1]
+            f_range = int(filterspoints_widths[len(filterpoints) - 1])
+
+    return centerfilter, f_range
+
+
+# GAUSSIAN FILTER ARRAY
+def gaussian_filter_map(shape, fringes, centerfilter, f_range, sigma_gfilter, dtype=np.float64):
+    '''
+    Creating filter array from null array
+    :param shape: shape of the FFT array
+    :param fringes: fringes orientation ('vertical' or 'horizontal')
+    :param centerfilter: filter position (pixel)
+    :param f_range: filter range (pixel)
+    :param sigma_gfilter: sigma of gaussian filter (pixel); 0 = automatic
+    :param dtype: type of the filter array
+    :return: filter array and sigma of gaussian filter
+    '''
+    nlmap, nrmap = shape
+    gfilter = np.zeros(shape, dtype=dtype)
+
+    # Creating Filter for Horizontal/vertical fringes orientation
+    if fringes == 'horizontal':
+        if sigma_gfilter == 0:
+            # sigma filter is a func of image dimensions and f_rqnge
+            sigma_gfilter = int(0.005 * nlmap * f_range)
+        gfilter[centerfilter - f_range:centerfilter + f_range] = 1
+    elif fringes == 'vertical':
+        if sigma_gfilter == 0:
+            # sigma filter is a func of image dimensions and f_rqnge
+            sigma_gfilter = int(0.005 * nrmap * f_range)
+        gfilter[:, centerfilter - f_range:centerfilter + f_range] = 1
+    # Applying gaussian filter at selected filter position
+    gfilter = gaussian_filter(gfilter, sigma=sigma_gfilter)
+    return gfilter, sigma_gfilter
+
+
+# DECIMATED SPECTRUM
+def crop_spectrum(spectrum, decimation):
+    '''
+    Spectrum of a decimated map: the lowest frequencies of each axis (1/decimation of them), in the order of fft2
+    :param spectrum: fft2 array
+    :param decimation: decimation factor (1 = same spectrum)
+    :return: fft2 array of the decimated map
+    '''
+    if decimation == 1:
+        return spectrum
+    index = []
+    for n in np.shape(spectrum):
+        nk = max(n // decimation, 1)
+        index.append(np.r_[0:(nk + 1) // 2, n - nk // 2:n])
+    return spectrum[np.ix_(*index)]
+
+
+def carrier_decimation(shape, fringes, centerfilter, f_range, decimation):
+    '''
+    Largest decimation factor (up to decimation) whose cropped spectrum keeps the carrier band of the filter
+    (centerfilter +- f_range): the displacement between the interferograms is the displacement of the fringes, not
+    of the low frequency envelope
+    :param shape: shape of the fft2 array
+    :param fringes: fringes orientation ('vertical' or 'horizontal')
+    :param centerfilter: filter position (pixel)
+    :param f_range: filter range (pixel)
+    :param decimation: decimation factor requested
+    :return: decimation factor
+    '''
+    n = shape[1] if fringes == 'vertical' else shape[0]
+    center = centerfilter % n
+    # highest frequency of the band (frequencies above n / 2 are the negative ones)
+    band = min(center, n - center) + f_range
+    # crop_spectrum keeps the frequencies -(nk - 1) // 2 ... (nk - 1) // 2 with nk = n // decimation
+    while decimation > 1 and (max(n // decimation, 1) - 1) // 2 < band:
+        decimation -= 1
+    return decimation
+
+
+# REFERENCE INTERFEROGRAM
+class ReferenceContext:
+    '''
+    Values of the reference interferogram shared by all plasma frames of a run:
+    FFT, fringes widths and, for each gaussian filter, the filter map and the phase of the filtered reference.
+    '''
+
+    def __init__(self, intref, fft=None):
+        '''
+        :param intref: 2D array of the reference interferogram (analysis area)
+        :param fft: FFTBackend (default: scipy)
+        '''
+        self.intref = intref
+        self.fft = fft or get_backend()
+        # Apply Fast Fourier Transform on reference data array
+        self.fftref = self.fft.fft2(intref)
+        # Real type of the maps (float32 when the reference is single precision, see prepare_frame)
+        self.dtype = np.finfo(self.fftref.dtype).dtype
+        self.min_ref = np.min(intref)
+        self._fringes_width = {}
+        self._filters = OrderedDict()
+        self._spectra = {}
+        # Automatic filter position, range and carrier position by fringes orientation
+        self.carriers = {}
+
+    def fringes_width(self, fringes, method='vectorized'):
+        '''
+        Creating 2D array for fringes width distribution of the reference
+        :param fringes: fringes orientation ('vertical' or 'horizontal')
+        :param method: 'vectorized' or 'find_peaks' (see fringes.fringes_width)
+        :return: 2D array of fringes width
+        '''
+        key = fringes, method
+        if key not in self._fringes_width:
+            try:
+                if fringes == 'vertical':
+                    self._fringes_width[key] = fringes_width(self.intref, method)
+                else:
+                    self._fringes_width[key] = np.transpose(fringes_width(np.transpose(self.intref), method))
+            except ValueError as e:
+                # lines without fringes (e.g. analysis area out of the fringes)
+                raise AnalysisError('Unable to find the fringes widths of the reference interferogram (%s)!' % e)
+        return self._fringes_width[key]
+
+    def registration_spectrum(self, decimation):
+        '''
+        Spectrum of the reference used to find the displacement of the plasma frames (see crop_spectrum)
+        :param decimation: decimation factor
+        :return: fft2 array
+        '''
+        if decimation not in self._spectra:
+            self._spectra[decimation] = crop_spectrum(self.fftref, decimation)
+        return self._spectra[decimation]
+
+    def filter_position(self, fftmap, summap, fringes, tolerance=None):
+        '''
+        Automatic filter position and range of a plasma frame. The detection is done once for this reference
+        (the carrier frequency belongs to the interferometer setup) and reused for the next frames, unless the
+        carrier of a frame moves more than tolerance.
+        :param fftmap: log of the FFT amplitude of the plasma interferogram
+        :param summap: spectrum profile of fftmap (see spectrum_profile)
+        :param fringes: fringes orientation ('vertical' or 'horizontal')
+        :param tolerance: maximum carrier displacement (pixel); None = frames are not checked
+        :return: filter position and filter range (pixel)
+        '''
+        if fringes in self.carriers:
+            centerfilter, f_range, carrier = self.carriers[fringes]
+            if tolerance is None or \
+                    abs(carrier_position(summap, centerfilter, max(f_range, 1)) - carrier) <= tolerance:
+                return centerfilter, f_range
+        centerfilter, f_range = find_filter_position(fftmap, fringes, summap)
+        self.carriers[fringes] = centerfilter, f_range, carrier_position(summap, centerfilter)
+        return centerfilter, f_range
+
+    def filtered_phase(self, fringes, centerfilter, f_range, sigma_gfilter):
+        '''
+        Gaussian filter and phase of the filtered reference (argument of its IFFT)
+        :param fringes: fringes orientation ('vertical' or 'horizontal')
+        :param centerfilter: filter position (pixel)
+        :param f_range: filter range (pixel)
+        :param sigma_gfilter: sigma of gaussian filter (pixel); 0 = automatic
+        :return: filter array, sigma of gaussian filter and phase of the reference
+        '''
+        key = (fringes, centerfilter, f_range, sigma_gfilter)
+        if key in self._filters:
+            self._filters.move_to_end(key)
+        else:
+            gfilter, sigma_gfilter = gaussian_filter_map(np.shape(self.fftref), fringes, centerfilter, f_range,
+                                                         sigma_gfilter, self.dtype)
+            phaseref = np.angle(self.fft.ifft2(gfilter * self.fftref))
+            self._filters[key] = gfilter, sigma_gfilter, phaseref
+            if len(self._filters) > reference_cache_size:
+                self._filters.popitem(last=False)
+        return self._filters[key]
+
+
+# Reference contexts of the last analyses (LRU)
+_reference_cache = OrderedDict()
+
+
+def array_key(array):
+    '''
+    Key of an array content
+    :param array: numpy array
+    :return: hash of the array bytes, shape and type
+    '''
+    digest = hashlib.sha1(np.ascontiguousarray(array).tobytes()).hexdigest()
+    return digest, np.shape(array), str(np.asarray(array).dtype)
+
+
+def reference_context(intref, fft=None):
+    '''
+    Reference context from the cache of the last analyses (created when not found).
+    The context is found by the content of the reference analysis area, so it is the same for the same
+    reference file, rotation and selected area.
+    :param intref: 2D array of the reference interferogram (analysis area)
+    :param fft: FFTBackend of a new context (default: scipy)
+    :return: ReferenceContext
+    '''
+    key = array_key(intref)
+    if key in _reference_cache:
+        _reference_cache.move_to_end(key)
+    else:
+        _reference_cache[key] = ReferenceContext(intref, fft)
+        if len(_reference_cache) > reference_cache_size:
+            _reference_cache.popitem(last=False)
+    return _reference_cache[key]
+
+
+def clear_reference_cache():
+    '''
+    Remove all reference contexts from memory
+    :return: None
+    '''
+    _reference_cache.clear()
+
+
+# ANALYSIS OF ONE INTERFEROGRAM
+def analyse_frame(intref, intgas, params, vert_lim=None, fftgas=None):
+    '''
+    Apply the treatment of one interferogram to generate the plasma profile
+    :param intref: 2D array of the reference interferogram (analysis area) or its ReferenceContext
+    :param intgas: 2D array of the plasma interferogram (analysis area)
+    :param params: analysis parameters (see analysis_parameters)
+    :param vert_lim: width of the symmetric region used in Abel inversion; None = defined from this frame
+    :param fftgas: FFT of intgas when already computed (e.g. with a batch of frames)
+    :return: dict with the maps of all stages and the filter parameters used
+    '''
+    # Values of the reference interferogram are computed once for all frames
+    if isinstance(intref, ReferenceContext):
+        refctx = intref
+    else:
+        refctx = ReferenceContext(np.asarray(intref, dtype=frame_dtype(params)),
+                                  get_backend(params['fft_backend'], params['fft_workers']))
+    frame = _frame_phase(refctx, intgas, params, vert_lim, fftgas)
+    with stage('abel'):
+        _frame_abel([frame], params)
+    with stage('density'):
+        return _frame_density(frame, params)
+
+
+def analyse_batch(refctx, intgas, params, vert_lim, fftgas=None, first_shot=0):
+    '''
+    Apply the treatment of many interferograms with the same symmetric region: the inverse Abel transform of
+    all frames (phase and std maps) is one matrix product. Frames that can not be analysed are skipped with
+    a warning.
+    :param refctx: ReferenceContext of the run
+    :param intgas: list of 2D arrays of the plasma interferograms (analysis area)
+    :param params: analysis parameters (see analysis_parameters)
+    :param vert_lim: width of the symmetric region used in Abel inversion
+    :param fftgas: FFT of the frames when already computed (stack or list)
+    :param first_shot: index of the first frame in the run, or list with the index of each frame (used in warnings)
+    :return: list of analyse_frame dicts (None for skipped frames)
+    '''
+    if np.iterable(first_shot):
+        shot_index = list(first_shot)
+    else:
+        shot_index = list(range(first_shot, first_shot + len(intgas)))
+    frames = []
+    for k in range(0, len(intgas)):
+        set_frame(shot_index[k])
+        try:
+            frames.append(_frame_phase(refctx, intgas[k], params, vert_lim, None if fftgas is None else fftgas[k]))
+        except AnalysisError as e:
+            warnings.warn('Shot %d: %s' % (shot_index[k], e), AnalysisWarning)
+            frames.append(None)
+    with stage('abel', [shot_index[k] for k in range(0, len(frames)) if frames[k] is not None]):
+        _frame_abel([frame for frame in frames if frame is not None], params)
+    results = []
+    for k in range(0, len(frames)):
+        set_frame(shot_index[k])
+        if frames[k] is None:
+            results.append(None)
+        else:
+            with stage('density'):
+                results.append(_frame_density(frames[k], params))
+    return results
+
+
+# PHASE MAP OF ONE INTERFEROGRAM
+def _frame_phase(refctx, intgas, params, vert_lim=None, fftgas=None):
+    '''
+    Treatment of one interferogram before the inverse Abel transform: FFT, filter, phase map and std of the
+    phase map, cut on the symmetric region
+    :param refctx: ReferenceContext of the run
+    :param intgas: 2D array of the plasma interferogram (analysis area)
+    :param params: analysis parameters
+    :param vert_lim: width of the symmetric region used in Abel inversion; None = defined from this frame
+    :param fftgas: FFT of intgas when already computed
+    :return: dict with the maps of the frame
+    '''
+    return _frame_symmetry(_frame_unwrap(refctx, intgas, params, fftgas, vert_lim), params, vert_lim)
+
+
+def _frame_unwrap(refctx, intgas, params, fftgas=None, vert_lim=None):
+    '''
+    Treatment of one interferogram up to the unwrapped phase: FFT, filter, phase map and std of the phase map
+    :param refctx: ReferenceContext of the run
+    :param intgas: 2D array of the plasma interferogram (analysis area)
+    :param params: analysis parameters
+    :param fftgas: FFT of intgas when already computed
+    :param vert_lim: width of the symmetric region used in Abel inversion; with unwrap_region, only this region is
+                     unwrapped (None = region found on this frame)
+    :return: dict with the maps of the frame
+    '''
+    fringes = params['fringes']
+    fft = get_backend(params['fft_backend'], params['fft_workers'])
+    intref = refctx.intref
+    # Interferogram in the precision of the reference (see prepare_frame)
+    intgas = np.asarray(intgas, dtype=refctx.dtype)
+    with stage('fft'):
+        # Apply Fast Fourier Transform on interferogram data array (FFT of ref. interferogram is in refctx)
+        if fftgas is None:
+            fftgas = fft.fft2(intgas)  # gas interferogram
+        # Defining line or row to apply gaussian filter
+        fftmap = np.log(np.abs(fftgas))
+
+    with stage('filter'):
+        summap = spectrum_profile(fftmap, fringes)
+        centerfilter, f_range = params['centerfilter'], params['f_range']
+        if centerfilter == 0 and f_range == 0:
+            centerfilter, f_range = refctx.filter_position(fftmap, summap, fringes, params['carrier_tolerance'])
+        elif centerfilter == 0 or f_range == 0:
+            auto_center, auto_range = find_filter_position(fftmap, fringes, summap)
+            if centerfilter == 0:
+                centerfilter = auto_center
+            if f_range == 0:
+                f_range = auto_range
+        gfilter, sigma_gfilter, phaseref = refctx.filtered_phase(fringes, centerfilter, f_range,
+                                                                 params['sigma_gfilter'])
+
+    with stage('phase'):
+        # Applying Inverse FFT in resultant array obtained after use of the gaussian filter on FFT arrays
+        ifftgas = fft.ifft2(gfilter * fftgas)
+
+        # Creating Phase Maps arrays by subtracting the arguments of IFFT arrays
+        phasemaps = (np.angle(ifftgas) - phaseref)
+
+    with stage('unwrap'):
+        # Unwrap phase:
+        if params['unwrap_region']:
+            if vert_lim is None:
+                # First frame: the symmetric region is found on the whole map, then only this region is unwrapped
+                # (as in the next frames)
+                vert_lim = _symmetric_maps(unwrap(phasemaps, params['unwrap_method']), params)[3]
+            uwphasemap = unwrap_region(phasemaps, params, vert_lim)
+        else:
+            uwphasemap = unwrap(phasemaps, params['unwrap_method'])
+    '''
+    DEFINING STANDARD DEVIATION:
+    The standard deviation is calculated from fringes intensity distribution, fringes widths and
+    fringes displacement.
+    '''
+    with stage('registration'):
+        # Estimating displacement (vertical and horizontal) between interferograms from their spectra (the
+        # spectrum of the reference is computed once)
+        decimation = carrier_decimation(np.shape(fftgas), fringes, centerfilter, f_range,
+                                        params['registration_decimation'])
+        specgas = crop_spectrum(fftgas, decimation)
+        disp_xy, _, _ = phase_cross_correlation(specgas, refctx.registration_spectrum(decimation),
+                                                upsample_factor=params['registration_upsample'], space='fourier')
+        # in pixels of the interferograms
+        disp_xy = disp_xy * np.shape(fftgas) / np.shape(specgas)
+
+    with stage('std_phase'):
+        if fringes == 'vertical':
+            disp = float(np.absolute(disp_xy[1]))
+        if fringes == 'horizontal':
+            disp = float(np.absolute(disp_xy[0]))
+        # 2D array for fringes width distribution
+        dist_fw = refctx.fringes_width(fringes, params['fringes_method'])
+
+        '''
+        NOTE: During our algorithm tests we verify some computational artefacts.
+        These artifacts are detected only in the multiplication of the intensity distributions.
+        To correct this error we add a baseline line over data. The baseline has a value equal
+        to 0.1% of the lesser intensity.
+        '''
+        # Intensity distribution (the baseline is the same for all pixels)
+        basedist = 0.001 * refctx.min_ref
+        if basedist == 0.0:
+            basedist = 0.001 * np.min(intgas)
+
+        distI1 = intref + basedist
+        distI2 = intgas + basedist
+        try:
+            std_phasemap_i = ((np.pi * disp) / (2 * dist_fw)) * \
+                             np.sqrt((np.mean(distI1) * (distI1 + distI2)) / (2 * distI1 * distI2))
+            std_phasemap_i = std_phasemap_i.astype(refctx.dtype, copy=False)
+        except:
+            std_phasemap_i = np.zeros(np.shape(intref), dtype=refctx.dtype)
+        if params['unwrap_region']:
+            std_phasemap_i = std_phasemap_i[region_slice(np.shape(std_phasemap_i), params, vert_lim)]
+
+    return {
+        'fftmap': fftmap,
+        'gfilter': gfilter,
+        'centerfilter': centerfilter,
+        'f_range': f_range,
+        'carrier': carrier_position(summap, centerfilter, max(f_range, 1)),
+        'sigma_gfilter': sigma_gfilter,
+        'uwphasemap': uwphasemap,
+        'std_uwphasemap': std_phasemap_i,
+        'vert_lim': vert_lim if params['unwrap_region'] else None,  # region of unwrap_region
+    }
+
+
+def region_slice(shape, params, vert_lim):
+    '''
+    Symmetric region used in Abel inversion: the first vert_lim columns (vertical axisymmetry) or lines (horizontal
+    axisymmetry) and the border read by the gaussian blur
+    :param shape: shape of the phase map
+    :param params: analysis parameters
+    :param vert_lim: width of the symmetric region
+    :return: tuple of slices
+    '''
+    axis = 1 if params['axisymm'] == 'vertical' else 0
+    # scipy.ndimage.gaussian_filter reads 4 sigma around each pixel
+    end = min(vert_lim + int(4 * params['sigma_gblur'] + 0.5) + 1, shape[axis])
+    return (slice(None), slice(0, end)) if axis == 1 else (slice(0, end), slice(None))
+
+
+def unwrap_region(phasemaps, params, vert_lim):
+    '''
+    Unwrap only the symmetric region used in Abel inversion (see region_slice). The phase maps of the frame are cut
+    on this region, so the baseline, the symmetry axis and the mean maps only use unwrapped pixels.
+    :param phasemaps: 2D array of the wrapped phase
+    :param params: analysis parameters
+    :param vert_lim: width of the symmetric region
+    :return: 2D array of the unwrapped phase of the region
+    '''
+    return unwrap(phasemaps[region_slice(np.shape(phasemaps), params, vert_lim)], params['unwrap_method'])
+
+
+def _symmetric_maps(uwphasemap, params, std_uwphasemap=None):
+    '''
+    Blur of the unwrapped phase and of its std, background removal and position of the symmetry axis
+    :param uwphasemap: 2D array of the unwrapped phase
+    :param params: analysis parameters
+    :param std_uwphasemap: 2D array of the std of the unwrapped phase (None = not computed)
+    :return: phase map, std map (None without std_uwphasemap), True for flipped maps and width of the symmetric region
+    '''
+    # Apply gaussian filter to define the region with more intensity pixel value
+    phasemap_corr = (gaussian_filter(uwphasemap, sigma=params['sigma_gblur']))
+    std_phasemap_i = None
+    if std_uwphasemap is not None:
+        std_phasemap_i = (gaussian_filter(std_uwphasemap, sigma=params['sigma_gblur']))
+
+    # Transpose Matrix for Horizontal Axissmetry
+    if params['axisymm'] == 'horizontal':
+        phasemap_corr = np.transpose(phasemap_corr)
+        if std_phasemap_i is not None:
+            std_phasemap_i = np.transpose(std_phasemap_i)
+
+    # Remove rising background of PIL
+    nlines, nrows = np.shape(phasemap_corr)
+
+    # minimum of each line is the baseline (phasemap_corr - bl_map) * (-1)
+    bl_map = np.min(phasemap_corr, axis=1, keepdims=True)
+    phasemap_corr = bl_map - phasemap_corr
+
+    # Define region with more intensity pixel - position x and y
+    cline, crow = np.where(phasemap_corr <= np.min(phasemap_corr) * 0.98)
+    cx = np.median(crow) if len(crow) > 0 else math.nan
+
+    # If the region not found, set symmetric point like half image
+    if math.isnan(cx) == True:
+        cx = int(nrows / 2)
+    cx = int(cx)
+    # If right-side of image is more width
+    if cx >= int(nrows / 2):
+        phasemap_corr = np.flip(phasemap_corr, 0)
+        if std_phasemap_i is not None:
+            std_phasemap_i = np.flip(std_phasemap_i, 0)
+        return phasemap_corr, std_phasemap_i, True, int(2 * (nrows - cx) + 1)
+    # If left-side of image is more width
+    return phasemap_corr, std_phasemap_i, False, int(2 * cx + 1)
+
+
+def _frame_symmetry(frame, params, vert_lim=None):
+    '''
+    Blur of the unwrapped phase and of its std, background removal and cut on the symmetric region
+    :param frame: dict of _frame_unwrap
+    :param params: analysis parameters
+    :param vert_lim: width of the symmetric region used in Abel inversion; None = region of unwrap_region or defined
+                     from this frame
+    :return: dict with the maps of the frame (the maps of frame are not changed)
+    '''
+    '''
+    ################################################################################
+    Applying Inverse Abel Transform (IAT):
+    The IAT is applied using a PyAbel method (default: Dash Onion Peeling algorithm). To apply its library correctly
+    is necessary to define a axis symmetric in image (Horizontal or Vertical) and it is defined from more intensity
+    pixel range.
+    So, the image is cut according axissymetric.
+    NOTE: the Abel transform is always performed around the vertical axis, so when the image have horizontal
+    axissymmetry the matrix must be transposed.
+
+    '''
+    with stage('symmetry'):
+        phasemap_corr, std_phasemap_i, fliped_array, width = _symmetric_maps(frame['uwphasemap'], params,
+                                                                             frame['std_uwphasemap'])
+        if vert_lim is None:
+            vert_lim = width if frame['vert_lim'] is None else frame['vert_lim']
+
+        phasemap_symm = phasemap_corr[:, 0:vert_lim]
+        std_phasemap_symm = std_phasemap_i[:, 0:vert_lim]
+
+    return {
+        'fftmap': frame['fftmap'],
+        'gfilter': frame['gfilter'],
+        'centerfilter': frame['centerfilter'],
+        'f_range': frame['f_range'],
+        'carrier': frame['carrier'],
+        'sigma_gfilter': frame['sigma_gfilter'],
+        'vert_lim': vert_lim,
+        'phasemap_corr': phasemap_corr,
+        'std_phasemap_i': std_phasemap_i,
+        'phasemap_symm': phasemap_symm,
+        'std_phasemap_symm': std_phasemap_symm,
+        'fliped_array': fliped_array,
+    }
+
+
+# INVERSE ABEL TRANSFORM OF MANY INTERFEROGRAMS
+def _frame_abel(frames, params, warn=None):
+    '''
+    Inverse Abel transform of the symmetric phase maps and std maps of frames with the same width: all lines
+    of all maps are transformed by one matrix product (see abelengine)
+    :param frames: list of _frame_phase dicts (updated with 'phase_abel0' and 'std_phase0')
+    :param params: analysis parameters
+    :param warn: function called with the message of each warning; None = AnalysisWarning issued by warnings.warn
+    :return: None
+    '''
+    if not frames:
+        return
+    try:
+        # Applying inverse Abel Transform
+        engine = get_abel_engine(params['abel_method'], params['abel_cache_dir'])
+        maps = np.concatenate([m for frame in frames for m in (frame['phasemap_symm'], frame['std_phasemap_symm'])])
+        lines = engine.inverse(maps, maps.dtype)
+    except Exception:
+        lines = None
+    start = 0
+    for frame in frames:
+        nlines = len(frame['phasemap_symm'])
+        if lines is None:
+            frame['phase_abel0'] = np.zeros_like(frame['phasemap_symm'])
+            frame['std_phase0'] = np.zeros_like(frame['phasemap_symm'])
+            message = 'Unable to apply the Abel transform to the selected image!'
+            if warn is None:
+                warnings.warn(message, AnalysisWarning)
+            else:
+                warn(message)
+        else:
+            frame['phase_abel0'] = lines[start:start + nlines]
+            frame['std_phase0'] = lines[start + nlines:start + 2 * nlines]
+        start += 2 * nlines
+
+
+# PLASMA DENSITY OF ONE INTERFEROGRAM
+def _frame_density(frame, params):
+    '''
+    Treatment of one interferogram after the inverse Abel transform: normalized phase, refraction index,
+    plasma density and their standard deviations
+    :param frame: dict of _frame_phase with the inverse Abel transform (see _frame_abel)
+    :param params: analysis parameters
+    :return: dict with the maps of all stages and the filter parameters used
+    '''
+    # Python numbers do not change the precision of the maps
+    factor = float(params['factor'])
+    lambda0 = float(params['lambda0'])
+    unc_lambda0 = float(params['unc_lambda0'])
+    vert_lim = frame['vert_lim']
+    phasemap_corr, std_phasemap_i = frame['phasemap_corr'], frame['std_phasemap_i']
+    phasemap_symm, std_phasemap_symm = frame['phasemap_symm'], frame['std_phasemap_symm']
+    phase_abel0, std_phase0 = frame['phase_abel0'], frame['std_phase0']
+
+    if frame['fliped_array'] == True:
+        phase_abel0 = np.flip(phase_abel0, 0)
+        phasemap_corr = np.flip(phasemap_corr, 0)
+        phasemap_symm = np.flip(phasemap_symm, 0)
+        std_phasemap_symm = np.flip(std_phasemap_symm, 0)
+        std_phase0 = np.flip(std_phase0, 0)
+    '''
+    ############################################################################################
+    Calculating std from Abel Transform:
+    The std is calculated using deviation of mormalized phasemap and normalized IAT phasemap
+    '''
+    phase_abel = phase_abel0[:, int(0.05 * vert_lim): int(0.95 * vert_lim)]
+    phasemap_cut = phasemap_symm[:, int(0.05 * vert_lim): int(0.95 * vert_lim)]
+    norm_phasemap = np.zeros_like(phase_abel)
+    if np.size(phase_abel) > 0:
+        # Each line of the phasemap is scaled to the maximum of the IAT line (null lines stay null)
+        max_abel = np.max(abs(phase_abel), axis=1, keepdims=True)
+        max_phase = np.max(abs(phasemap_cut), axis=1, keepdims=True)
+        valid = (max_phase != 0)[:, 0]
+        norm_phasemap[valid] = phasemap_cut[valid] * max_abel[valid] / max_phase[valid]
+
+    std_abelmap_2 = np.sqrt(np.square(phase_abel - norm_phasemap))
+
+    '''
+    ########################################################################################
+    Calculating refraction index and plasma electronic density from IAT phasemap.
+    '''
+    # Calculating index refraction from IAT of phasemap (n - 1 is kept: 1 - n^2 = -(2 dn + dn^2) does not lose the
+    # digits of dn, which is small compared to 1)
+    dn_index0 = (phase_abel0 * lambda0) / (2 * np.pi * factor)
+    n_index0 = 1 + dn_index0
+    # Cutting border of images due the computational artefacts generated by IAT and problems with no symmetric images
+    dn_index = dn_index0[:, int(0.05 * vert_lim): int(0.95 * vert_lim)]
+    n_index = n_index0[:, int(0.05 * vert_lim): int(0.95 * vert_lim)]
+    # Calculating plasma density. Const 1.11485e15 1/m
+    try:
+        plasma_dens_i = (-const_plasma * dn_index * (2 + dn_index)) / (lambda0 * lambda0) * 1e-6  # cm-3
+
+        plasma_dens_i = plasma_dens_i - np.min(plasma_dens_i)
+    except:
+        plasma_dens_i = np.zeros_like(n_index)
+
+    '''
+    CALCULATION TOTAL STANDARD DEVIATION FROM:
+    1. Measurement of interferogram
+    2. Inverse Abel Transform
+    3. FWHM Laser wavelength
+    '''
+    dN_n = (-const_plasma * 2 * n_index) / (np.square(lambda0))
+
+    # Contribution 1: measurement interferogram
+    std_phase1 = abs(std_phase0[:, int(0.05 * vert_lim): int(0.95 * vert_lim)] / factor)  # rad/um
+    # Contribution 2: Abel inversion Accuracy
+    std_phase2 = abs(std_abelmap_2 / factor)  # rad/m
+
+    std_phase = np.sqrt(np.square(std_phase1) + np.square(std_phase2))  # rad/m
+    dn_phase = (lambda0) / (2 * np.pi)  #
+
+    # Contribution 3: laser wavelength
+    dn_lambda = phase_abel / (2 * np.pi * factor)  # rad/m
+
+    std_plasma_dens_i = abs(dN_n) * np.sqrt(np.square(dn_phase * std_phase) +
+                                            np.square(dn_lambda * unc_lambda0)) * 1e-6
+
+    if params['axisymm'] == 'horizontal':
+        phasemap_corr = np.transpose(phasemap_corr)
+        phase_abel = np.transpose(phase_abel)
+        std_abelmap_2 = np.transpose(std_abelmap_2)
+        std_plasma_dens_i = np.transpose(std_plasma_dens_i)
+        plasma_dens_i = np.transpose(plasma_dens_i)
+        std_phasemap_i = np.transpose(std_phasemap_i)
+        norm_phasemap = np.transpose(norm_phasemap)
+
+    return {
+        'fftmap': frame['fftmap'],
+        'gfilter': frame['gfilter'],
+        'phasemap': phasemap_corr,
+        'std_phasemap': std_phasemap_i,
+        'abelmap': phase_abel,
+        'std_abelmap': std_abelmap_2,
+        'norm_phasemap': norm_phasemap,
+        'density': plasma_dens_i,
+        'std_density': std_plasma_dens_i,
+        'centerfilter': frame['centerfilter'],
+        'f_range': frame['f_range'],
+        'carrier': frame['carrier'],
+        'sigma_gfilter': frame['sigma_gfilter'],
+        'vert_lim': vert_lim,
+    }
+
+
+# ANALYSIS OF MANY INTERFEROGRAMS
+def _analyse_shot(refctx, intgas, params, vert_lim, j, fftgas=None):
+    '''
+    Analyse one shot of a run (frames that can not be analysed are skipped with a warning)
+    :param refctx: ReferenceContext of the run
+    :param intgas: 2D array of the plasma interferogram (analysis area)
+    :param params: analysis parameters
+    :param vert_lim: width of the symmetric region used in Abel inversion (None for the first frame)
+    :param j: index of the shot
+    :param fftgas: FFT of intgas when already computed
+    :return: dict of analyse_frame or None
+    '''
+    try:
+        return analyse_frame(refctx, intgas, params, vert_lim, fftgas)
+    except AnalysisError as e:
+        warnings.warn('Shot %d: %s' % (j, e), AnalysisWarning)
+        return None
+
+
+# Reference interferogram of the worker processes
+_worker_reference = None
+
+
+def _init_worker(intref, params, carriers=None):
+    '''
+    Initialize a worker process with the reference interferogram of the run
+    :param intref: 2D array of the reference interferogram (analysis area)
+    :param params: analysis parameters
+    :param carriers: automatic filter positions already detected (see ReferenceContext.filter_position)
+    :return: None
+    '''
+    global _worker_reference
+    _worker_reference = ReferenceContext(intref, get_backend(params['fft_backend'], params['fft_workers']))
+    _worker_reference.carriers.update(carriers or {})
+
+
+def _worker_shot(shot, params, vert_lim, j, profile_memory=None):
+    '''
+    Analyse one shot in a worker process
+    :param profile_memory: None = no profiling; False/True = stages profiled without/with peak memory
+    :return: dict of analyse_frame (or None), warnings raised during the analysis and profiling records
+    '''
+    profiler = StageProfiler(memory=profile_memory) if profile_memory is not None else None
+    with warnings.catch_warnings(record=True) as frame_warnings:
+        warnings.simplefilter('always')
+        if profiler is None:
+            intgas = prepare_frame(shot, params['roi'], params['rotate_degree'], frame_dtype(params))
+            frame = _analyse_shot(_worker_reference, intgas, params, vert_lim, j)
+        else:
+            with profiler.activate():
+                set_frame(j)
+                with stage('prepare'):
+                    intgas = prepare_frame(shot, params['roi'], params['rotate_degree'], frame_dtype(params))
+                frame = _analyse_shot(_worker_reference, intgas, params, vert_lim, j)
+    records = profiler.records if profiler is not None else []
+    return frame, [(str(w.message), w.category) for w in frame_warnings], records
+
+
+def _worker_result(future, profiler):
+    '''
+    Frame analysed by a worker process; its warnings are issued again and its profiling records are included in
+    the profiler of the run
+    :param future: Future of _worker_shot
+    :param profiler: StageProfiler of the run or None
+    :return: dict of analyse_frame (or None)
+    '''
+    frame, frame_warnings, records = future.result()
+    for message, category in frame_warnings:
+        warnings.warn(message, category)
+    for rec in records:
+        profiler.record(rec['stage'], rec['time'], rec['frame'], rec['peak_memory'])
+    return frame
+
+
+def _iter_analysis(refctx, items, params, vert_lim, workers):
+    '''
+    Analyse some shots of a run with the same filter and symmetric region, in order
+    :param refctx: ReferenceContext of the run
+    :param items: iterable of (index, plasma interferogram array) of the shots to analyse, read when needed
+    :param params: analysis parameters
+    :param vert_lim: width of the symmetric region used in Abel inversion
+    :param workers: number of processes
+    :return: generator of analyse_frame dicts (None for skipped frames)
+    '''
+    items = iter(items)
+    if workers == 1:
+        fft = get_backend(params['fft_backend'], params['fft_workers'])
+        while True:
+            batch = list(islice(items, fft_batch_size))
+            if not batch:
+                return
+            index = [k for k, _ in batch]
+            with stage('prepare', index):
+                intgas = [prepare_frame(shot, params['roi'], params['rotate_degree'], frame_dtype(params))
+                          for _, shot in batch]
+            del batch
+            # Forward FFT and inverse Abel transform of a batch of frames at once
+            with stage('fft', index):
+                fftgas = fft.fft2(np.stack(intgas))
+            yield from analyse_batch(refctx, intgas, params, vert_lim, fftgas, index)
+
+    # No processes are started when there is no shot to analyse (e.g. all shots in the result cache)
+    first = next(items, None)
+    if first is None:
+        return
+    items = chain([first], items)
+    profiler = active_profiler()
+    profile_memory = profiler.memory if profiler is not None else None
+    # Each process uses one FFT thread unless defined by user
+    worker_params = dict(params)
+    if worker_params['fft_workers'] is None:
+        worker_params['fft_workers'] = 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(refctx.intref, worker_params, refctx.carriers)) as executor:
+        # Results are returned in the order of the shots. Only a few shots per process are read ahead, so shots
+        # read on demand (ShotFiles) are not all in memory.
+        pending = deque()
+        for k, shot in items:
+            pending.append(executor.submit(_worker_shot, shot, worker_params, vert_lim, k, profile_memory))
+            if len(pending) >= worker_read_ahead * workers:
+                yield _worker_result(pending.popleft(), profiler)
+        while pending:
+            yield _worker_result(pending.popleft(), profiler)
+
+
+def iter_frames(refctx, shots, params, workers=1):
+    '''
+    Analyse the shots of a run, in order. The first analysed frame defines the filter position, range and the
+    symmetric region used in all frames (the automatic filter can be detected again, see carrier_tolerance); the
+    other frames can be analysed in parallel by worker processes. With result_cache_dir, frames already analysed
+    with the same reference and parameters are read from disk.
+    :param refctx: ReferenceContext of the run
+    :param shots: list of plasma interferogram arrays (or ShotFiles, read on demand)
+    :param params: analysis parameters (updated with the filter parameters of the first frame)
+    :param workers: number of processes; 1 = serial analysis, None or 0 = number of cores
+    :return: generator of analyse_frame dicts, with the index of the shot ('shot')
+    '''
+    if not workers:
+        workers = os.cpu_count() or 1
+    cache = None
+    if params['result_cache_dir'] is not None:
+        cache = get_result_cache(params['result_cache_dir'], params['result_cache_size'])
+        reference_key = array_key(refctx.intref)
+    vert_lim = None
+    j = 0
+    while j < len(shots) and vert_lim is None:
+        set_frame(j)
+        frame = None
+        # Each shot is read once, for its key and its analysis
+        with stage('read'):
+            shot = shots[j]
+        if cache is not None:
+            key = cache.key(shot, reference_key, params, vert_lim)
+            with stage('cache'):
+                frame = cache.load(key)
+        if frame is None:
+            with stage('prepare'):
+                intgas = prepare_frame(shot, params['roi'], params['rotate_degree'], frame_dtype(params))
+            frame = _analyse_shot(refctx, intgas, params, vert_lim, j)
+            if frame is not None and cache is not None:
+                with stage('cache'):
+                    cache.save(key, frame)
+        j += 1
+        if frame is not None:
+            # Filter position, range and symmetric region of the first analysed frame are used in all frames
+            # (the automatic filter is checked on each frame when there is a carrier tolerance)
+            if params['carrier_tolerance'] is None or params['centerfilter'] != 0 or params['f_range'] != 0:
+                params['centerfilter'] = frame['centerfilter']
+                params['f_range'] = frame['f_range']
+                params['sigma_gfilter'] = frame['sigma_gfilter']
+            vert_lim = frame['vert_lim']
+            frame['shot'] = j - 1
+            yield frame
+
+    # Shots of the order of the run: (index, cache key, frame read from the cache or None = analysed)
+    order = deque()
+
+    def to_analyse():
+        '''
+        Shots not found in the cache, read once (the key of each shot is computed when it is read)
+        '''
+        for k in range(j, len(shots)):
+            set_frame(k)
+            with stage('read'):
+                shot = shots[k]
+            key = frame = None
+            if cache is not None:
+                key = cache.key(shot, reference_key, params, vert_lim)
+                with stage('cache'):
+                    frame = cache.load(key)
+            order.append((k, key, frame))
+            if frame is None:
+                yield k, shot
+
+    analysed = _iter_analysis(refctx, to_analyse(), params, vert_lim, min(workers, max(len(shots) - j, 1)))
+    results = deque()  # analysed frames not yet returned (in order)
+    exhausted = False
+    while order or not exhausted:
+        if order and order[0][2] is not None:
+            k, _, frame = order.popleft()
+        elif order and results:
+            k, key, _ = order.popleft()
+            frame = results.popleft()
+            if frame is not None and cache is not None:
+                with stage('cache', [k]):
+                    cache.save(key, frame)
+        elif exhausted:
+            break
+        else:
+            # Next analysed frame (the shots before it found in the cache are returned first)
+            try:
+                results.append(next(analysed))
+            except StopIteration:
+                exhausted = True
+            continue
+        if frame is not None:
+            frame['shot'] = k
+            yield frame
+
+
+def analyse_shots(ref, shots, workers=1, profiler=None, on_frame=None, **kwargs):
+    '''
+    Analyse plasma interferograms against one reference and average the results
+    :param ref: reference interferogram array
+    :param shots: list of plasma interferogram arrays (or ShotFiles, read on demand)
+    :param workers: number of processes; 1 = serial analysis, None or 0 = number of cores
+    :param profiler: StageProfiler that measures the stages of the analysis (None = no profiling)
+    :param on_frame: function called with each analysed frame (dict of iter_frames), e.g. ResultWriter.add_frame
+                     to save the maps of each frame without keeping them in memory; None = frames are not kept
+    :param kwargs: analysis parameters (see DEFAULT_PARAMETERS)
+    :return: dict with mean and std maps of phase, Abel and density, maps of the last frame
+             (FFT, filter, normalized phase), the filter parameters used and, with a profiler, the
+             profiling report ('profile')
+    '''
+    if profiler is None:
+        return _analyse_shots(ref, shots, workers, on_frame, kwargs)
+    with profiler.activate():
+        result = _analyse_shots(ref, shots, workers, on_frame, kwargs)
+    result['profile'] = profiler.report()
+    return result
+
+
+def _analyse_shots(ref, shots, workers, on_frame, kwargs):
+    '''
+    Analyse plasma interferograms against one reference and average the results (see analyse_shots)
+    '''
+    params = analysis_parameters(**kwargs)
+    with stage('reference'):
+        intref = reference_context(prepare_frame(ref, params['roi'], params['rotate_degree'], frame_dtype(params)),
+                                   get_backend(params['fft_backend'], params['fft_workers']))
+    frames = iter_frames(intref, shots, params, workers)
+    if on_frame is not None:
+        frames = _call_on_frames(frames, on_frame)
+    return _mean_result(frames)
+
+
+def _call_on_frames(frames, on_frame):
+    '''
+    Frames of a run, given to on_frame before the aggregation
+    '''
+    for frame in frames:
+        with stage('on_frame', [frame['shot']]):
+            on_frame(frame)
+        yield frame
+
+
+def _mean_result(frames):
+    '''
+    Mean and std maps of the analysed frames of a run
+    :param frames: iterable of analyse_frame dicts
+    :return: dict of analyse_shots
+    '''
+    # Mean and std maps are updated frame by frame (constant memory)
+    stages = {'phasemap': RunningMaps(), 'abelmap': RunningMaps(), 'density': RunningMaps()}
+    frame = None
+    for frame in frames:
+        with stage('aggregation'):
+            for key in stages:
+                stages[key].add(frame[key], frame['std_' + key])
+
+    if frame is None:
+        raise AnalysisError('Unable to analyse any of the selected images!')
+
+    with stage('aggregation', []):
+        result = dict(frame)
+        result.pop('shot', None)
+        result['n_frames'] = stages['phasemap'].n
+        # BUILDING 2D ARRAYS RESULTS FOR: PHASEMAP, INV. ABEL TRANSF. MAP AND PLASMA DENSITY
+        for key in stages:
+            result[key], result['std_' + key] = stages[key].result()
+    return result
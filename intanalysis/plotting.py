@@ -0,0 +1,220 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# 2D maps of the analysis: one figure (image, colorbar and axes) kept between plots and updated in place, and the
+# colormaps of the software computed only once. The figure does not depend on pyplot, so it can be shown on a Tk
+# canvas or saved without a window.
+import matplotlib
+import numpy as np
+
+from matplotlib.colors import ListedColormap
+from matplotlib.figure import Figure
+from matplotlib.layout_engine import TightLayoutEngine
+from mpl_toolkits.axes_grid1 import make_axes_locatable
+
+# Colormaps already computed (by order of the color distribution)
+_colormaps = {}
+# Colorbar labels of the 2D maps of each stage (mean and std maps)
+map_labels = {
+    'phasemap': ('$\Delta\phi\hspace{.5} (rad)$', '$\sigma_{\Delta\phi}\hspace{.5} (rad)$'),
+    'abelmap': ('$\Delta\phi_{r}\hspace{.5} (rad/ \mu m)$', '$\sigma_{\Delta\phi_{r}}\hspace{.5} (rad/ \mu m)$'),
+    'density': ('$N_{e}\hspace{.5} (cm^{-3})$', '$\sigma_{N_e}\hspace{.5} (cm^{-3})$'),
+}
+# Vertical axis and curve labels (with the height in um) of the 1D profiles of each stage
+profile_labels = {
+    'phasemap': ('$\Delta\phi\hspace{.5} (rad)$', '$%d \hspace{.5}\mu m$'),
+    'abelmap': ('$\Delta\phi_{r}\hspace{.5} (rad/ \mu m)$', '$(\Delta\phi_r)_{%d \hspace{.5}\mu m}$'),
+    'density': ('$N\hspace{.5} (cm^{-3})$', '$%d \hspace{.5}\mu m$'),
+}
+
+
+#################################################################################
+# FUNCTIONS
+################################################################################
+# COLORMAPS
+def colormap(n):
+    '''
+    Color distribution at the colormap (rainbow_r with 512 colors)
+    :param n: n_order for colormap (1 linear, 2 quadratic, 3 cubic)
+    :return: ListedColormap
+    '''
+    if n not in _colormaps:
+        rainbow = matplotlib.colormaps['rainbow_r'].resampled(512)
+        _colormaps[n] = ListedColormap(rainbow(np.power(np.linspace(1, 0, 512), n)))
+    return _colormaps[n]
+
+
+# 1D PROFILE OF A MAP
+def radial_profile(matrix, height, factor, axisymm):
+    '''
+    Profile of a map across the symmetry axis at one height (as the 1D plots of the GUI)
+    :param matrix: 2D map
+    :param height: height from the origin (pixel); the origin is the last line (vertical axisymmetry) or the first
+                   column (horizontal axisymmetry)
+    :param factor: scale factor (m/pixel)
+    :param axisymm: axisymmetry orientation ('vertical' or 'horizontal')
+    :return: radial axis (um) and profile
+    '''
+    rangeh, rangev = np.shape(matrix)
+    if axisymm == 'vertical':
+        raxis = np.arange(-rangev / 2, rangev / 2, 1)
+        profile = matrix[rangeh - 1 - height]
+    else:
+        raxis = np.arange(-rangeh / 2, rangeh / 2, 1)
+        profile = matrix[:, height]
+    return raxis * factor * 1e6, profile
+
+
+def _tight_layout(fig):
+    '''
+    Tight layout of a figure (as Figure.tight_layout(pad=2)), without leaving a layout engine in the figure:
+    savefig draws a figure with a layout engine twice
+    :param fig: Figure
+    :return: None
+    '''
+    TightLayoutEngine(pad=2).execute(fig)
+
+
+class MapView:
+    '''
+    Figure of one 2D map. The image and the colorbar are created once and the next maps only change their data,
+    color limits and colormap (set_data, set_clim, set_cmap); the layout is computed again only when the map
+    shape, its axes or the colorbar label change.
+    '''
+
+    def __init__(self, figsize=(4.9, 4)):
+        '''
+        :param figsize: figure size (inches)
+        '''
+        self.fig = Figure(figsize=figsize)
+        self.ax = self.fig.add_subplot()
+        divider = make_axes_locatable(self.ax)
+        self.cax = divider.append_axes("right", size="5%", pad=0.05)
+        self._locator = self.ax.get_axes_locator()  # position of the map beside the colorbar
+        self.image = None
+        self.colorbar = None
+        self.marker = None  # line of the filter position
+        self._layout = None
+
+    def show(self, matrix, cmap, label=None, extent=None, marker=None):
+        '''
+        Plot a map on the figure (the figure must be drawn again by its canvas)
+        :param matrix: 2D array
+        :param cmap: colormap (name or Colormap)
+        :param label: colorbar label (None = map without colorbar)
+        :param extent: (x_max, y_max) of the axes in um (None = axes in pixels)
+        :param marker: ('horizontal' or 'vertical', position in pixels) of a red line (None = no line)
+        :return: None
+        '''
+        matrix = np.asarray(matrix)
+        rows, cols = np.shape(matrix)
+        if extent is None:
+            extent_plot = (-0.5, cols - 0.5, rows - 0.5, -0.5)
+        else:
+            extent_plot = (0, extent[0], 0, extent[1])
+        if self.image is None:
+            self.image = self.ax.imshow(matrix, extent=extent_plot, cmap=cmap)
+            self.colorbar = self.fig.colorbar(self.image, cax=self.cax)
+        else:
+            self.image.set_data(matrix)
+            self.image.set_cmap(cmap)
+            self.image.set_extent(extent_plot)
+        # Color limits of the new map (both limits at once, as imshow)
+        finite = np.isfinite(matrix)
+        if finite.any():
+            self.image.norm.autoscale(matrix[finite])
+
+        # Maps without colorbar use the whole axes
+        if label is None:
+            self.cax.set_visible(False)
+            self.ax.set_axes_locator(None)
+            self.ax.set_xlabel('')
+            self.ax.set_ylabel('')
+        else:
+            self.cax.set_visible(True)
+            self.ax.set_axes_locator(self._locator)
+            self.colorbar.set_label(label=label, size=12, weight='bold')
+            if extent is not None:
+                self.ax.set_xlabel('$x\hspace{.5}(\mu m)$', fontsize=12)
+                self.ax.set_ylabel('$y\hspace{.5}(\mu m)$', fontsize=12)
+
+        if self.marker is not None:
+            self.marker.remove()
+            self.marker = None
+        if marker is not None:
+            if marker[0] == 'horizontal':
+                self.marker = self.ax.axhline(y=marker[1], lw=1, alpha=0.5, color='red')
+            else:
+                self.marker = self.ax.axvline(x=marker[1], lw=1, alpha=0.5, color='red')
+
+        # The size of the colorbar and axes labels changes with the map shape, its axes and the colorbar label
+        layout = (rows, cols, extent_plot, label)
+        if layout != self._layout:
+            self._layout = layout
+            _tight_layout(self.fig)
+
+    def savefig(self, fname, **kwargs):
+        '''
+        Save the figure
+        :param fname: file name
+        :param kwargs: options of Figure.savefig
+        :return: None
+        '''
+        self.fig.savefig(fname, **kwargs)
+
+
+class ProfileView:
+    '''
+    Figure of one 1D profile. The curve and its std band are updated in place (set_data) and the layout is computed
+    again only when the vertical axis label changes.
+    '''
+
+    def __init__(self, figsize=(4.9, 4)):
+        '''
+        :param figsize: figure size (inches)
+        '''
+        self.fig = Figure(figsize=figsize)
+        self.ax = self.fig.add_subplot()
+        self.ax.set_xlabel('$r\hspace{.5}(\mu m)$', fontsize=12)
+        self.ax.grid(True)
+        self.line, = self.ax.plot([], [], lw=2, color="blue")
+        self.band = None  # std band of the curve
+        self._layout = None
+
+    def show(self, raxis, profile, ylabel, label, std=None):
+        '''
+        Plot a profile on the figure (the figure must be drawn again by its canvas)
+        :param raxis: radial axis (um)
+        :param profile: 1D array
+        :param ylabel: vertical axis label
+        :param label: curve label
+        :param std: std of the profile, shown as a band (None = no band)
+        :return: None
+        '''
+        self.line.set_data(raxis, profile)
+        self.line.set_label(label)
+        if self.band is not None:
+            self.band.remove()
+            self.band = None
+        if std is not None:
+            self.band = self.ax.fill_between(raxis, profile - std, profile + std, alpha=0.2, color="blue",
+                                             label='$\sigma$')
+        # Vertical limits of the curve and its band (relim only uses the curve)
+        self.ax.relim()
+        if std is not None:
+            self.ax.update_datalim(np.column_stack((np.r_[raxis, raxis], np.r_[profile - std, profile + std])))
+        self.ax.autoscale_view()
+        self.ax.set_ylabel(ylabel, fontsize=12)
+        self.ax.legend()
+        if ylabel != self._layout:
+            self._layout = ylabel
+            _tight_layout(self.fig)
+
+    def savefig(self, fname, **kwargs):
+        '''
+        Save the figure
+        :param fname: file name
+        :param kwargs: options of Figure.savefig
+        :return: None
+        '''
+        self.fig.savefig(fname, **kwargs)
@@ -0,0 +1,157 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# Instrumentation of the analysis: wall-clock time and peak memory of each stage of each frame.
+# The pipeline marks its stages with "with stage('name'):"; without an active profiler the marks do nothing.
+import contextlib
+import json
+import time
+import tracemalloc
+
+# Mark of the stages when no profiler is active
+_null_stage = contextlib.nullcontext()
+# Profiler of the running analysis
+_active = None
+
+
+#################################################################################
+# FUNCTIONS
+################################################################################
+# STAGE MARKS
+def stage(name, frames=None):
+    '''
+    Mark one stage of the analysis (context manager)
+    :param name: stage name
+    :param frames: index (or list of indexes) of the frames of the stage; None = current frame of the profiler
+    :return: context manager
+    '''
+    if _active is None:
+        return _null_stage
+    return _active.stage(name, frames)
+
+
+def set_frame(j):
+    '''
+    Index of the frame analysed in the next stages
+    :param j: index of the shot
+    :return: None
+    '''
+    if _active is not None:
+        _active.frame = j
+
+
+def active_profiler():
+    '''
+    Profiler of the running analysis
+    :return: StageProfiler or None
+    '''
+    return _active
+
+
+class StageProfiler:
+    '''
+    Time and peak memory (optional, with tracemalloc) of the stages of an analysis. Records are kept in memory
+    and can be written as JSON lines.
+    '''
+
+    def __init__(self, memory=False, jsonl=None):
+        '''
+        :param memory: measure the peak memory of each stage (tracemalloc, slower)
+        :param jsonl: file where each record is appended as one JSON line (None = no file)
+        '''
+        self.memory = memory
+        self.jsonl = jsonl
+        self.records = []
+        self.frame = None  # index of the frame analysed
+
+    @contextlib.contextmanager
+    def stage(self, name, frames=None):
+        '''
+        Measure one stage (context manager)
+        :param name: stage name
+        :param frames: index (or list of indexes) of the frames of the stage; None = current frame
+        '''
+        if frames is None:
+            frames = self.frame
+        memory = self.memory and tracemalloc.is_tracing()
+        if memory:
+            memory0 = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            peak_memory = tracemalloc.get_traced_memory()[1] - memory0 if memory else None
+            self.record(name, elapsed, frames, peak_memory)
+
+    def record(self, name, seconds, frames=None, peak_memory=None):
+        '''
+        Include the measurement of one stage
+        :param name: stage name
+        :param seconds: wall-clock time (s)
+        :param frames: index (or list of indexes) of the frames of the stage
+        :param peak_memory: memory allocated at the peak of the stage (bytes) or None
+        :return: None
+        '''
+        rec = {'stage': name, 'frame': frames, 'time': seconds, 'peak_memory': peak_memory}
+        self.records.append(rec)
+        if self.jsonl is not None:
+            with open(self.jsonl, 'a') as f:
+                f.write(json.dumps(rec) + '\n')
+
+    @contextlib.contextmanager
+    def activate(self):
+        '''
+        Use this profiler in the stages of the analysis (context manager)
+        '''
+        global _active
+        previous = _active
+        start_tracing = self.memory and not tracemalloc.is_tracing()
+        if start_tracing:
+            tracemalloc.start()
+        _active = self
+        try:
+            yield self
+        finally:
+            _active = previous
+            if start_tracing:
+                tracemalloc.stop()
+
+    def summary(self):
+        '''
+        Measurements by stage (in order of the first record)
+        :return: dict stage name -> dict with calls, total, mean and max time (s) and max peak memory (bytes)
+        '''
+        stages = {}
+        for rec in self.records:
+            s = stages.setdefault(rec['stage'], {'calls': 0, 'total': 0.0, 'max': 0.0, 'peak_memory': None})
+            s['calls'] += 1
+            s['total'] += rec['time']
+            s['max'] = max(s['max'], rec['time'])
+            if rec['peak_memory'] is not None:
+                s['peak_memory'] = max(s['peak_memory'] or 0, rec['peak_memory'])
+        for s in stages.values():
+            s['mean'] = s['total'] / s['calls']
+        return stages
+
+    def report(self):
+        '''
+        Structured record of the analysis
+        :return: dict with the summary by stage, the total time (s) and all records
+        '''
+        return {'stages': self.summary(), 'total': sum(rec['time'] for rec in self.records),
+                'records': list(self.records)}
+
+    def format_summary(self):
+        '''
+        Text table of the summary (time and peak memory of each stage)
+        :return: string
+        '''
+        stages = self.summary()
+        total = sum(s['total'] for s in stages.values()) or 1.0
+        lines = ['%-13s %9s %5s %9s' % ('stage', 'time (ms)', '%', 'peak (MB)')]
+        for name, s in stages.items():
+            peak = '%9.1f' % (s['peak_memory'] / 1e6) if s['peak_memory'] is not None else '%9s' % '-'
+            lines.append('%-13s %9.1f %5.1f %s' % (name, 1e3 * s['total'], 100 * s['total'] / total, peak))
+        return '\n'.join(lines)
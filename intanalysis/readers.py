@@ -0,0 +1,148 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# Interferogram file readers (SNP and image files) shared by the GUI and the headless analysis.
+import os
+import numpy as np
+
+from PIL import Image
+
+# Image files extensions accepted as interferogram shots
+shot_extensions = ('.snp', '.png')
+# SNP files (Newport CCD): header size and frame dimensions (width, height)
+snp_offset = 60
+snp_size = 720, 576
+
+
+#################################################################################
+# FUNCTIONS
+################################################################################
+# SNP FILE TO ARRAY
+def read_snp(filename):
+    '''
+    Read the frame of a SNP file (Newport proprietary format) without copying it:
+    the file is memory-mapped and the frame is a flipped view of the pixel data
+    :param filename: path of SNP file
+    :return: 2D array (uint8, read-only) with the interferogram
+    '''
+    n_pixels = snp_size[0] * snp_size[1]
+    if os.path.getsize(filename) < snp_offset + n_pixels:
+        raise ValueError('%s is not a %dx%d SNP file' % (filename, snp_size[0], snp_size[1]))
+    data0 = np.memmap(filename, dtype=np.uint8, mode='r', offset=snp_offset, shape=(n_pixels,))
+    # Pixels are stored from the last to the first one
+    return data0[::-1].reshape(snp_size[1], snp_size[0])
+
+
+# SNP FILES TO STACK OF ARRAYS
+def read_snp_stack(filenames):
+    '''
+    Read many SNP files in one 3D array
+    :param filenames: list of SNP file paths
+    :return: 3D array (uint8) with shape (number of files, height, width)
+    '''
+    stack = np.empty((len(filenames), snp_size[1], snp_size[0]), dtype=np.uint8)
+    for i in range(0, len(filenames)):
+        stack[i] = read_snp(filenames[i])
+    return stack
+
+
+def read_snp_dir(path):
+    '''
+    Read all SNP files of a directory (sorted by name, as list_shots) in one 3D array
+    :param path: directory path
+    :return: 3D array (uint8) with shape (number of files, height, width)
+    '''
+    return read_snp_stack([f for f in list_shots(path) if f.lower().endswith('.snp')])
+
+
+# IMAGE FILE TO PIL IMAGE
+def open_image(filename):
+    '''
+    Open an interferogram file as PIL image (SNP files are decoded in memory)
+    :param filename: path of file
+    :return: PIL image
+    '''
+    if filename.lower().endswith('.snp'):
+        return Image.fromarray(np.ascontiguousarray(read_snp(filename)))
+    return Image.open(filename)
+
+
+# IMAGE FILE TO ARRAY
+def read_image(filename):
+    '''
+    Read an interferogram file (SNP or any image format supported by Pillow)
+    :param filename: path of file
+    :return: array of the image
+    '''
+    if filename.lower().endswith('.snp'):
+        return read_snp(filename)
+    with Image.open(filename) as im:
+        return np.asarray(im)
+
+
+# INTERFEROGRAM CHANNEL OF A FILE
+def read_frame(filename, roi=None):
+    '''
+    Read only the channel used in the analysis (the first one) of an interferogram file, and only the selected area.
+    The file is closed before returning.
+    :param filename: path of file
+    :param roi: (begin_x, begin_y, end_x, end_y) in pixels or None (whole image)
+    :return: 2D array
+    '''
+    if filename.lower().endswith('.snp'):
+        array = read_snp(filename)
+    else:
+        with Image.open(filename) as im:
+            if len(im.getbands()) > 1:
+                im = im.getchannel(0)
+            array = np.asarray(im)
+    if roi is not None:
+        begin_x, begin_y, end_x, end_y = roi
+        array = array[begin_y:end_y, begin_x:end_x]
+    # Copy of the pixels used: the memory-mapped file (SNP) and the whole image are released
+    return np.array(array)
+
+
+class ShotFiles:
+    '''
+    Interferogram files of a run, read only when a frame is used (see read_frame). Each access decodes one file and
+    closes it, so a run of thousands of shots keeps neither the images nor open files in memory.
+    '''
+
+    def __init__(self, filenames, roi=None):
+        '''
+        :param filenames: list of file paths
+        :param roi: (begin_x, begin_y, end_x, end_y) area read from each file or None (whole image)
+        '''
+        self.filenames = list(filenames)
+        self.roi = roi
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def __getitem__(self, j):
+        return read_frame(self.filenames[j], self.roi)
+
+    def keys(self):
+        '''
+        Keys of the frames without reading the files (path, modification time, size and area read)
+        :return: list of tuples
+        '''
+        keys = []
+        for filename in self.filenames:
+            info = os.stat(filename)
+            keys.append((os.path.abspath(filename), info.st_mtime_ns, info.st_size, self.roi))
+        return keys
+
+
+# LIST OF SHOT FILES
+def list_shots(path):
+    '''
+    List the interferogram files of a directory (or a single file)
+    :param path: directory or file path
+    :return: sorted list of file paths
+    '''
+    if os.path.isfile(path):
+        return [path]
+    return sorted(os.path.join(path, f) for f in os.listdir(path)
+                  if f.lower().endswith(shot_extensions))
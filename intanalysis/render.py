@@ -0,0 +1,232 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# Plots of saved analyses without window (Agg backend): 2D maps of the phase, Abel and density stages and their 1D
+# radial profiles at the requested heights, for the mean result and for each frame of result files saved by
+# export.save_result. The plots can be rendered by worker processes, each one keeping its figures between plots.
+#   python -m intanalysis.render RESULT [RESULT ...] [-o OUTDIR] [--heights UM [UM ...]] [options]
+import argparse
+import os
+import sys
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from .export import load_result, read_frames
+from .plotting import MapView, ProfileView, colormap, map_labels, profile_labels, radial_profile
+
+# Stages plotted by default (maps of plotting.map_labels)
+render_stages = ('phasemap', 'abelmap', 'density')
+# Frames sent ahead to each worker process (the frames of a result file are rendered one at a time)
+render_read_ahead = 2
+
+
+class Renderer:
+    '''
+    Figures of the 2D maps and 1D profiles, kept between plots and saved without window
+    '''
+
+    def __init__(self, stages=render_stages, heights=(), std=False, colormap_order=1, fmt='png', dpi=100):
+        '''
+        :param stages: maps plotted (names of plotting.map_labels)
+        :param heights: heights of the 1D profiles (um from the origin, as the GUI); heights out of the map are skipped
+        :param std: True = std maps and std bands of the profiles are also plotted
+        :param colormap_order: color distribution of the 2D maps (1 linear, 2 quadratic, 3 cubic)
+        :param fmt: image format (extension of the files)
+        :param dpi: resolution of the images
+        '''
+        self.stages = stages
+        self.heights = heights
+        self.std = std
+        self.cmap = colormap(colormap_order)
+        self.fmt = fmt
+        self.dpi = dpi
+        self.map_view = MapView(figsize=(4.9, 4))
+        self.profile_view = ProfileView(figsize=(4.9, 4))
+        FigureCanvasAgg(self.map_view.fig)
+        FigureCanvasAgg(self.profile_view.fig)
+
+    def render(self, name, maps, factor, axisymm):
+        '''
+        Save the plots of one frame (or of the mean result)
+        :param name: path of the files without extension; each plot adds '_<map>' (and '_<height>um' for profiles)
+        :param maps: dict with the maps of the stages and their std maps ('std_<map>')
+        :param factor: scale factor (m/pixel)
+        :param axisymm: axisymmetry orientation ('vertical' or 'horizontal')
+        :return: list of files saved
+        '''
+        files = []
+        for key in self.stages:
+            matrix = maps.get(key)
+            if matrix is None:
+                continue
+            matrix_std = maps.get('std_' + key) if self.std else None
+            rows, cols = np.shape(matrix)
+            extent = (cols * factor * 1e6, rows * factor * 1e6)
+            self.map_view.show(matrix, self.cmap, map_labels[key][0], extent)
+            files.append(self._save(self.map_view, '%s_%s' % (name, key)))
+            if matrix_std is not None:
+                self.map_view.show(matrix_std, self.cmap, map_labels[key][1], extent)
+                files.append(self._save(self.map_view, '%s_std_%s' % (name, key)))
+
+            ylabel, curve = profile_labels[key]
+            for h_prof in self.heights:
+                pos = int(h_prof / (factor * 1e6))
+                if not 0 <= pos < (rows if axisymm == 'vertical' else cols):
+                    continue
+                raxis_um, profile = radial_profile(matrix, pos, factor, axisymm)
+                profile_std = None
+                if matrix_std is not None:
+                    profile_std = radial_profile(matrix_std, pos, factor, axisymm)[1]
+                self.profile_view.show(raxis_um, profile, ylabel, curve % h_prof, profile_std)
+                files.append(self._save(self.profile_view, '%s_%s_%gum' % (name, key, h_prof)))
+        return files
+
+    def _save(self, view, name):
+        '''
+        Save the figure of a view
+        '''
+        filename = '%s.%s' % (name, self.fmt)
+        view.savefig(filename, dpi=self.dpi)
+        return filename
+
+
+#################################################################################
+# FUNCTIONS
+################################################################################
+# RENDER RESULT FILES
+def render_results(filenames, out_dir, frames=True, workers=1, **options):
+    '''
+    Save the plots of analyses saved by save_result: mean result ('mean_<map>') and each frame ('shot<index>_<map>')
+    :param filenames: list of result files (.npz or .h5/.hdf5); the plots of each file are saved in a directory of
+                      out_dir with the name of the file (only one file: saved in out_dir)
+    :param out_dir: output directory (created if needed)
+    :param frames: True = plots of each frame saved in the files; False = only the mean result
+    :param workers: number of processes; 1 = serial rendering, None or 0 = number of cores
+    :param options: plot options of Renderer (stages, heights, std, colormap_order, fmt, dpi)
+    :return: list of files saved
+    '''
+    if not workers:
+        workers = os.cpu_count() or 1
+    tasks = _render_tasks(filenames, out_dir, frames)
+    if workers == 1:
+        renderer = Renderer(**options)
+        return [f for task in tasks for f in renderer.render(*task)]
+
+    files = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,)) as executor:
+        # Only a few frames per process are sent ahead: the frames of HDF5 files are read one at a time, so a
+        # campaign is not all in memory (.npz files keep all frames of each plotted map, see read_frames)
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(_worker_render, task))
+            if len(pending) >= render_read_ahead * workers:
+                files.extend(pending.popleft().result())
+        while pending:
+            files.extend(pending.popleft().result())
+    return files
+
+
+def _render_tasks(filenames, out_dir, frames):
+    '''
+    Frames of the result files, read one file at a time (and one frame at a time for HDF5 files)
+    :return: generator of Renderer.render arguments (name, maps, factor, axisymm)
+    '''
+    for filename in filenames:
+        result = load_result(filename, frames=False)
+        params = result['params']
+        if 'factor' not in params or 'axisymm' not in params:
+            raise ValueError('%s: file saved without the analysis parameters' % filename)
+        directory = out_dir
+        if len(filenames) > 1:
+            directory = os.path.join(out_dir, os.path.splitext(os.path.basename(filename))[0])
+        os.makedirs(directory, exist_ok=True)
+
+        # Only the maps of the plotted stages (and their std maps) are sent to the worker processes
+        keys = [key for key in result if key.replace('std_', '', 1) in map_labels]
+        yield os.path.join(directory, 'mean'), {key: result[key] for key in keys}, params['factor'], params['axisymm']
+        if frames:
+            keys = list(map_labels) + ['std_' + key for key in map_labels]
+            for frame in read_frames(filename, keys):
+                shot = frame.pop('shot')
+                yield os.path.join(directory, 'shot%04d' % shot), frame, params['factor'], params['axisymm']
+
+
+# Figures of the worker processes
+_worker_renderer = None
+
+
+def _init_worker(options):
+    '''
+    Initialize a worker process with its figures
+    :param options: plot options of Renderer
+    :return: None
+    '''
+    global _worker_renderer
+    _worker_renderer = Renderer(**options)
+
+
+def _worker_render(task):
+    '''
+    Save the plots of one frame in a worker process
+    :param task: Renderer.render arguments
+    :return: list of files saved
+    '''
+    return _worker_renderer.render(*task)
+
+
+# COMMAND LINE
+def build_parser():
+    '''
+    Command line arguments
+    :return: argument parser
+    '''
+    parser = argparse.ArgumentParser(prog='intanalysis.render',
+                                     description='Interferometry Analysis - LIP: plots of saved analyses without '
+                                                 'GUI.')
+    parser.add_argument('results', nargs='+', help='result files (.npz, or .h5 with the h5py package)')
+    parser.add_argument('-o', '--output', default='plots', help='output directory, default: plots')
+    parser.add_argument('--stages', nargs='+', choices=tuple(map_labels), default=render_stages,
+                        help='maps plotted (default: all)')
+    parser.add_argument('--heights', nargs='+', type=float, default=(), metavar='UM',
+                        help='heights of the 1D radial profiles (um from the origin)')
+    parser.add_argument('--std', action='store_true', help='plot also the std maps and profiles')
+    parser.add_argument('--mean-only', action='store_true', help='plot only the mean result, not each frame')
+    parser.add_argument('--colormap', choices=['linear', 'quadratic', 'cubic'], default='linear',
+                        help='color distribution of the 2D maps (default: linear)')
+    parser.add_argument('--format', default='png', help='image format (default: png)')
+    parser.add_argument('--dpi', type=int, default=100, help='image resolution (default: 100)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='number of processes used to render the plots, 0 = number of cores (default)')
+    return parser
+
+
+def main(argv=None):
+    '''
+    Render the plots from the command line
+    :param argv: list of arguments (default: sys.argv)
+    :return: None
+    '''
+    args = build_parser().parse_args(argv)
+    options = {
+        'stages': tuple(args.stages),
+        'heights': tuple(args.heights),
+        'std': args.std,
+        'colormap_order': {'linear': 1, 'quadratic': 2, 'cubic': 3}[args.colormap],
+        'fmt': args.format,
+        'dpi': args.dpi,
+    }
+    try:
+        files = render_results(args.results, args.output, frames=not args.mean_only, workers=args.workers,
+                               **options)
+    except (OSError, ValueError) as e:
+        sys.exit('ERROR: %s' % e)
+    print('%d plot(s) -> %s' % (len(files), args.output))
+
+
+if __name__ == '__main__':
+    main()
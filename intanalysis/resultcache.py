@@ -0,0 +1,164 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# On-disk cache of analysed frames. Each frame is saved as one compressed .npz file named by a hash of the shot
+# and reference contents and of all parameters that change the result, so the same shot analysed again with the
+# same parameters is read from disk. The directory size is bounded: least recently used files are removed first.
+import hashlib
+import os
+import numpy as np
+
+# Version of the saved results (changed when the analysis gives different maps)
+result_cache_version = 1
+# Parameters that do not change the results (not used in the keys)
+result_cache_ignored = ('fft_backend', 'fft_workers', 'fringes_method', 'abel_cache_dir', 'result_cache_dir',
+                        'result_cache_size')
+
+
+class ResultCache:
+    '''
+    Analysed frames saved on disk (.npz), with least recently used eviction
+    '''
+
+    def __init__(self, cache_dir, max_bytes=2 ** 30):
+        '''
+        :param cache_dir: directory of the saved frames
+        :param max_bytes: maximum size of the directory (bytes)
+        '''
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._size = None  # size of the saved files (bytes), computed on the first write
+
+    def key(self, shot, reference_key, params, vert_lim=None):
+        '''
+        Key of one analysed frame
+        :param shot: plasma interferogram array (before the selection of the analysis area)
+        :param reference_key: key of the reference analysis area (see pipeline.array_key)
+        :param params: analysis parameters
+        :param vert_lim: width of the symmetric region used in Abel inversion (None for the first frame)
+        :return: hexadecimal hash
+        '''
+        shot = np.ascontiguousarray(shot)
+        used = sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in params.items()
+                      if k not in result_cache_ignored)
+        digest = hashlib.sha1(shot.tobytes())
+        digest.update(repr((result_cache_version, np.shape(shot), str(shot.dtype), reference_key, used,
+                            vert_lim)).encode())
+        return digest.hexdigest()
+
+    def _file(self, key):
+        '''
+        File of one analysed frame
+        :param key: key of the frame
+        :return: path of .npz file
+        '''
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def __contains__(self, key):
+        return os.path.isfile(self._file(key))
+
+    def load(self, key):
+        '''
+        Read one analysed frame
+        :param key: key of the frame
+        :return: dict of analyse_frame or None when the frame is not saved
+        '''
+        try:
+            with np.load(self._file(key)) as data:
+                frame = {k: data[k] if data[k].ndim > 0 else data[k].item() for k in data.files}
+        except (OSError, ValueError, KeyError):
+            return None
+        # Recently used files are removed last
+        os.utime(self._file(key))
+        frame.setdefault('carrier', None)
+        return frame
+
+    def save(self, key, frame):
+        '''
+        Write one analysed frame (least recently used frames are removed when the directory is full)
+        :param key: key of the frame
+        :param frame: dict of analyse_frame
+        :return: None
+        '''
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = self._file(key) + '.%d.tmp' % os.getpid()
+        with open(tmp_file, 'wb') as f:
+            np.savez_compressed(f, **{k: v for k, v in frame.items() if v is not None})
+        if self._size is not None:
+            old_size = os.path.getsize(self._file(key)) if os.path.isfile(self._file(key)) else 0
+            self._size += os.path.getsize(tmp_file) - old_size
+        os.replace(tmp_file, self._file(key))
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._files())
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _files(self):
+        '''
+        Saved frames of the directory
+        :return: list of (path, size, last use time)
+        '''
+        files = []
+        if os.path.isdir(self.cache_dir):
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith('.npz') and entry.is_file():
+                    info = entry.stat()
+                    files.append((entry.path, info.st_size, info.st_mtime))
+        return files
+
+    def _evict(self):
+        '''
+        Remove the least recently used frames until the directory size is below max_bytes
+        :return: None
+        '''
+        files = sorted(self._files(), key=lambda f: f[2])
+        self._size = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
+
+    def clear(self):
+        '''
+        Remove all saved frames
+        :return: None
+        '''
+        for path, _, _ in self._files():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._size = 0
+
+
+# Caches already created (keep the directory size between analyses)
+_caches = {}
+
+
+def get_result_cache(cache_dir, max_bytes=2 ** 30):
+    '''
+    On-disk cache of analysed frames
+    :param cache_dir: directory of the saved frames
+    :param max_bytes: maximum size of the directory (bytes)
+    :return: ResultCache
+    '''
+    if cache_dir not in _caches:
+        _caches[cache_dir] = ResultCache(cache_dir, max_bytes)
+    _caches[cache_dir].max_bytes = max_bytes
+    return _caches[cache_dir]
+
+
+def clear_result_cache(cache_dir):
+    '''
+    Remove all analysed frames saved in a directory
+    :param cache_dir: directory of the saved frames
+    :return: None
+    '''
+    if cache_dir in _caches:
+        _caches[cache_dir].clear()
+    else:
+        ResultCache(cache_dir).clear()
@@ -0,0 +1,242 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# Incremental analysis: the analysis is a chain of stages (unwrap -> symmetry -> abel -> density) and a session keeps
+# the maps of each stage of the last analysis, so a new analysis only computes again the stages whose parameters
+# (or previous stages) changed. E.g. a new wavelength only computes the density from the Abel maps in memory.
+import warnings
+import numpy as np
+
+from contextlib import nullcontext
+
+from .fftengine import fft_batch_size, get_backend
+from .pipeline import (AnalysisCancelled, AnalysisError, AnalysisWarning, _frame_abel, _frame_density, _frame_symmetry, _frame_unwrap,
+                       _mean_result, analysis_parameters, array_key, frame_dtype, prepare_frame, reference_context)
+from .export import save_result
+from .profiling import set_frame, stage
+from .readers import ShotFiles
+
+# Stages of the analysis and the parameters used by each one. A stage is computed again when one of its parameters
+# changes, and then all the next stages too. Computation options (FFT library, caches) give the same results and
+# are not in the graph.
+analysis_graph = (
+    ('unwrap', ('roi', 'rotate_degree', 'fringes', 'centerfilter', 'f_range', 'sigma_gfilter', 'carrier_tolerance',
+                'registration_upsample', 'registration_decimation', 'precision', 'unwrap_method', 'unwrap_region')),
+    ('symmetry', ('sigma_gblur', 'axisymm')),
+    ('abel', ('abel_method',)),
+    ('density', ('lambda0', 'unc_lambda0', 'factor')),
+)
+
+
+class AnalysisSession:
+    '''
+    Analyses of the same shots with different parameters, computing again only the stages that changed.
+    The session keeps 6 maps of the analysis area for each shot (unwrapped phase and its std, blurred phase and its
+    std, Abel map and its std); the spectrum and filter are only kept for the last shot (result).
+    '''
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        '''
+        Remove the maps of the last analysis from memory
+        :return: None
+        '''
+        self._inputs = None  # keys of the reference and shots contents
+        self._requested = {}  # parameters of the stages in memory, as requested
+        self._used = {}  # parameters of the stages in memory, as used (automatic filter values found)
+        self._unwrapped = []  # _frame_unwrap dict of each shot, without spectrum and filter (None for skipped shots)
+        self._spectrum = None  # fftmap and gfilter of the last analysed shot
+        self._frames = []  # _frame_symmetry dict (with the Abel maps) of each analysed shot
+        self._index = []  # index of the shot of each frame
+        self._result = None
+        self.last_stages = []  # stages computed in the last analysis
+        self.last_params = None  # parameters of the last analysis (with the filter values used)
+
+    def dirty_stages(self, ref, shots, **kwargs):
+        '''
+        Stages that an analysis with these shots and parameters must compute
+        :param ref: reference interferogram array
+        :param shots: list of plasma interferogram arrays
+        :param kwargs: analysis parameters (see DEFAULT_PARAMETERS)
+        :return: list of stage names (empty when the last result can be used)
+        '''
+        return self._dirty_stages(self._input_keys(ref, shots), analysis_parameters(**kwargs))
+
+    def _input_keys(self, ref, shots):
+        '''
+        Keys of the reference and shots contents (files read on demand are identified without reading them)
+        '''
+        if isinstance(shots, ShotFiles):
+            return array_key(np.asarray(ref)), shots.keys()
+        return array_key(np.asarray(ref)), [array_key(np.asarray(shot)) for shot in shots]
+
+    def _dirty_stages(self, inputs, params):
+        '''
+        Stages to compute (the first stage whose parameters changed and all the next ones)
+        '''
+        names = [name for name, _ in analysis_graph]
+        if self._result is None or inputs != self._inputs:
+            return names
+        for k, (name, keys) in enumerate(analysis_graph):
+            # Automatic filter values found by the last analysis give the same filter as the automatic filter
+            if any(params[key] != self._requested[key] and params[key] != self._used[key] for key in keys):
+                # The unwrapped region depends on the symmetric region
+                if params['unwrap_region'] and name == 'symmetry':
+                    return names
+                return names[k:]
+        return []
+
+    def analyse(self, ref, shots, profiler=None, progress=None, cancel=None, on_warning=None, **kwargs):
+        '''
+        Analyse plasma interferograms against one reference and average the results (as analyse_shots), using the
+        maps of the last analysis for the stages that did not change
+        :param ref: reference interferogram array
+        :param shots: list of plasma interferogram arrays (or ShotFiles)
+        :param profiler: StageProfiler that measures the stages of the analysis (None = no profiling)
+        :param progress: function called after each frame of each stage as progress(stage, done, total)
+        :param cancel: threading.Event; when set, the analysis stops with AnalysisCancelled (the stages of the
+                       stopped analysis are computed again by the next one)
+        :param on_warning: function called with the message of each warning of the shots instead of issuing an
+                           AnalysisWarning (warnings.catch_warnings is not thread-safe: analyses on a worker thread
+                           collect their warnings with this function)
+        :param kwargs: analysis parameters (see DEFAULT_PARAMETERS)
+        :return: dict of analyse_shots
+        '''
+        def step(name, done, total):
+            if cancel is not None and cancel.is_set():
+                raise AnalysisCancelled('Analysis cancelled by user!')
+            if progress is not None:
+                progress(name, done, total)
+
+        def warn(message):
+            if on_warning is None:
+                warnings.warn(message, AnalysisWarning)
+            else:
+                on_warning(message)
+
+        with profiler.activate() if profiler is not None else nullcontext():
+            result = self._analyse(ref, shots, kwargs, step, warn)
+        if profiler is not None:
+            result['profile'] = profiler.report()
+        return result
+
+    def _analyse(self, ref, shots, kwargs, step, warn):
+        '''
+        Analysis of the dirty stages (see analyse); step(stage, done, total) is called after each frame and
+        warn(message) for each warning
+        '''
+        params = analysis_parameters(**kwargs)
+        inputs = self._input_keys(ref, shots)
+        dirty = self._dirty_stages(inputs, params)
+        self.last_stages = dirty
+        if not dirty:
+            return dict(self._result)
+        # Stages are marked as not computed until the end of the analysis
+        self._result = None
+
+        requested = dict(params)
+        if 'unwrap' in dirty:
+            self._unwrap(ref, shots, params, step, warn)
+        if 'symmetry' in dirty:
+            self._frames = []
+            self._index = []
+            vert_lim = None
+            for j, frame in enumerate(self._unwrapped):
+                if frame is not None:
+                    set_frame(j)
+                    self._frames.append(_frame_symmetry(frame, params, vert_lim))
+                    self._index.append(j)
+                    vert_lim = self._frames[0]['vert_lim']
+                step('symmetry', j + 1, len(self._unwrapped))
+        if 'abel' in dirty:
+            for start in range(0, len(self._frames), fft_batch_size):
+                with stage('abel', self._index[start:start + fft_batch_size]):
+                    _frame_abel(self._frames[start:start + fft_batch_size], params, warn)
+                step('abel', min(start + fft_batch_size, len(self._frames)), len(self._frames))
+
+        def densities():
+            for k, (j, frame) in enumerate(zip(self._index, self._frames)):
+                set_frame(j)
+                with stage('density'):
+                    density = _frame_density(frame, params)
+                step('density', k + 1, len(self._frames))
+                yield density
+
+        result = _mean_result(densities())
+        result['fftmap'], result['gfilter'] = self._spectrum
+        # Parameters of the stages computed now
+        for name, keys in analysis_graph:
+            if name in dirty:
+                self._requested.update({key: requested[key] for key in keys})
+                self._used.update({key: params[key] for key in keys})
+        self._inputs = inputs
+        self._result = result
+        # Stages not computed again keep the parameters they used (e.g. the automatic filter values found)
+        self.last_params = dict(params, **self._used)
+        return dict(result)
+
+    def frames(self):
+        '''
+        Maps of each frame of the last analysis (the density stage is computed from the Abel maps in memory)
+        :return: generator of dicts of analyse_frame, with the index of the shot ('shot'); the spectra of the frames
+                 are not kept ('fftmap' and 'gfilter' are None)
+        '''
+        if self._result is None:
+            raise AnalysisError('No analysis in memory!')
+        for j, frame in zip(self._index, self._frames):
+            density = _frame_density(frame, self.last_params)
+            density['shot'] = j
+            yield density
+
+    def save(self, filename, files=None, **params):
+        '''
+        Save the last analysis (mean and std maps, maps of each frame, axes and parameters) in one compressed file
+        (see export.save_result)
+        :param filename: .npz file, or .h5/.hdf5 file (HDF5 requires h5py)
+        :param files: list of the shot files
+        :param params: parameters saved instead of those of the analysis (e.g. roi of the shots read by ShotFiles)
+        :return: None
+        '''
+        if self._result is None:
+            raise AnalysisError('No analysis in memory!')
+        save_result(filename, self._result, dict(self.last_params, **params), self.frames(), files)
+
+    def _unwrap(self, ref, shots, params, step, warn):
+        '''
+        Unwrapped phase of all shots. The first analysed shot defines the filter of all shots (params is updated
+        with its filter position, range and sigma), as iter_frames.
+        '''
+        fft = get_backend(params['fft_backend'], params['fft_workers'])
+        with stage('reference'):
+            refctx = reference_context(prepare_frame(ref, params['roi'], params['rotate_degree'], frame_dtype(params)),
+                                       fft)
+        self._unwrapped = []
+        first = True
+        vert_lim = None
+        for j, shot in enumerate(shots):
+            set_frame(j)
+            with stage('prepare'):
+                intgas = prepare_frame(shot, params['roi'], params['rotate_degree'], frame_dtype(params))
+            try:
+                frame = _frame_unwrap(refctx, intgas, params, vert_lim=vert_lim)
+            except AnalysisError as e:
+                warn('Shot %d: %s' % (j, e))
+                frame = None
+            if frame is not None and first:
+                first = False
+                if params['carrier_tolerance'] is None or params['centerfilter'] != 0 or params['f_range'] != 0:
+                    params['centerfilter'] = frame['centerfilter']
+                    params['f_range'] = frame['f_range']
+                    params['sigma_gfilter'] = frame['sigma_gfilter']
+                if params['unwrap_region']:
+                    # Symmetric region of the first frame (as iter_frames): only this region of the next frames
+                    # is unwrapped
+                    vert_lim = frame['vert_lim']
+            if frame is not None:
+                # Only the spectrum and filter of the last frame are shown: those of the other frames are not kept
+                self._spectrum = frame['fftmap'], frame['gfilter']
+                frame = dict(frame, fftmap=None, gfilter=None)
+            self._unwrapped.append(frame)
+            step('unwrap', j + 1, len(shots))
@@ -0,0 +1,80 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# Mean and standard deviation of the 2D maps of many shots.
+import numpy as np
+
+
+# CREATING MEAN MAPS/ARRAY AND STD ARRAY
+def mean_maps(data):
+    '''
+    2D Array mean
+    :param n: group of 2D arrays
+    :return: 2D array
+    '''
+    mean_data = data[0] / len(data)
+    for i in range(1, len(data)):
+        mean_data = mean_data + data[i] / len(data)
+    return mean_data
+
+
+def std_maps(data, mean_data):
+    '''
+    standard deviation of 2D Array maps
+    :param n: group of 2D arrays and mean 2D array
+    :return: std of 2D array
+    '''
+    desv = (data[0] - mean_data) * (data[0] - mean_data)
+    for i in range(1, len(data)):
+        desv = desv + (data[i] - mean_data) * (data[i] - mean_data)
+
+    return np.sqrt(desv / len(data))
+
+
+# STREAMING MEAN AND STD MAPS
+class RunningMaps:
+    '''
+    Running mean and standard deviation (Welford's algorithm) of the 2D maps of one stage, updated shot by shot.
+    The memory used is constant (three maps) whatever the number of shots and the result is the same as
+    mean_maps/std_maps up to floating-point rounding. The sums are in double precision and the result has the type
+    of the maps of the shots.
+    '''
+
+    def __init__(self):
+        self.n = 0
+        self.mean = None  # mean map
+        self.m2 = None  # sum of squared deviations from the mean
+        self.mean_std = None  # mean of the std maps of each shot
+        self.last = None  # maps of the last shot
+        self.dtype = None  # type of the maps of the shots
+
+    def add(self, data, std):
+        '''
+        Include the maps of one shot
+        :param data: 2D array of the shot
+        :param std: 2D array of the standard deviation of the shot
+        :return: None
+        '''
+        self.n += 1
+        self.last = data, std
+        if self.n == 1:
+            self.dtype = np.result_type(data, std)
+            self.mean = np.array(data, dtype=float)
+            self.m2 = np.zeros(np.shape(data))
+            self.mean_std = np.array(std, dtype=float)
+            return
+        delta = data - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (data - self.mean)
+        self.mean_std += (std - self.mean_std) / self.n
+
+    def result(self):
+        '''
+        Mean map and total standard deviation map: the mean of the std maps of the shots combined with
+        the standard deviation between shots
+        :return: mean 2D array and std 2D array
+        '''
+        if self.n == 1:
+            return self.last
+        std = np.sqrt(np.square(self.mean_std) + self.m2 / self.n)
+        return self.mean.astype(self.dtype, copy=False), std.astype(self.dtype, copy=False)
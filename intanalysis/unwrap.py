@@ -0,0 +1,84 @@
+# Software: Interferometry Analysis - LIP (Version 1.0)
+# Authors: Jhonatha Ricardo dos Santos, Armando Zuffi, Ricardo Edgul Samad, Edison Puig Maldonado, Nilson Dias Vieira Junior
+# Python 3.11
+# Phase unwrapping of the wrapped phase maps. 'reliability' is the 2D reliability-sorted method of scikit-image
+# (version 1.0); 'rows' unwraps the lines with np.unwrap and joins them along the first column (fast, for smooth
+# phase maps without phase jumps inside the plasma); 'least_squares' is the unweighted least-squares unwrapping
+# solved with discrete cosine transforms (Ghiglia & Romero), made congruent with the wrapped phase.
+import numpy as np
+import scipy.fft
+
+from skimage.restoration import unwrap_phase
+
+# Unwrapping methods
+unwrap_methods = ('reliability', 'rows', 'least_squares')
+
+
+#################################################################################
+# FUNCTIONS
+################################################################################
+# WRAPPED PHASE
+def wrap(phase):
+    '''
+    Phase wrapped to [-pi, pi)
+    :param phase: array
+    :return: array
+    '''
+    return (phase + np.pi) % (2 * np.pi) - np.pi
+
+
+# UNWRAP LINE BY LINE
+def unwrap_rows(phase):
+    '''
+    Unwrap each line (np.unwrap) and then the first column, so all lines have the same 2 pi offset
+    :param phase: 2D array of the wrapped phase
+    :return: 2D array of the unwrapped phase
+    '''
+    uwphase = np.unwrap(phase, axis=1)
+    uwphase += (np.unwrap(uwphase[:, 0]) - uwphase[:, 0])[:, None]
+    return uwphase
+
+
+# LEAST-SQUARES UNWRAP
+def unwrap_least_squares(phase):
+    '''
+    Unweighted least-squares unwrapping: the Poisson equation of the wrapped phase differences is solved with
+    Neumann borders by the DCT. The result is made congruent with the wrapped phase (the unwrapped phase minus the
+    wrapped phase is a multiple of 2 pi).
+    :param phase: 2D array of the wrapped phase
+    :return: 2D array of the unwrapped phase
+    '''
+    nl, nr = np.shape(phase)
+    dx = wrap(np.diff(phase, axis=1))
+    dy = wrap(np.diff(phase, axis=0))
+    # Divergence of the wrapped phase gradient
+    rho = np.zeros(np.shape(phase), dtype=dx.dtype)
+    rho[:, :-1] += dx
+    rho[:, 1:] -= dx
+    rho[:-1] += dy
+    rho[1:] -= dy
+    # Eigenvalues of the discrete Laplacian with Neumann borders
+    eigen = (2 * np.cos(np.pi * np.arange(nl) / nl)[:, None] + 2 * np.cos(np.pi * np.arange(nr) / nr)[None, :]
+             - 4)
+    eigen[0, 0] = 1
+    spectrum = scipy.fft.dctn(rho, norm='ortho') / eigen
+    spectrum[0, 0] = 0
+    uwphase = scipy.fft.idctn(spectrum, norm='ortho')
+    return uwphase + wrap(phase - uwphase)
+
+
+def unwrap(phase, method='reliability'):
+    '''
+    Unwrap a 2D phase map
+    :param phase: 2D array of the wrapped phase
+    :param method: 'reliability' (scikit-image, as version 1.0), 'rows' or 'least_squares'
+    :return: 2D array of the unwrapped phase, with the type of phase
+    '''
+    if method == 'reliability':
+        # computed in double precision by scikit-image
+        return unwrap_phase(phase).astype(phase.dtype, copy=False)
+    if method == 'rows':
+        return unwrap_rows(phase)
+    if method == 'least_squares':
+        return unwrap_least_squares(phase).astype(phase.dtype, copy=False)
+    raise ValueError('unwrap method must be one of: %s' % ', '.join(unwrap_methods))